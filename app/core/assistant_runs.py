@@ -0,0 +1,104 @@
+"""
+Async OpenAI Assistants runs (replaces sleeping on runs.retrieve in a threadpool worker).
+
+arun_assistant_message(message, thread_id) is awaitable: the run is consumed as a stream of
+run events on the event loop, so a slow run holds no thread and costs one HTTP stream instead
+of a retrieve() every 0.5s. Runs longer than ASSISTANT_RUN_TIMEOUT_SECONDS are cancelled
+server-side. At most ASSISTANT_MAX_CONCURRENT runs execute at once per worker; the rest wait
+their turn. thread_id is an OpenAI thread, so callers must only pass thread ids the server
+issued itself.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Dict, Optional
+
+from fastapi import HTTPException, status
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+ASSISTANT_ID = os.getenv("ASSISTANT_ID")
+async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+
+ASSISTANT_RUN_TIMEOUT_SECONDS = float(os.getenv("ASSISTANT_RUN_TIMEOUT_SECONDS", "30"))
+ASSISTANT_MAX_CONCURRENT = int(os.getenv("ASSISTANT_MAX_CONCURRENT", "8"))
+
+NO_REPLY = "Sorry, no response generated."
+_FAILED_RUN_EVENTS = {"thread.run.failed", "thread.run.cancelled", "thread.run.expired", "thread.run.requires_action"}
+
+_run_slots: Optional[asyncio.Semaphore] = None
+
+
+def _slots() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop.
+    global _run_slots
+    if _run_slots is None:
+        _run_slots = asyncio.Semaphore(ASSISTANT_MAX_CONCURRENT)
+    return _run_slots
+
+
+def validate_assistant_message(message: str) -> None:
+    if not async_openai_client:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="OpenAI client not configured")
+    if not ASSISTANT_ID:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Assistant ID missing")
+    if not message or len(message.strip()) == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message required")
+    if len(message) > 1000:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Message too long")
+
+
+async def _stream_run(thread_id: str, run_ids: list) -> str:
+    """Consume one run's events; returns the assistant text. run_ids receives the run id."""
+    parts = []
+    async with async_openai_client.beta.threads.runs.stream(
+        thread_id=thread_id,
+        assistant_id=ASSISTANT_ID,
+    ) as stream:
+        async for event in stream:
+            if event.event == "thread.run.created":
+                run_ids.append(event.data.id)
+            elif event.event == "thread.message.delta":
+                for block in event.data.delta.content or []:
+                    if getattr(block, "type", None) == "text" and block.text and block.text.value:
+                        parts.append(block.text.value)
+            elif event.event in _FAILED_RUN_EVENTS:
+                logger.warning("assistant run %s on thread %s: %s", run_ids[-1:] or "?", thread_id, event.event)
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Assistant run failed")
+            elif event.event == "error":
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Assistant run failed")
+    return "".join(parts).strip()
+
+
+async def arun_assistant_message(message: str, thread_id: Optional[str] = None) -> Dict:
+    """Send message to the assistant on thread_id (new thread if None). Returns {reply, thread_id}."""
+    validate_assistant_message(message)
+    async with _slots():
+        if not thread_id:
+            thread = await async_openai_client.beta.threads.create()
+            thread_id = thread.id
+        await async_openai_client.beta.threads.messages.create(
+            thread_id=thread_id,
+            role="user",
+            content=message.strip(),
+        )
+        run_ids: list = []
+        try:
+            reply = await asyncio.wait_for(_stream_run(thread_id, run_ids), ASSISTANT_RUN_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            if run_ids:
+                try:
+                    await async_openai_client.beta.threads.runs.cancel(run_ids[-1], thread_id=thread_id)
+                except Exception as e:
+                    logger.warning("assistant run %s: cancel failed: %s", run_ids[-1], e)
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Assistant timeout")
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception("assistant run on thread %s failed", thread_id)
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Assistant error: {e}")
+    return {"reply": reply or NO_REPLY, "thread_id": thread_id}
@@ -0,0 +1,176 @@
+"""
+Canned answers for first-turn FAQ questions in the public chat widget.
+
+Two sources, both keyed to the current system prompt version (its sha256), so editing the
+prompt file invalidates them:
+  - FAQ: the **"Question?"** / answer pairs in the prompt's "Common questions" block. A user
+    question matches when its content words overlap a FAQ question's by CHAT_FAQ_MIN_SIMILARITY
+    (Jaccard, after normalization) and it adds nothing to the FAQ question but filler, so
+    "do I need a credit card", "Need a credit card?" and "is a credit card required" all hit
+    the same entry, while "Do I need a credit card for the fuel advance?" does not. Pronouns,
+    interrogatives and negation are content words, and pronouns must agree in person:
+    "how do I get paid" is not "How do you get paid?", "why would I need to switch
+    factoring" is not "Do I need to switch factoring?".
+  - Learned: model replies to opening questions, stored under the normalized question for
+    CHAT_ANSWER_CACHE_TTL_SECONDS. Only short opening questions are cached; follow-ups depend
+    on the conversation and always go to the model.
+Counters (faq_hits / learned_hits / misses / hit_rate) are exposed at /admin/chat-metrics.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from app.core.cache import TTLCache
+
+CHAT_ANSWER_CACHE_ENABLED = os.getenv("CHAT_ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+CHAT_ANSWER_CACHE_TTL_SECONDS = int(os.getenv("CHAT_ANSWER_CACHE_TTL_SECONDS", "86400"))
+CHAT_ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_ANSWER_CACHE_MAX_ENTRIES", "2000"))
+CHAT_ANSWER_CACHE_MAX_QUESTION = int(os.getenv("CHAT_ANSWER_CACHE_MAX_QUESTION", "120"))
+CHAT_FAQ_MIN_SIMILARITY = float(os.getenv("CHAT_FAQ_MIN_SIMILARITY", "0.6"))
+
+_FAQ_RE = re.compile(r'^\*\*"(?P<q>[^"]+)"\*\*\s*\n(?P<a>(?:.+\n?)+?)(?=\n\s*\n|\n\*\*|\Z)', re.MULTILINE)
+_WORD_RE = re.compile(r"[a-z0-9%$]+")
+
+_CONTRACTIONS = {
+    "whats": "what is", "hows": "how is", "whos": "who is", "dont": "do not", "doesnt": "does not",
+    "cant": "can not", "cannot": "can not", "im": "i am", "youre": "you are", "u": "you", "ur": "your",
+}
+_FILLER = {"hi", "hello", "hey", "please", "pls", "thanks", "thank", "um", "uh", "so", "ok", "okay"}
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "am", "be", "do", "does", "did", "it", "to", "of", "for", "on",
+    "in", "at", "and", "or", "can", "will", "would", "could", "should", "there", "this", "that",
+    "with", "about", "tell", "much", "any", "have", "has", "get", "if",
+}
+# Content words a question may add to a FAQ question without changing what it asks.
+_SOFT_WORDS = {"guys", "actually", "really", "just", "still", "even", "ever", "also", "exactly", "usually"}
+# Grammatical person of pronouns; a question and a FAQ that both use pronouns must agree.
+_PERSON = {
+    "i": 1, "me": 1, "my": 1, "myself": 1, "we": 1, "us": 1, "our": 1, "ours": 1,
+    "you": 2, "your": 2, "yours": 2, "yourself": 2, "yall": 2,
+}
+# Words that ask the same thing in FAQ-style questions.
+_SYNONYMS = {
+    "required": "need", "require": "need", "needed": "need", "cost": "fee", "costs": "fee",
+    "price": "fee", "pricing": "fee", "charge": "fee", "charges": "fee", "fees": "fee",
+    "percent": "%", "paid": "pay", "payment": "pay", "negotiating": "negotiate",
+    "factor": "factoring", "signup": "sign",
+}
+
+
+def normalize_question(message: str) -> str:
+    """Lowercase, strip punctuation, expand contractions, drop greetings/filler words."""
+    words = []
+    for word in _WORD_RE.findall((message or "").lower().replace("'", "").replace("’", "")):
+        word = _CONTRACTIONS.get(word, word)
+        words.extend(w for w in word.split() if w not in _FILLER)
+    return " ".join(words)
+
+
+def content_words(normalized: str) -> FrozenSet[str]:
+    return frozenset(_SYNONYMS.get(w, w) for w in normalized.split() if w not in _STOPWORDS)
+
+
+def pronoun_persons(words: FrozenSet[str]) -> FrozenSet[int]:
+    return frozenset(_PERSON[w] for w in words if w in _PERSON)
+
+
+def parse_faq(prompt_text: str) -> List[Tuple[str, str]]:
+    """(question, answer) pairs from **"Question?"** lines followed by their answer paragraph."""
+    pairs = []
+    for m in _FAQ_RE.finditer(prompt_text or ""):
+        answer = " ".join(line.strip() for line in m.group("a").splitlines() if line.strip())
+        if answer:
+            pairs.append((m.group("q").strip(), answer))
+    return pairs
+
+
+class ChatAnswerCache:
+    """FAQ matcher + learned reply cache for opening questions; thread-safe."""
+
+    def __init__(
+        self,
+        ttl_seconds: int = CHAT_ANSWER_CACHE_TTL_SECONDS,
+        max_entries: int = CHAT_ANSWER_CACHE_MAX_ENTRIES,
+        min_similarity: float = CHAT_FAQ_MIN_SIMILARITY,
+        enabled: bool = CHAT_ANSWER_CACHE_ENABLED,
+    ):
+        self.enabled = enabled
+        self.min_similarity = min_similarity
+        self._learned = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._lock = threading.Lock()
+        self._faq_hash: Optional[str] = None
+        self._faq: List[Tuple[FrozenSet[str], FrozenSet[int], str]] = []
+        self.faq_hits = 0
+        self.learned_hits = 0
+        self.misses = 0
+
+    def _faq_for(self, prompt_text: str, prompt_hash: str) -> List[Tuple[FrozenSet[str], FrozenSet[int], str]]:
+        with self._lock:
+            if self._faq_hash != prompt_hash:
+                self._faq = []
+                for q, a in parse_faq(prompt_text):
+                    faq_words = content_words(normalize_question(q))
+                    self._faq.append((faq_words, pronoun_persons(faq_words), a))
+                self._faq_hash = prompt_hash
+            return self._faq
+
+    @staticmethod
+    def cacheable(normalized: str) -> bool:
+        return bool(normalized) and len(normalized) <= CHAT_ANSWER_CACHE_MAX_QUESTION
+
+    def lookup(self, message: str, prompt_text: str, prompt_hash: str) -> Optional[str]:
+        """Canned reply for an opening question, or None (caller asks the model)."""
+        if not self.enabled:
+            return None
+        normalized = normalize_question(message)
+        if not self.cacheable(normalized):
+            return None
+        words = content_words(normalized) - _SOFT_WORDS
+        if words:
+            persons = pronoun_persons(words)
+            best, best_score = None, 0.0
+            for faq_words, faq_persons, answer in self._faq_for(prompt_text, prompt_hash):
+                if persons and faq_persons and persons != faq_persons:
+                    continue
+                if not words <= faq_words:
+                    continue  # the question asks about something the FAQ question does not
+                score = len(words & faq_words) / len(words | faq_words)
+                if score > best_score:
+                    best, best_score = answer, score
+            if best is not None and best_score >= self.min_similarity:
+                with self._lock:
+                    self.faq_hits += 1
+                return best
+        reply = self._learned.get((prompt_hash, normalized))
+        with self._lock:
+            if reply is not None:
+                self.learned_hits += 1
+            else:
+                self.misses += 1
+        return reply
+
+    def remember(self, message: str, reply: str, prompt_hash: str) -> None:
+        """Cache the model's reply to an opening question."""
+        normalized = normalize_question(message)
+        if self.enabled and reply and self.cacheable(normalized):
+            self._learned.set((prompt_hash, normalized), reply)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hits = self.faq_hits + self.learned_hits
+            total = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "faq_entries": len(self._faq),
+                "learned_entries": len(self._learned),
+                "faq_hits": self.faq_hits,
+                "learned_hits": self.learned_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
+
+
+answer_cache = ChatAnswerCache()
@@ -4,41 +4,36 @@ Handles conversation threading and includes system prompt for Green Candle Dispa
 """
 import os
 from pathlib import Path
-from typing import Optional, Dict
+from typing import AsyncIterator, Dict, Optional
 from fastapi import HTTPException, status
 from openai import OpenAI
 
-# Load system prompt from file
+from app.core.prompt_registry import markdown_section, prompt_registry
+
+# System prompt file; parsed and hashed once by the prompt registry, reloaded when it changes.
 _BASE_DIR = Path(__file__).resolve().parent.parent.parent
 _SYSTEM_PROMPT_PATH = _BASE_DIR / "docs" / "chat-agent-system-prompt-responses-api.md"
+SYSTEM_PROMPT_NAME = "chat_system"
 
-def _load_system_prompt() -> str:
-    """Load the system prompt from the markdown file."""
-    try:
-        if _SYSTEM_PROMPT_PATH.exists():
-            content = _SYSTEM_PROMPT_PATH.read_text()
-            # Extract just the system prompt section (skip markdown headers)
-            lines = content.split("\n")
-            in_prompt = False
-            prompt_lines = []
-            for line in lines:
-                if "## System Prompt" in line:
-                    in_prompt = True
-                    continue
-                if in_prompt and line.startswith("##"):
-                    break
-                if in_prompt:
-                    prompt_lines.append(line)
-            return "\n".join(prompt_lines).strip()
-    except Exception:
-        pass
-    
-    # Fallback: return a minimal prompt if file not found
-    return """You are a friendly assistant for Green Candle Dispatch—AI dispatch for owner-operators. 
+# Fallback: a minimal prompt if the file is not found
+_FALLBACK_SYSTEM_PROMPT = """You are a friendly assistant for Green Candle Dispatch—AI dispatch for owner-operators. 
 Help drivers understand the service: AI scans load boards 24/7, negotiates rates, handles paperwork. 
 Flat 2.5% fee only after funding. Guide drivers to sign up at /beta/apply or /register. 
 Be friendly, direct, trucker-focused. Don't oversell."""
 
+prompt_registry.register(
+    SYSTEM_PROMPT_NAME,
+    _SYSTEM_PROMPT_PATH,
+    parse=markdown_section("## System Prompt"),
+    fallback=_FALLBACK_SYSTEM_PROMPT,
+)
+
+
+def _load_system_prompt() -> str:
+    """The chat system prompt (the "## System Prompt" section of the markdown file)."""
+    return prompt_registry.get(SYSTEM_PROMPT_NAME).text
+
+
 # Initialize OpenAI client
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
@@ -213,4 +208,82 @@ def get_greeting(use_fallback: bool = True) -> Dict:
     Returns:
         Dict with greeting message and response_id for threading
     """
+    if use_fallback:
+        from app.core.chat_responses_fallback import get_greeting as fallback_greeting
+        return fallback_greeting()  # precomputed, no model call
     return run_responses_chat(message="", greeting=True, use_fallback=use_fallback)
+
+
+async def arun_responses_chat(
+    message: str,
+    response_id: Optional[str] = None,
+    greeting: bool = False,
+) -> Dict:
+    """Async run_responses_chat for the web routes (awaits OpenAI instead of blocking the loop)."""
+    from app.core.chat_responses_fallback import arun_chat_completions
+    return await arun_chat_completions(message=message, conversation_id=response_id, greeting=greeting)
+
+
+def stream_responses_chat(message: str, response_id: Optional[str] = None) -> AsyncIterator[Dict]:
+    """Token stream for one chat turn; see stream_chat_completions for the event shapes."""
+    from app.core.chat_responses_fallback import stream_chat_completions
+    return stream_chat_completions(message=message, conversation_id=response_id)
+
+
+async def aget_greeting() -> Dict:
+    """Async get_greeting (precomputed, no model call)."""
+    from app.core.chat_responses_fallback import aget_greeting as fallback_greeting
+    return await fallback_greeting()
+
+
+CHAT_MAX_CONCURRENT_PER_IP = int(os.getenv("CHAT_MAX_CONCURRENT_PER_IP", "2"))
+CHAT_MAX_CONCURRENT = int(os.getenv("CHAT_MAX_CONCURRENT", "32"))
+
+
+class ChatConcurrencyLimiter:
+    """
+    In-flight chat turns per client IP and per worker. Only touched from the event loop, so
+    no lock is needed. acquire() returns a slot whose release() is idempotent, or None when
+    the caller should get a 429.
+    """
+
+    def __init__(self, per_ip: int = CHAT_MAX_CONCURRENT_PER_IP, total: int = CHAT_MAX_CONCURRENT):
+        self.per_ip = per_ip
+        self.total = total
+        self._active: Dict[str, int] = {}
+        self._in_flight = 0
+        self.rejected = 0
+
+    def acquire(self, ip: str) -> Optional["_ChatSlot"]:
+        if self._in_flight >= self.total or self._active.get(ip, 0) >= self.per_ip:
+            self.rejected += 1
+            return None
+        self._active[ip] = self._active.get(ip, 0) + 1
+        self._in_flight += 1
+        return _ChatSlot(self, ip)
+
+    def _release(self, ip: str) -> None:
+        self._in_flight -= 1
+        left = self._active.get(ip, 1) - 1
+        if left > 0:
+            self._active[ip] = left
+        else:
+            self._active.pop(ip, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"in_flight": self._in_flight, "clients": len(self._active), "rejected": self.rejected}
+
+
+class _ChatSlot:
+    def __init__(self, limiter: ChatConcurrencyLimiter, ip: str):
+        self._limiter = limiter
+        self._ip = ip
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release(self._ip)
+
+
+chat_limiter = ChatConcurrencyLimiter()
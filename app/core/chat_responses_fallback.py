@@ -1,187 +1,294 @@
 """
 Fallback chat service using OpenAI Chat Completions API.
 Use this if Responses API is not yet available.
-This simulates conversation threading by storing messages in memory or a simple cache.
+Conversation threading is simulated with app/core/conversation_store.py (per-worker LRU or
+Postgres); only a token-budgeted window of the stored history is sent each turn.
 """
+import asyncio
+import hashlib
 import os
-from typing import Optional, Dict
+import re
+import time
+import traceback
+from typing import Any, AsyncIterator, Dict, List, Optional
 from fastapi import HTTPException, status
-from openai import OpenAI
-from app.core.chat_responses import _load_system_prompt
+from openai import AsyncOpenAI, OpenAI
+from app.core.chat_answers import answer_cache
+from app.core.chat_responses import SYSTEM_PROMPT_NAME
+from app.core.conversation_store import get_conversation_store, window_messages
+from app.core.prompt_registry import prompt_registry
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 openai_client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
-
-# Simple in-memory conversation store (use Redis or DB in production)
-_conversations: Dict[str, list] = {}
+# Async client for the web routes: awaiting it frees the event loop while OpenAI generates.
+async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
 
 CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4o-mini")  # Use cheaper model for chat
+CHAT_TEMPERATURE = 0.7
+CHAT_MAX_TOKENS = 500
 
+# Served as-is when the widget opens (no model call). Override with CHAT_GREETING.
+CHAT_GREETING = os.getenv(
+    "CHAT_GREETING",
+    "Hey there! I'm the Green Candle Dispatch assistant—AI dispatch for owner-operators. "
+    "Ask me how it works, what it costs, or how to join the beta. How can I help?"
+)
+EMPTY_REPLY = "Sorry, I didn't get a response. Can you try asking again?"
 
-def run_chat_completions(
-    message: str,
-    conversation_id: Optional[str] = None,
-    greeting: bool = False
-) -> Dict:
-    """
-    Chat using Chat Completions API (fallback for Responses API).
-    
-    Args:
-        message: User's message
-        conversation_id: Conversation ID for threading (None for new conversation)
-        greeting: If True, send greeting instead
-    
-    Returns:
-        Dict with reply, conversation_id
-    """
-    if not openai_client:
+
+def _validate(message: str, greeting: bool, client: Any) -> None:
+    if not client:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="OpenAI client not configured"
         )
-    
     if not message and not greeting:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Message required"
         )
-    
     if len(message) > 2000:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Message too long"
         )
-    
-    # Get or create conversation history
-    if conversation_id and conversation_id in _conversations:
-        messages = _conversations[conversation_id]
+
+
+_CONVERSATION_ID_RE = re.compile(r"^[0-9a-f]{16}$")
+
+
+class _Turn:
+    """One chat turn: stored history (incl. the new user message) and what goes to the model."""
+
+    def __init__(self, conversation_id: str, history: List[dict], messages: List[dict],
+                 prompt_sha256: str, opening: bool, canned: Optional[str]):
+        self.conversation_id = conversation_id
+        self.history = history
+        self.messages = messages
+        self.prompt_sha256 = prompt_sha256
+        self.opening = opening      # first question of the conversation
+        self.canned = canned        # cached / FAQ reply; no model call needed
+
+
+def _new_conversation_id(message: str) -> str:
+    return hashlib.md5(f"{time.time()}{message}".encode()).hexdigest()[:16]
+
+
+def _start_turn(message: str, conversation_id: Optional[str]) -> _Turn:
+    """
+    Load history and add the user message. Messages to send are the system prompt + the most
+    recent history that fits CHAT_HISTORY_MAX_TOKENS. Opening questions are checked against the
+    canned-answer cache first.
+    """
+    history = get_conversation_store().get(conversation_id) if conversation_id else None
+    if history is None:
+        history = []
+        # Keep an id we issued (e.g. with the greeting, which is not stored) so the client's
+        # response_id stays stable; anything else gets a fresh one.
+        if not (conversation_id and _CONVERSATION_ID_RE.match(conversation_id)):
+            conversation_id = _new_conversation_id(message)
+    opening = not any(m.get("role") == "user" for m in history)
+    history.append({"role": "user", "content": message.strip()})
+    prompt = prompt_registry.get(SYSTEM_PROMPT_NAME)
+    canned = answer_cache.lookup(message, prompt.text, prompt.sha256) if opening else None
+    messages = [{"role": "system", "content": prompt.text}] + window_messages(history)
+    return _Turn(conversation_id, history, messages, prompt.sha256, opening, canned)
+
+
+def _finish_turn(turn: _Turn, reply: str) -> Dict:
+    """Save the completed turn to the conversation store and build the API result."""
+    turn.history.append({"role": "assistant", "content": reply})
+    get_conversation_store().save(turn.conversation_id, turn.history)
+    if turn.opening and turn.canned is None and reply != EMPTY_REPLY:
+        answer_cache.remember(turn.history[-2]["content"], reply, turn.prompt_sha256)
+
+    result = {
+        "reply": reply,
+        "response_id": turn.conversation_id,  # Use same field name as Responses API
+        "conversation_id": turn.conversation_id  # Also include for clarity
+    }
+    if turn.canned is not None:
+        result["cached"] = True
+    return result
+
+
+def _greeting_result() -> Dict:
+    """Precomputed greeting; its conversation id is kept by the first real turn."""
+    conversation_id = _new_conversation_id(CHAT_GREETING)
+    return {
+        "reply": CHAT_GREETING,
+        "response_id": conversation_id,
+        "conversation_id": conversation_id,
+        "greeting": True,
+    }
+
+
+async def _store_call(fn, *args):
+    """Run _start_turn/_finish_turn from async code; DB-backed stores go to a thread."""
+    if get_conversation_store().blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+def _content_text(content: Any) -> str:
+    """Assistant text from a message content (str, or an object with .text)."""
+    if content is None:
+        return EMPTY_REPLY
+    if isinstance(content, str):
+        text = content.strip()
+    elif hasattr(content, "text"):
+        text = str(content.text).strip()
     else:
-        # New conversation: start with system prompt
-        system_prompt = _load_system_prompt()
-        messages = [{"role": "system", "content": system_prompt}]
-        # Generate conversation ID (simple hash or UUID)
-        import hashlib
-        import time
-        conversation_id = hashlib.md5(
-            f"{time.time()}{message}".encode()
-        ).hexdigest()[:16]
-    
-    # Add user message or greeting
+        text = str(content).strip()
+    return text or EMPTY_REPLY
+
+
+def _chat_http_error(e: Exception) -> HTTPException:
+    """Map an OpenAI/client error to the HTTPException the widget expects."""
+    if isinstance(e, HTTPException):
+        return e
+    error_msg = str(e)
+    print(f"Chat error: {type(e).__name__}: {error_msg}")
+    print(traceback.format_exc())
+    if "rate limit" in error_msg.lower():
+        return HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests. Please try again."
+        )
+    if "ResponseTextConfig" in error_msg or "object has no attribute 'strip'" in error_msg:
+        return HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Chat service configuration error. Please contact support."
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"Chat error: {error_msg}"
+    )
+
+
+def run_chat_completions(
+    message: str,
+    conversation_id: Optional[str] = None,
+    greeting: bool = False
+) -> Dict:
+    """
+    Chat using Chat Completions API (fallback for Responses API). Blocking; for scripts and
+    sync callers. Web routes use arun_chat_completions / stream_chat_completions.
+
+    Args:
+        message: User's message
+        conversation_id: Conversation ID for threading (None for new conversation)
+        greeting: If True, send greeting instead
+
+    Returns:
+        Dict with reply, conversation_id
+    """
     if greeting:
-        messages.append({
-            "role": "user",
-            "content": "Introduce yourself and ask how you can help. Be friendly and mention we're Green Candle Dispatch—AI dispatch for truckers."
-        })
-    else:
-        messages.append({"role": "user", "content": message.strip()})
-    
+        return _greeting_result()
+    _validate(message, greeting, openai_client)
+    turn = _start_turn(message, conversation_id)
+    if turn.canned is not None:
+        return _finish_turn(turn, turn.canned)
     try:
-        # Call Chat Completions API
-        # Debug: log what we're sending
-        # print(f"Sending to OpenAI: model={CHAT_MODEL}, messages_count={len(messages)}")
-        
         response = openai_client.chat.completions.create(
             model=CHAT_MODEL,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=500
+            messages=turn.messages,
+            temperature=CHAT_TEMPERATURE,
+            max_tokens=CHAT_MAX_TOKENS
         )
-        
-        # Debug: log response structure
-        # print(f"Response received: type={type(response)}, choices_count={len(response.choices) if hasattr(response, 'choices') else 0}")
-        
-        # Extract message content - handle both string and object types
-        try:
-            # Debug: log response structure if needed
-            # print(f"Response type: {type(response)}")
-            # print(f"Choices type: {type(response.choices)}")
-            # print(f"Message type: {type(response.choices[0].message)}")
-            
-            message_obj = response.choices[0].message
-            content = message_obj.content
-            
-            # Debug: log content type
-            # print(f"Content type: {type(content)}, value: {content}")
-            
-            if content is None:
-                assistant_message = "Sorry, I didn't get a response. Can you try asking again?"
-            elif isinstance(content, str):
-                assistant_message = content.strip()
-            else:
-                # Handle ResponseTextConfig or other object types
-                # Try to get text attribute if it exists
-                if hasattr(content, 'text'):
-                    assistant_message = str(content.text).strip()
-                elif hasattr(content, '__str__'):
-                    assistant_message = str(content).strip()
-                else:
-                    # Last resort: convert to string
-                    assistant_message = str(content).strip()
-                    
-            # Ensure we have a valid message
-            if not assistant_message or len(assistant_message) == 0:
-                assistant_message = "Sorry, I didn't get a response. Can you try asking again?"
-                
-        except Exception as parse_error:
-            # If we can't parse the response, return a helpful error
-            import traceback
-            print(f"Error parsing response: {parse_error}")
-            print(traceback.format_exc())
-            # Don't save failed responses to history
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to parse API response: {str(parse_error)}"
-            )
-        
-        # Save assistant response to history
-        messages.append({"role": "assistant", "content": assistant_message})
-        
-        # Keep only last 10 messages to avoid token limits
-        if len(messages) > 10:
-            # Keep system prompt + last 9 messages
-            messages = [messages[0]] + messages[-9:]
-        
-        _conversations[conversation_id] = messages
-        
-        result = {
-            "reply": assistant_message,
-            "response_id": conversation_id,  # Use same field name as Responses API
-            "conversation_id": conversation_id  # Also include for clarity
-        }
-        
-        if greeting:
-            result["greeting"] = True
-        
-        return result
-        
+        reply = _content_text(response.choices[0].message.content)
     except Exception as e:
-        import traceback
-        error_msg = str(e)
-        error_type = type(e).__name__
-        
-        # Log full error for debugging (remove in production or use proper logging)
-        print(f"Chat error: {error_type}: {error_msg}")
-        print(traceback.format_exc())
-        
-        if "rate limit" in error_msg.lower():
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Too many requests. Please try again."
-            )
-        
-        # More specific error messages
-        if "ResponseTextConfig" in error_msg or "object has no attribute 'strip'" in error_msg:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Chat service configuration error. Please contact support."
-            )
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Chat error: {error_msg}"
+        raise _chat_http_error(e)
+    return _finish_turn(turn, reply)
+
+
+async def arun_chat_completions(
+    message: str,
+    conversation_id: Optional[str] = None,
+    greeting: bool = False
+) -> Dict:
+    """Same as run_chat_completions, awaiting the async client (event loop stays free)."""
+    if greeting:
+        return _greeting_result()
+    _validate(message, greeting, async_openai_client)
+    turn = await _store_call(_start_turn, message, conversation_id)
+    if turn.canned is not None:
+        return await _store_call(_finish_turn, turn, turn.canned)
+    try:
+        response = await async_openai_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=turn.messages,
+            temperature=CHAT_TEMPERATURE,
+            max_tokens=CHAT_MAX_TOKENS
+        )
+        reply = _content_text(response.choices[0].message.content)
+    except Exception as e:
+        raise _chat_http_error(e)
+    return await _store_call(_finish_turn, turn, reply)
+
+
+async def stream_chat_completions(
+    message: str,
+    conversation_id: Optional[str] = None,
+    greeting: bool = False
+) -> AsyncIterator[Dict]:
+    """
+    Streamed chat turn. Yields {"type": "start", "conversation_id"}, then
+    {"type": "delta", "text"} per token chunk, then {"type": "done", **result}.
+    Validation errors raise before the first event. If the consumer stops early (browser
+    disconnected), the OpenAI stream is closed and the turn is not saved to history.
+    Greetings and canned answers arrive as a single delta.
+    """
+    if greeting:
+        result = _greeting_result()
+        yield {"type": "start", "conversation_id": result["conversation_id"]}
+        yield {"type": "delta", "text": result["reply"]}
+        yield {"type": "done", **result}
+        return
+    _validate(message, greeting, async_openai_client)
+    turn = await _store_call(_start_turn, message, conversation_id)
+    if turn.canned is not None:
+        yield {"type": "start", "conversation_id": turn.conversation_id}
+        yield {"type": "delta", "text": turn.canned}
+        result = await _store_call(_finish_turn, turn, turn.canned)
+        yield {"type": "done", **result}
+        return
+    try:
+        stream = await async_openai_client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=turn.messages,
+            temperature=CHAT_TEMPERATURE,
+            max_tokens=CHAT_MAX_TOKENS,
+            stream=True
         )
+    except Exception as e:
+        raise _chat_http_error(e)
+
+    yield {"type": "start", "conversation_id": turn.conversation_id}
+    parts: List[str] = []
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                yield {"type": "delta", "text": delta}
+    except Exception as e:
+        raise _chat_http_error(e)
+    finally:
+        await stream.close()
+
+    reply = "".join(parts).strip() or EMPTY_REPLY
+    result = await _store_call(_finish_turn, turn, reply)
+    yield {"type": "done", **result}
 
 
 def get_greeting() -> Dict:
-    """Get greeting message."""
-    return run_chat_completions(message="", greeting=True)
+    """Get greeting message (precomputed, no OpenAI call)."""
+    return _greeting_result()
+
+
+async def aget_greeting() -> Dict:
+    """Get greeting message (async; precomputed, no OpenAI call)."""
+    return _greeting_result()
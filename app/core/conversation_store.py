@@ -0,0 +1,263 @@
+"""
+Conversation history for the public chat widget (app/core/chat_responses_fallback.py).
+
+Two backends, picked by CHAT_CONVERSATION_STORE:
+  - "memory" (default): per-worker LRU bounded by CHAT_CONVERSATION_MAX_ENTRIES, entries expire
+    after CHAT_CONVERSATION_TTL_SECONDS of inactivity.
+  - "postgres": webwise.chat_conversations (sql/create_chat_conversations.sql), shared by all
+    uvicorn workers so a follow-up landing on another worker keeps its context.
+
+Only user/assistant turns are stored (at most CHAT_HISTORY_MAX_MESSAGES); the system prompt is
+added when the request is built. window_messages() trims what is sent to the model to a
+CHAT_HISTORY_MAX_TOKENS budget, so the prompt per turn stays flat however long the chat runs.
+"""
+from __future__ import annotations
+
+import abc
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+
+CHAT_CONVERSATION_STORE = os.getenv("CHAT_CONVERSATION_STORE", "memory").lower()
+CHAT_CONVERSATION_MAX_ENTRIES = int(os.getenv("CHAT_CONVERSATION_MAX_ENTRIES", "5000"))
+CHAT_CONVERSATION_TTL_SECONDS = int(os.getenv("CHAT_CONVERSATION_TTL_SECONDS", "3600"))
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "20"))
+CHAT_HISTORY_MAX_TOKENS = int(os.getenv("CHAT_HISTORY_MAX_TOKENS", "1500"))
+
+
+def estimate_tokens(content: str) -> int:
+    """Rough token count (~4 chars/token + per-message overhead); no tokenizer dependency."""
+    return len(content or "") // 4 + 4
+
+
+def window_messages(history: List[dict], max_tokens: int = CHAT_HISTORY_MAX_TOKENS) -> List[dict]:
+    """
+    Most recent messages that fit in max_tokens (the latest message is always kept).
+    The window never starts with an assistant reply whose question was cut off.
+    """
+    window: List[dict] = []
+    used = 0
+    for msg in reversed(history):
+        cost = estimate_tokens(msg.get("content", ""))
+        if window and used + cost > max_tokens:
+            break
+        window.append(msg)
+        used += cost
+    window.reverse()
+    while len(window) > 1 and window[0].get("role") == "assistant":
+        window.pop(0)
+    return window
+
+
+def _trim(history: List[dict]) -> List[dict]:
+    return history[-CHAT_HISTORY_MAX_MESSAGES:] if len(history) > CHAT_HISTORY_MAX_MESSAGES else history
+
+
+class ConversationStore(abc.ABC):
+    """Interface: get/save/delete a conversation's stored turns, plus stats() for metrics."""
+
+    # True when calls do I/O; async callers then run them in a thread.
+    blocking = False
+
+    @abc.abstractmethod
+    def get(self, conversation_id: str) -> Optional[List[dict]]:
+        """Stored turns, or None if unknown or expired."""
+
+    @abc.abstractmethod
+    def save(self, conversation_id: str, history: List[dict]) -> None:
+        """Replace the stored turns (trimmed to CHAT_HISTORY_MAX_MESSAGES)."""
+
+    @abc.abstractmethod
+    def delete(self, conversation_id: str) -> None:
+        """Forget a conversation."""
+
+    def stats(self) -> Dict[str, object]:
+        return {}
+
+
+class MemoryConversationStore(ConversationStore):
+    """
+    LRU + idle TTL, bounded in entries; approx_bytes tracks the stored text size.
+    get() and save() both push the expiry to now + ttl and move the entry to the MRU end, so
+    entries are ordered by expiry too and the oldest (first to expire) is always at the head.
+    """
+
+    def __init__(self, max_entries: int = CHAT_CONVERSATION_MAX_ENTRIES, ttl_seconds: int = CHAT_CONVERSATION_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # id -> (expires_at, history, size)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _size(history: List[dict]) -> int:
+        return sum(len(m.get("content", "")) for m in history)
+
+    def _drop(self, conversation_id: str) -> None:
+        _, _, size = self._data.pop(conversation_id)
+        self._bytes -= size
+
+    def get(self, conversation_id: str) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._data.get(conversation_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(conversation_id)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data[conversation_id] = (time.monotonic() + self.ttl_seconds, entry[1], entry[2])
+            self._data.move_to_end(conversation_id)
+            self.hits += 1
+            return list(entry[1])
+
+    def save(self, conversation_id: str, history: List[dict]) -> None:
+        history = _trim(list(history))
+        size = self._size(history)
+        with self._lock:
+            if conversation_id in self._data:
+                self._drop(conversation_id)
+            self._data[conversation_id] = (time.monotonic() + self.ttl_seconds, history, size)
+            self._bytes += size
+            now = time.monotonic()
+            # The head is both least recently used and first to expire: drop expired entries,
+            # then evict by recency to fit max_entries.
+            while self._data:
+                oldest_id, (expires_at, _, _) = next(iter(self._data.items()))
+                if expires_at <= now:
+                    self._drop(oldest_id)
+                    self.expirations += 1
+                elif len(self._data) > self.max_entries:
+                    self._drop(oldest_id)
+                    self.evictions += 1
+                else:
+                    break
+
+    def delete(self, conversation_id: str) -> None:
+        with self._lock:
+            if conversation_id in self._data:
+                self._drop(conversation_id)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "approx_bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class PostgresConversationStore(ConversationStore):
+    """webwise.chat_conversations; rows idle longer than ttl_seconds are ignored and pruned."""
+
+    blocking = True
+
+    def __init__(self, engine, ttl_seconds: int = CHAT_CONVERSATION_TTL_SECONDS, prune_every: int = 500):
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds
+        self.prune_every = prune_every
+        self._saves = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conversation_id: str) -> Optional[List[dict]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("""
+                    SELECT messages FROM webwise.chat_conversations
+                    WHERE conversation_id = :cid
+                      AND updated_at > now() - make_interval(secs => :ttl)
+                """),
+                {"cid": conversation_id, "ttl": self.ttl_seconds},
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        messages = row[0]
+        return json.loads(messages) if isinstance(messages, str) else list(messages)
+
+    def save(self, conversation_id: str, history: List[dict]) -> None:
+        history = _trim(list(history))
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO webwise.chat_conversations (conversation_id, messages, message_count, updated_at)
+                    VALUES (:cid, CAST(:messages AS jsonb), :n, now())
+                    ON CONFLICT (conversation_id) DO UPDATE
+                        SET messages = EXCLUDED.messages,
+                            message_count = EXCLUDED.message_count,
+                            updated_at = now()
+                """),
+                {"cid": conversation_id, "messages": json.dumps(history), "n": len(history)},
+            )
+        self._saves += 1
+        if self.prune_every and self._saves % self.prune_every == 0:
+            self.prune()
+
+    def delete(self, conversation_id: str) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(
+                text("DELETE FROM webwise.chat_conversations WHERE conversation_id = :cid"),
+                {"cid": conversation_id},
+            )
+
+    def prune(self) -> int:
+        """Delete conversations idle longer than the TTL. Returns rows removed."""
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                text("""
+                    DELETE FROM webwise.chat_conversations
+                    WHERE updated_at <= now() - make_interval(secs => :ttl)
+                """),
+                {"ttl": self.ttl_seconds},
+            )
+        return result.rowcount or 0
+
+    def stats(self) -> Dict[str, object]:
+        out: Dict[str, object] = {"backend": "postgres", "hits": self.hits, "misses": self.misses}
+        try:
+            with self.engine.connect() as conn:
+                row = conn.execute(text("""
+                    SELECT COUNT(*) AS entries,
+                           COALESCE(SUM(pg_column_size(messages)), 0) AS approx_bytes
+                    FROM webwise.chat_conversations
+                    WHERE updated_at > now() - make_interval(secs => :ttl)
+                """), {"ttl": self.ttl_seconds}).fetchone()
+            out.update({"entries": int(row[0]), "approx_bytes": int(row[1])})
+        except Exception as e:
+            out["error"] = str(e)
+        return out
+
+
+_store: Optional[ConversationStore] = None
+_store_lock = threading.Lock()
+
+
+def get_conversation_store() -> ConversationStore:
+    """Process-wide store per CHAT_CONVERSATION_STORE (postgres falls back to memory without a DB)."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if CHAT_CONVERSATION_STORE == "postgres":
+                from app.core.deps import engine
+                _store = PostgresConversationStore(engine) if engine else MemoryConversationStore()
+            else:
+                _store = MemoryConversationStore()
+        return _store
@@ -0,0 +1,157 @@
+"""
+Shared SQLAlchemy engine factory for every entry point (web app, inbound_listener, scripts).
+
+Pool settings come from env so workers can be tuned against Postgres max_connections:
+  DB_POOL_SIZE (5), DB_MAX_OVERFLOW (10), DB_POOL_TIMEOUT seconds (30),
+  DB_POOL_RECYCLE seconds (1800), DB_POOL_PRE_PING (true),
+  DB_STATEMENT_TIMEOUT_MS (0 = server default), DB_ECHO (false).
+Pre-ping + recycle drop stale connections after a DB failover instead of erroring a request.
+pool_metrics() reports checkout wait time, in-use and overflow counts per engine.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+class _PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def observe(self, waited: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg = self.wait_total / self.checkouts if self.checkouts else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "checkout_timeouts": self.timeouts,
+                "checkout_wait_avg_ms": round(avg * 1000, 2),
+                "checkout_wait_max_ms": round(self.wait_max * 1000, 2),
+            }
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = _PoolStats()
+
+    def recreate(self):
+        # Pool is recreated after disposal/failover; keep accumulating into the same stats.
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.observe(time.monotonic() - started, timed_out=True)
+            raise
+        self.metrics.observe(time.monotonic() - started)
+        return conn
+
+
+_engines: Dict[str, Engine] = {}
+_engine_urls: Dict[str, str] = {}
+_engines_lock = threading.Lock()
+
+
+def make_engine(
+    database_url: Optional[str] = None,
+    name: str = "app",
+    echo: Optional[bool] = None,
+    **overrides: Any,
+) -> Optional[Engine]:
+    """
+    Build a pooled engine with the env-driven settings above and register it under name
+    for pool_metrics(). Calling again with the same name and URL returns the existing engine,
+    so modules importing at startup share one pool. Returns None when no DATABASE_URL is set.
+    overrides are passed through to create_engine (e.g. pool_size=1 for a CLI script).
+    """
+    url = database_url or os.getenv("DATABASE_URL")
+    if not url:
+        return None
+    with _engines_lock:
+        existing = _engines.get(name)
+        if existing is not None and not overrides and echo is None and _engine_urls.get(name) == url:
+            return existing
+    kwargs: Dict[str, Any] = {
+        "echo": _env_bool("DB_ECHO", False) if echo is None else echo,
+        "future": True,
+        "poolclass": MeteredQueuePool,
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+    if url.startswith("postgresql"):
+        # application_name makes each entry point identifiable in pg_stat_activity
+        connect_args: Dict[str, Any] = {"application_name": f"wws-{name}"}
+        statement_timeout_ms = _env_int("DB_STATEMENT_TIMEOUT_MS", 0)
+        if statement_timeout_ms > 0:
+            connect_args["options"] = f"-c statement_timeout={statement_timeout_ms}"
+        kwargs["connect_args"] = connect_args
+    kwargs.update(overrides)
+    eng = create_engine(url, **kwargs)
+    with _engines_lock:
+        _engines[name] = eng
+        _engine_urls[name] = url
+    return eng
+
+
+def pool_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-engine pool status: size, in-use, idle, overflow, checkout wait/timeouts."""
+    out: Dict[str, Dict[str, Any]] = {}
+    with _engines_lock:
+        engines = dict(_engines)
+    for name, eng in engines.items():
+        pool = eng.pool
+        info: Dict[str, Any] = {"pool_class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            info.update({
+                "pool_size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+                "pool_timeout_s": pool._timeout,
+            })
+        metrics = getattr(pool, "metrics", None)
+        if metrics is not None:
+            info.update(metrics.snapshot())
+        out[name] = info
+    return out
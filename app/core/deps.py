@@ -12,12 +12,14 @@ from typing import Generator
 from fastapi import Request, Depends, HTTPException, status
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.orm import Session, sessionmaker
 from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 import bcrypt as _bcrypt
 from openai import OpenAI
 
+from app.core.db import make_engine
+
 # Env and paths (assume main.py or app has already loaded dotenv)
 _BASE_DIR = Path(__file__).resolve().parent.parent
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -27,7 +29,7 @@ SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_MINUTES", "120")) * 60
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ASSISTANT_ID = os.getenv("ASSISTANT_ID")
 
-engine = create_engine(DATABASE_URL, echo=False, future=True) if DATABASE_URL else None
+engine = make_engine(DATABASE_URL, name="app")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine) if engine else None
 
 
@@ -107,13 +109,18 @@ def get_user_by_id(user_id: int) -> Optional[Dict]:
 
 
 def current_user(request: Request) -> Optional[Dict]:
+    # Cached on request.state so stacked dependencies (and get_driver_context) share one lookup
+    if hasattr(request.state, "current_user"):
+        return request.state.current_user
     token = request.cookies.get(SESSION_COOKIE)
     data = read_session(token)
     if not data:
+        request.state.current_user = None
         return None
     user = get_user_by_id(data.get("uid"))
     if not user or not user.get("is_active"):
-        return None
+        user = None
+    request.state.current_user = user
     return user
 
 
@@ -130,6 +137,11 @@ def require_admin(user: Optional[Dict] = Depends(current_user)) -> Dict:
 
 
 def run_assistant_message(message: str, thread_id: Optional[str]) -> Dict:
+    """
+    Blocking assistant run, for scripts / sync callers only; it holds the calling thread until
+    the run ends. Async callers use app.core.assistant_runs.arun_assistant_message. Polls with
+    exponential backoff (0.25s doubling to 2s) instead of every 0.5s.
+    """
     if not openai_client:
         raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="OpenAI client not configured")
     if not ASSISTANT_ID:
@@ -155,8 +167,10 @@ def run_assistant_message(message: str, thread_id: Optional[str]) -> Dict:
     )
 
     start = time.time()
+    delay = 0.25
     while True:
-        time.sleep(0.5)
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
         run_status = openai_client.beta.threads.runs.retrieve(
             thread_id=thread_id,
             run_id=run.id,
@@ -4,13 +4,30 @@ Single place for the rule: if trucker_profiles.is_beta == true, skip Stripe chec
 """
 from __future__ import annotations
 
+import logging
+import os
 from typing import Any, Dict, Optional
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
-from app.core.deps import current_user, get_engine
+from app.core.cache import TTLCache
+from app.core.deps import SESSION_COOKIE, current_user, get_engine, read_session, engine as _engine
+
+logger = logging.getLogger(__name__)
+
+# Scout X-API-Key -> trucker_id. The extension polls every ~10s per board tab, so keep
+# this out of Postgres. Bad keys are cached briefly too so a misconfigured tab can't hammer the DB.
+# The cache is per worker and invalidate_api_key_cache() only reaches the worker that rotated
+# the key, so a rotated-out key keeps working on the other workers for up to the positive TTL.
+# Keep it short: that TTL is the revocation window.
+_API_KEY_CACHE = TTLCache(
+    max_entries=int(os.getenv("SCOUT_KEY_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.getenv("SCOUT_KEY_CACHE_TTL_SECONDS", "20")),
+)
+_API_KEY_NEGATIVE_TTL = float(os.getenv("SCOUT_KEY_NEGATIVE_TTL_SECONDS", "30"))
+_NOT_FOUND = object()
 
 
 def is_beta_driver(profile: Dict[str, Any]) -> bool:
@@ -18,6 +35,48 @@ def is_beta_driver(profile: Dict[str, Any]) -> bool:
     return bool(profile.get("is_beta"))
 
 
+def resolve_trucker_by_api_key(api_key: Optional[str], engine: Optional[Engine] = None) -> Optional[int]:
+    """
+    Resolve Scout X-API-Key to trucker_id. Returns None if missing/invalid.
+    Cached per worker (LRU + TTL, with a short negative TTL for unknown keys).
+    DB errors are not cached.
+    """
+    if not api_key:
+        return None
+    cached = _API_KEY_CACHE.get(api_key, _NOT_FOUND)
+    if cached is not _NOT_FOUND:
+        return cached
+    engine = engine or _engine
+    if not engine:
+        return None
+    try:
+        with engine.begin() as conn:
+            row = conn.execute(
+                text("SELECT id FROM webwise.trucker_profiles WHERE scout_api_key = :api_key"),
+                {"api_key": api_key},
+            ).fetchone()
+    except Exception as e:
+        logger.error(f"Error looking up API key: {e}")
+        return None
+    if row:
+        _API_KEY_CACHE.set(api_key, row[0])
+        return row[0]
+    _API_KEY_CACHE.set(api_key, None, ttl_seconds=_API_KEY_NEGATIVE_TTL)
+    return None
+
+
+def invalidate_api_key_cache(trucker_id: Optional[int] = None, api_key: Optional[str] = None) -> None:
+    """
+    Drop cached API-key entries. Call after rotating a key: pass trucker_id to evict the
+    old key and api_key to clear any negative entry for the new one. Only this worker's
+    cache is cleared; other workers drop the old key within SCOUT_KEY_CACHE_TTL_SECONDS.
+    """
+    if api_key:
+        _API_KEY_CACHE.delete(api_key)
+    if trucker_id is not None:
+        _API_KEY_CACHE.delete_where(lambda _k, v: v == trucker_id)
+
+
 def get_trucker_profile(engine: Engine, user_id: int) -> Optional[Dict[str, Any]]:
     """
     Load trucker profile for user_id. Returns dict with trucker_profile_id, user_id,
@@ -66,6 +125,80 @@ def get_trucker_profile(engine: Engine, user_id: int) -> Optional[Dict[str, Any]
     return dict(row) if row else None
 
 
+_DRIVER_CONTEXT_SQL = """
+    SELECT
+        u.id, u.email, u.password_hash, u.role, u.is_active, u.created_at, u.last_login,
+        tp.id AS trucker_id,
+        tp.display_name,
+        tp.mc_number,
+        tp.dot_number,
+        tp.authority_type,
+        tp.scout_api_key,
+        tp.reward_tier,
+        {optional_cols}
+    FROM webwise.users u
+    LEFT JOIN webwise.trucker_profiles tp ON tp.user_id = u.id
+    WHERE u.id = :uid
+    ORDER BY tp.id
+    LIMIT 1
+"""
+_USER_KEYS = ("id", "email", "password_hash", "role", "is_active", "created_at", "last_login")
+
+
+def _load_driver_context(engine: Engine, user_id: int) -> Optional[Dict[str, Any]]:
+    """One joined users + trucker_profiles read. Falls back if is_beta/setup_fee_paid are not migrated yet."""
+    try:
+        with engine.begin() as conn:
+            row = conn.execute(
+                text(_DRIVER_CONTEXT_SQL.format(optional_cols=(
+                    "COALESCE(tp.is_beta, false) AS is_beta, COALESCE(tp.setup_fee_paid, false) AS setup_fee_paid"
+                ))),
+                {"uid": user_id},
+            ).mappings().first()
+    except Exception:
+        with engine.begin() as conn:
+            row = conn.execute(
+                text(_DRIVER_CONTEXT_SQL.format(optional_cols="false AS is_beta, false AS setup_fee_paid")),
+                {"uid": user_id},
+            ).mappings().first()
+    if not row:
+        return None
+    row = dict(row)
+    return {
+        "user": {k: row[k] for k in _USER_KEYS},
+        "trucker_id": row["trucker_id"],
+        "display_name": row["display_name"],
+        "mc_number": row["mc_number"],
+        "dot_number": row["dot_number"],
+        "authority_type": row["authority_type"] or "MC",
+        "scout_api_key": row["scout_api_key"],
+        "reward_tier": row["reward_tier"] or "STANDARD",
+        "is_beta": bool(row["is_beta"]),
+        "setup_fee_paid": bool(row["setup_fee_paid"]),
+    }
+
+
+def get_driver_context(request: Request) -> Optional[Dict[str, Any]]:
+    """
+    Dependency: logged-in user + trucker profile from one joined query, cached on
+    request.state for the rest of the request. Returns None if not logged in / inactive.
+    Keys: user, trucker_id (None if no profile yet), display_name, mc_number, dot_number,
+    authority_type, scout_api_key, reward_tier, is_beta, setup_fee_paid.
+    Pass mc_number from here into VestingService/ledger helpers so they skip their own lookup.
+    """
+    if hasattr(request.state, "driver_ctx"):
+        return request.state.driver_ctx
+    ctx = None
+    data = read_session(request.cookies.get(SESSION_COOKIE))
+    if data and data.get("uid") and _engine:
+        ctx = _load_driver_context(_engine, data.get("uid"))
+        if ctx and not ctx["user"].get("is_active"):
+            ctx = None
+    request.state.driver_ctx = ctx
+    request.state.current_user = ctx["user"] if ctx else None
+    return ctx
+
+
 def driver_can_skip_payment(engine: Engine, profile: Dict[str, Any]) -> bool:
     """
     True if driver can skip Stripe/setup payment.
@@ -0,0 +1,125 @@
+"""
+Prompt registry: prompt files are read, parsed and hashed once, then served from memory.
+
+Each registered prompt is re-checked at most every PROMPT_RELOAD_CHECK_SECONDS with a stat();
+when the file's mtime or size changes it is re-parsed (hot reload, no restart needed). The
+sha256 identifies the prompt version, e.g. for keying cached answers to the prompt that
+produced them.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PROMPT_RELOAD_CHECK_SECONDS = float(os.getenv("PROMPT_RELOAD_CHECK_SECONDS", "5"))
+
+
+@dataclass(frozen=True)
+class Prompt:
+    name: str
+    text: str
+    sha256: str
+    source: str          # file path, or "fallback" when the file is missing / unreadable
+    loaded_at: float
+
+
+def markdown_section(heading: str) -> Callable[[str], str]:
+    """Parser keeping only the body of a '## heading' section (up to the next '##')."""
+    def parse(content: str) -> str:
+        prompt_lines = []
+        in_section = False
+        for line in content.split("\n"):
+            if heading in line:
+                in_section = True
+                continue
+            if in_section and line.startswith("##"):
+                break
+            if in_section:
+                prompt_lines.append(line)
+        return "\n".join(prompt_lines).strip()
+    return parse
+
+
+class PromptRegistry:
+    """Thread-safe name -> Prompt map with mtime-based hot reload."""
+
+    def __init__(self, check_seconds: float = PROMPT_RELOAD_CHECK_SECONDS):
+        self.check_seconds = check_seconds
+        self._lock = threading.Lock()
+        self._specs: Dict[str, Tuple[Path, Callable[[str], str], str]] = {}
+        self._prompts: Dict[str, Prompt] = {}
+        self._stamps: Dict[str, Optional[Tuple[float, int]]] = {}
+        self._checked: Dict[str, float] = {}
+        self.reloads = 0
+
+    def register(self, name: str, path: Path, parse: Callable[[str], str] = str.strip, fallback: str = "") -> None:
+        with self._lock:
+            self._specs[name] = (Path(path), parse, fallback)
+            self._prompts.pop(name, None)
+            self._checked.pop(name, None)
+
+    @staticmethod
+    def _stamp(path: Path) -> Optional[Tuple[float, int]]:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        return st.st_mtime, st.st_size
+
+    def _load(self, name: str, stamp: Optional[Tuple[float, int]]) -> Prompt:
+        path, parse, fallback = self._specs[name]
+        text, source = "", "fallback"
+        if stamp is not None:
+            try:
+                text, source = parse(path.read_text()), str(path)
+            except Exception as e:
+                logger.warning("prompt %s: could not load %s: %s", name, path, e)
+        if not text:
+            text, source = fallback.strip(), "fallback"
+        return Prompt(
+            name=name,
+            text=text,
+            sha256=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+            source=source,
+            loaded_at=time.time(),
+        )
+
+    def get(self, name: str) -> Prompt:
+        """Current version of a registered prompt (KeyError if not registered)."""
+        now = time.monotonic()
+        with self._lock:
+            prompt = self._prompts.get(name)
+            if prompt is not None and now - self._checked.get(name, 0) < self.check_seconds:
+                return prompt
+            path = self._specs[name][0]
+            stamp = self._stamp(path)
+            self._checked[name] = now
+            if prompt is None or stamp != self._stamps.get(name):
+                if prompt is not None:
+                    self.reloads += 1
+                    logger.info("prompt %s: reloading %s", name, path)
+                prompt = self._load(name, stamp)
+                self._prompts[name] = prompt
+                self._stamps[name] = stamp
+            return prompt
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "reloads": self.reloads,
+                "prompts": {
+                    name: {"sha256": p.sha256[:12], "source": p.source, "chars": len(p.text)}
+                    for name, p in self._prompts.items()
+                },
+            }
+
+
+prompt_registry = PromptRegistry()
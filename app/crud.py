@@ -1,4 +1,6 @@
-from typing import Optional, List
+from typing import Optional, List, Set
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from app.models.load import Load
 from app.schemas.load import LoadCreate
@@ -6,6 +8,16 @@ from app.schemas.load import LoadCreate
 def get_load_by_ref(db: Session, ref_id: str):
     return db.query(Load).filter(Load.ref_id == ref_id).first()
 
+def get_existing_load_refs(db: Session, ref_ids: List[str]) -> Set[str]:
+    """Return the subset of ref_ids already stored, in one ANY(:refs) query."""
+    if not ref_ids:
+        return set()
+    rows = db.execute(
+        text("SELECT ref_id FROM webwise.loads WHERE ref_id = ANY(:refs)"),
+        {"refs": list(ref_ids)},
+    ).all()
+    return {r[0] for r in rows}
+
 def create_load(db: Session, load: LoadCreate, discovered_by_id: Optional[int] = None):
     db_load = Load(
         ref_id=load.ref_id,
@@ -20,3 +32,33 @@ def create_load(db: Session, load: LoadCreate, discovered_by_id: Optional[int] =
     db.commit()
     db.refresh(db_load)
     return db_load
+
+def bulk_create_loads(db: Session, loads: List[LoadCreate], discovered_by_id: Optional[int] = None) -> Set[str]:
+    """
+    Insert many loads with a single multi-row INSERT ... ON CONFLICT (ref_id) DO NOTHING.
+    Returns the ref_ids that were actually inserted (rows another scrape already
+    claimed are skipped instead of raising a unique violation). Commits once.
+    """
+    if not loads:
+        return set()
+    rows = [
+        {
+            "ref_id": load.ref_id,
+            "origin": load.origin,
+            "destination": load.destination,
+            "price": load.price,
+            "equipment_type": load.equipment_type,
+            "pickup_date": load.pickup_date,
+            "discovered_by_id": discovered_by_id,
+        }
+        for load in loads
+    ]
+    stmt = (
+        pg_insert(Load.__table__)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["ref_id"])
+        .returning(Load.__table__.c.ref_id)
+    )
+    inserted = {r[0] for r in db.execute(stmt).all()}
+    db.commit()
+    return inserted
@@ -0,0 +1,48 @@
+"""
+Driver balance reconciliation job (APScheduler-style).
+Verifies webwise.driver_balances against SUM(amount_candle) of the ledger and, with fix,
+repairs drifted rows. Usage: python -m app.jobs.reconcile_driver_balances [--fix] [--limit N]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
+except ImportError:
+    pass
+
+from app.core.deps import engine
+from app.services.ledger import reconcile_driver_balances
+
+
+def run_reconcile_driver_balances(*, fix: bool | None = None, limit: int | None = None) -> dict:
+    """
+    Reports drift between the maintained balances and the ledger.
+    - fix: repair drifted/missing rows. Default from env RECONCILE_BALANCES_FIX (off).
+    """
+    if not engine:
+        return {"error": "Database not configured"}
+    fix_mode = fix if fix is not None else (os.getenv("RECONCILE_BALANCES_FIX", "").lower() in ("1", "true", "yes"))
+    result = reconcile_driver_balances(engine, fix=fix_mode, limit=limit)
+    result["fix"] = fix_mode
+    if result["drifted"] or result["missing"]:
+        print(f"⚠️ driver_balances drift: {result['drifted']} drifted, {result['missing']} missing, {result['fixed']} fixed")
+    return result
+
+
+def job_reconcile_driver_balances() -> None:
+    """Nightly check; repairs only when RECONCILE_BALANCES_FIX is set."""
+    run_reconcile_driver_balances()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Reconcile webwise.driver_balances with driver_savings_ledger")
+    ap.add_argument("--fix", action="store_true", help="Repair drifted rows")
+    ap.add_argument("--limit", type=int, default=None, help="Check at most N drifted truckers")
+    args = ap.parse_args()
+    print(json.dumps(run_reconcile_driver_balances(fix=args.fix, limit=args.limit), indent=2, default=str))
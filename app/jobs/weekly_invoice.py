@@ -0,0 +1,53 @@
+"""
+Weekly invoice job (APScheduler-style, Sunday night).
+Bills WEEKLY_INVOICE drivers' uninvoiced dispatch fees into driver_invoice_batches.
+Usage: python -m app.jobs.weekly_invoice [--dry-run] [--chunk-size N]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
+except ImportError:
+    pass
+
+from app.core.deps import engine
+from app.services.weekly_invoice import create_weekly_invoice_batches
+
+
+def run_weekly_invoice(*, dry_run: bool | None = None, chunk_size: int | None = None) -> dict:
+    """
+    Creates this week's invoice batches.
+    - dry_run: preview only (no writes). Default from env DRY_RUN.
+    """
+    if not engine:
+        return {"error": "Database not configured"}
+    dry_run_mode = dry_run if dry_run is not None else (os.getenv("DRY_RUN", "").lower() in ("1", "true", "yes"))
+    start = time.time()
+    batches = create_weekly_invoice_batches(engine, chunk_size=chunk_size, dry_run=dry_run_mode)
+    return {
+        "dry_run": dry_run_mode,
+        "batch_count": len(batches),
+        "total_amount_usd": round(sum(b["total_amount_usd"] for b in batches), 2),
+        "elapsed_seconds": round(time.time() - start, 2),
+        "batches": batches,
+    }
+
+
+def job_weekly_invoice() -> None:
+    """Sunday-night run (writes unless DRY_RUN is set)."""
+    run_weekly_invoice()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Create weekly invoice batches for WEEKLY_INVOICE drivers")
+    ap.add_argument("--dry-run", action="store_true", help="Report batches without creating them")
+    ap.add_argument("--chunk-size", type=int, default=None, help="Drivers per transaction")
+    args = ap.parse_args()
+    print(json.dumps(run_weekly_invoice(dry_run=args.dry_run or None, chunk_size=args.chunk_size), indent=2, default=str))
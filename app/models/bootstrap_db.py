@@ -3,9 +3,11 @@
 import os
 from pathlib import Path
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.orm import declarative_base
 
+from app.core.db import make_engine
+
 Base = declarative_base()
 
 try:
@@ -17,7 +19,8 @@ except ImportError:
     pass
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, echo=True, future=True) if DATABASE_URL else None
+# Same shared pool as app.core.deps (models are imported at app startup); echo via DB_ECHO.
+engine = make_engine(DATABASE_URL, name="app")
 
 
 def _hash_password(password: str) -> str:
@@ -33,7 +36,7 @@ def run_bootstrap():
     """Create webwise schema, tables, and seed data. Call when running this file as __main__."""
     if not DATABASE_URL:
         raise RuntimeError("DATABASE_URL not set in environment")
-    eng = create_engine(DATABASE_URL, echo=True, future=True)
+    eng = engine
     with eng.begin() as conn:
         conn.execute(text("CREATE SCHEMA IF NOT EXISTS webwise;"))
         conn.execute(text("""
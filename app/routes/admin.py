@@ -4,6 +4,12 @@ from sqlalchemy import text
 import logging
 
 from app.core.deps import templates, engine, require_admin, get_db
+from app.core.db import pool_metrics
+from app.core.chat_answers import answer_cache
+from app.core.chat_responses import chat_limiter
+from app.core.prompt_registry import prompt_registry
+from app.core.conversation_store import get_conversation_store
+from app.services.broker_search import search_brokers
 from app.services.payments import RevenueService
 from app.services.beta_activation import update_beta_activity, STAGE_FIRST_LOAD_WON
 from app.services.referral import ReferralService
@@ -469,6 +475,30 @@ def network_health(request: Request):
     )
 
 
+@router.get("/admin/db-pool-metrics", dependencies=[Depends(require_admin)])
+def db_pool_metrics():
+    """
+    JSON: connection pool status per engine (pool_size, in_use, idle, overflow,
+    checkout wait avg/max, checkout timeouts). Use to size workers against max_connections.
+    """
+    return JSONResponse(content={"engines": pool_metrics()})
+
+
+@router.get("/admin/chat-metrics", dependencies=[Depends(require_admin)])
+def chat_metrics():
+    """
+    JSON: public chat widget health for this worker — conversation store (entries, approx
+    bytes, hits/misses, evictions), canned-answer hit rate, loaded prompt versions and
+    in-flight chat requests.
+    """
+    return JSONResponse(content={
+        "conversations": get_conversation_store().stats(),
+        "answers": answer_cache.stats(),
+        "prompts": prompt_registry.stats(),
+        "concurrency": chat_limiter.stats(),
+    })
+
+
 @router.get("/admin/usage-stats", dependencies=[Depends(require_admin)])
 def admin_usage_stats(request: Request):
     """
@@ -599,20 +629,32 @@ def view_leads_dashboard(request: Request):
     )
 
 
+@router.get("/admin/broker/search", dependencies=[Depends(require_admin)])
+def broker_search(q: str | None = None, limit: int = 10):
+    """
+    JSON typeahead over the broker directory: MC/DOT numbers, email or website domain,
+    or company/DBA name (trigram ranked). See app/services/broker_search.py.
+    """
+    return JSONResponse(content={"q": q or "", "results": search_brokers(engine, q, limit)})
+
+
 @router.get("/admin/broker", dependencies=[Depends(require_admin)])
 def broker_lookup(request: Request, mc: str | None = None):
-    """Lookup broker by MC number. Shows all contact info and emails."""
+    """Lookup broker by MC number (or search by name / email domain). Shows all contact info and emails."""
     broker = None
     emails = []
+    matches = []
     error = None
     mc_clean = None
 
     if mc:
         mc_clean = "".join(c for c in str(mc).strip() if c.isdigit())
-        if not mc_clean:
-            error = "Please enter a valid MC number (digits only)."
-        elif not engine:
+        if not engine:
             error = "Database not configured."
+        elif not mc_clean or any(c.isalpha() for c in str(mc).strip().lower().removeprefix("mc")):
+            # Not an MC number: treat the input as a name / email / domain search.
+            mc_clean = None
+            matches = search_brokers(engine, mc, limit=25)
         else:
             with engine.begin() as conn:
                 row = conn.execute(
@@ -645,6 +687,7 @@ def broker_lookup(request: Request, mc: str | None = None):
             "mc_clean": mc_clean,
             "broker": broker,
             "emails": emails,
+            "matches": matches,
             "error": error,
         },
     )
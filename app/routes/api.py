@@ -6,6 +6,7 @@ from typing import Optional
 
 from app.schemas.scout import ScoutUpdate
 from app.core.deps import engine
+from app.core.deps_trucker import resolve_trucker_by_api_key
 from app.services.beta_activation import update_beta_activity, STAGE_FIRST_SCOUT
 from app.services.storage import get_object
 from sqlalchemy import text
@@ -13,21 +14,6 @@ from sqlalchemy import text
 router = APIRouter(prefix="/api", tags=["api"])
 
 
-def _get_trucker_by_api_key(api_key: Optional[str]) -> Optional[int]:
-    """Resolve X-API-Key to trucker_id."""
-    if not api_key or not engine:
-        return None
-    try:
-        with engine.begin() as conn:
-            row = conn.execute(
-                text("SELECT id FROM webwise.trucker_profiles WHERE scout_api_key = :api_key"),
-                {"api_key": api_key}
-            ).fetchone()
-            return row[0] if row else None
-    except Exception:
-        return None
-
-
 @router.post("/scout/heartbeat")
 async def scout_heartbeat(
     payload: ScoutUpdate,
@@ -37,7 +23,7 @@ async def scout_heartbeat(
     Chrome Extension Scout sends heartbeat: lanes, min_rpm, active.
     Stores in scout_status table. Requires X-API-Key header.
     """
-    trucker_id = _get_trucker_by_api_key(x_api_key)
+    trucker_id = resolve_trucker_by_api_key(x_api_key)
     if not trucker_id:
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
 
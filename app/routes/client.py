@@ -10,7 +10,7 @@ from datetime import datetime
 from sqlalchemy.exc import ProgrammingError
 
 from app.core.deps import templates, current_user, engine, get_db
-from app.core.deps_trucker import driver_can_skip_payment, is_beta_driver
+from app.core.deps_trucker import driver_can_skip_payment, is_beta_driver, invalidate_api_key_cache, get_driver_context
 from app.services.beta_activation import update_beta_activity, STAGE_LOGGED_IN, STAGE_FIRST_LOAD_WON
 from app.services.ai_agent import AIAgentService
 from app.services.negotiation import save_negotiation
@@ -20,114 +20,62 @@ from app.services.factoring import push_invoice_to_factor, send_packet_to_factor
 from app.services.invoice import generate_invoice_pdf
 from app.services.tokenomics import credit_driver_savings
 from app.services.buyback_notifications import BuybackNotificationService
-from app.services.email import send_negotiation_email, send_factoring_referral_email
+from app.services.email import send_negotiation_email, send_factoring_referral_email, EMAIL_OUTBOX_ENABLED
 import stripe
-from app.services.ai_logic import extract_bid_details, parse_sender_email
+from app.services.ai_logic import bid_details_from_row, parse_sender_email, PARSER_VERSION
 from app.services.calculator import calculate_break_even, DEFAULT_FUEL_PRICE
 from app.services.market_intel import get_market_average, parse_origin_dest_states
-from app.services.ledger import issue_load_credits, process_load_settlement, record_usage, AUTOPILOT_COST, estimate_credits_for_load, OUTBOUND_EMAIL_COST
+from app.services.ledger import issue_load_credits, process_load_settlement, record_usage, debit_fuel, refund_fuel, AUTOPILOT_COST, estimate_credits_for_load, OUTBOUND_EMAIL_COST
 from app.services.vesting import VestingService
+from app.services.driver_dashboard import get_dashboard_snapshot, invalidate_dashboard_snapshot
 from app.schemas.load import LoadResponse, LoadStatus
 
 router = APIRouter()
 
 
 @router.get("/drivers/dashboard", response_class=HTMLResponse)
-def client_dashboard(request: Request, user: Optional[Dict] = Depends(current_user)):
+def client_dashboard(request: Request, ctx: Optional[Dict] = Depends(get_driver_context)):
     """GCD Command Center - Primary driver dashboard with Active Negotiations."""
+    user = ctx["user"] if ctx else None
     if not user or user.get("role") != "client":
         return RedirectResponse(url="/login/client", status_code=303)
     if not engine:
         raise HTTPException(status_code=500, detail="Database not available")
-    try:
-        with engine.begin() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT tp.id, tp.display_name, tp.mc_number, tp.dot_number, tp.scout_api_key, COALESCE(tp.is_beta, false) AS is_beta
-                    FROM webwise.trucker_profiles tp
-                    WHERE tp.user_id = :uid
-                """),
-                {"uid": user.get("id")},
-            ).first()
-    except ProgrammingError:
-        with engine.begin() as conn:
-            row = conn.execute(
-                text("""
-                    SELECT tp.id, tp.display_name, tp.mc_number, NULL, tp.scout_api_key, false AS is_beta
-                    FROM webwise.trucker_profiles tp
-                    WHERE tp.user_id = :uid
-                """),
-                {"uid": user.get("id")},
-            ).first()
     # Beta activation: first dashboard load -> LOGGED_IN
-    profile_for_beta = {"is_beta": getattr(row, "is_beta", False) if row else False}
+    profile_for_beta = {"is_beta": ctx["is_beta"]}
     if is_beta_driver(profile_for_beta):
         update_beta_activity(engine, user_id=user.get("id"), new_stage=STAGE_LOGGED_IN)
     # GATEKEEPER: redirect incomplete profiles to onboarding
-    has_display_name = row and (row[1] or "").strip()
-    mc_val = (row[2] or "").strip() if row and len(row) > 2 else ""
-    dot_val = (row[3] or "").strip() if row and len(row) > 3 else ""
+    has_display_name = (ctx["display_name"] or "").strip()
+    mc_val = (ctx["mc_number"] or "").strip()
+    dot_val = (ctx["dot_number"] or "").strip()
     has_mc_or_dot = bool(mc_val or dot_val)
-    if not row or not has_display_name or not has_mc_or_dot:
+    if not ctx["trucker_id"] or not has_display_name or not has_mc_or_dot:
         return RedirectResponse(url="/drivers/onboarding/welcome", status_code=303)
-    trucker_id = row[0]
+    trucker_id = ctx["trucker_id"]
+    # One CTE round trip (micro-cached): referral status, balance, negotiations-exist
+    snapshot = get_dashboard_snapshot(engine, trucker_id, ctx["mc_number"])
     # GATEKEEPER: Century approval OR Universal (setup_fee_paid)
     if not is_beta_driver(profile_for_beta):
-        with engine.begin() as conn:
-            century_status = conn.execute(
-                text("SELECT status FROM webwise.factoring_referrals WHERE trucker_id = :tid ORDER BY submitted_at DESC LIMIT 1"),
-                {"tid": trucker_id},
-            ).scalar()
-            setup_fee_paid = False
-            try:
-                setup_fee_paid = conn.execute(
-                    text("SELECT setup_fee_paid FROM webwise.trucker_profiles WHERE id = :tid"),
-                    {"tid": trucker_id},
-                ).scalar() or False
-            except Exception:
-                pass
-            # Unlock if: Century APPROVED, or Universal (setup_fee_paid)
-            if century_status == "APPROVED" or setup_fee_paid:
-                pass  # allow
-            elif century_status in ("PENDING", "CONTACTED", "DECLINED"):
-                pass  # allow (pending/declined get dashboard with banner)
-            elif century_status is None and not setup_fee_paid:
-                return RedirectResponse(url="/drivers/century-onboarding", status_code=303)
-            elif century_status in ("PENDING", "CONTACTED"):
-                # Submitted but not approved yet — show dashboard with pending banner (or redirect)
-                # For now, allow dashboard access but could add a banner
-                pass  # Allow through, dashboard can show pending message
-            elif century_status == "DECLINED":
-                # Declined — allow dashboard but show declined message
-                pass  # Allow through, dashboard can show declined/refund message
-            # APPROVED/SIGNED → allow full dashboard (no redirect)
-    api_key_raw = row[4] if row and len(row) > 4 else None
+        century_status = snapshot["century_status"]
+        setup_fee_paid = ctx["setup_fee_paid"]
+        # Unlock if: Century APPROVED, or Universal (setup_fee_paid).
+        # PENDING/CONTACTED/DECLINED get the dashboard with a banner.
+        if century_status is None and not setup_fee_paid:
+            return RedirectResponse(url="/drivers/century-onboarding", status_code=303)
+    api_key_raw = ctx["scout_api_key"]
     api_key_display = None
     if api_key_raw and len(api_key_raw) >= 8:
         api_key_display = f"{api_key_raw[:8]}...{api_key_raw[-4:]}" if len(api_key_raw) > 12 else api_key_raw[:8] + "..."
     elif api_key_raw:
         api_key_display = api_key_raw[:4] + "..."
-    trucker = {"id": row[0], "display_name": row[1] or "Driver", "mc_number": mc_val or dot_val or "—"}
+    trucker = {"id": trucker_id, "display_name": ctx["display_name"] or "Driver", "mc_number": mc_val or dot_val or "—"}
     show_beta_banner = is_beta_driver(profile_for_beta)
-    balance = VestingService.get_claimable_balance(engine, trucker["id"])
-    balance_val = balance or 0
-    # Get Century status for dashboard banner
-    century_status_for_banner = None
-    if not is_beta_driver(profile_for_beta) and engine:
-        with engine.begin() as conn:
-            century_status_for_banner = conn.execute(
-                text("SELECT status FROM webwise.factoring_referrals WHERE trucker_id = :tid ORDER BY submitted_at DESC LIMIT 1"),
-                {"tid": trucker["id"]},
-            ).scalar()
+    balance_val = snapshot["balance"]
+    # Century status for dashboard banner (same row as the gate)
+    century_status_for_banner = None if is_beta_driver(profile_for_beta) else snapshot["century_status"]
     # First Mission tutorial: exactly starter balance (10 or 50 $CANDLE) and zero negotiations
-    is_new_driver = False
-    if round(balance_val, 1) in (10.0, 50.0):
-        with engine.begin() as conn:
-            neg_count = conn.execute(
-                text("SELECT COUNT(*) FROM webwise.negotiations WHERE trucker_id = :tid"),
-                {"tid": trucker["id"]},
-            ).scalar()
-            is_new_driver = (neg_count or 0) == 0
+    is_new_driver = snapshot["is_new_driver"]
     return templates.TemplateResponse(
         "drivers/dashboard2.html",
         {
@@ -388,53 +336,39 @@ def driver_uploads_page(request: Request, user: Optional[Dict] = Depends(current
 
 
 @router.get("/drivers/partials/first-mission", response_class=HTMLResponse)
-def first_mission_modal(request: Request, user: Optional[Dict] = Depends(current_user)):
+def first_mission_modal(request: Request, ctx: Optional[Dict] = Depends(get_driver_context)):
     """
     HTMX: Returns First Mission tutorial modal for rookies.
     Only shown when balance is starter (10 or 50) and zero negotiations.
     """
+    user = ctx["user"] if ctx else None
     if not user or user.get("role") != "client" or not engine:
         return HTMLResponse(content="")
-    with engine.begin() as conn:
-        row = conn.execute(
-            text("SELECT id FROM webwise.trucker_profiles WHERE user_id = :uid"),
-            {"uid": user.get("id")},
-        ).first()
-        if not row:
-            return HTMLResponse(content="")
-        trucker_id = row[0]
-    balance = VestingService.get_claimable_balance(engine, trucker_id) or 0
-    if round(balance, 1) not in (10.0, 50.0):
+    trucker_id = ctx["trucker_id"]
+    if not trucker_id:
         return HTMLResponse(content="")
-    with engine.begin() as conn:
-        neg_count = conn.execute(
-            text("SELECT COUNT(*) FROM webwise.negotiations WHERE trucker_id = :tid"),
-            {"tid": trucker_id},
-        ).scalar()
-    if (neg_count or 0) > 0:
+    snapshot = get_dashboard_snapshot(engine, trucker_id, ctx["mc_number"])
+    if not snapshot["is_new_driver"]:
         return HTMLResponse(content="")
     return templates.TemplateResponse(
         "drivers/partials/first_mission_modal.html",
-        {"request": request, "balance": balance},
+        {"request": request, "balance": snapshot["balance"]},
     )
 
 
 @router.get("/drivers/scout-status", response_class=HTMLResponse)
-def scout_status(request: Request, user: Optional[Dict] = Depends(current_user)):
+def scout_status(request: Request, ctx: Optional[Dict] = Depends(get_driver_context)):
     """
     HTMX: Returns Live Intelligence box with Scout heartbeat data.
     Polled by dashboard2 every 60s. Shows ACTIVE/IDLE, lanes, target RPM.
     """
+    user = ctx["user"] if ctx else None
     if not user or user.get("role") != "client" or not engine:
         return HTMLResponse(content="")
+    trucker_id = ctx["trucker_id"]
+    if not trucker_id:
+        return HTMLResponse(content="")
     with engine.begin() as conn:
-        row = conn.execute(
-            text("SELECT id FROM webwise.trucker_profiles WHERE user_id = :uid"),
-            {"uid": user.get("id")},
-        ).first()
-        if not row:
-            return HTMLResponse(content="")
-        trucker_id = row[0]
         try:
             status_row = conn.execute(
                 text("SELECT lanes, min_rpm, active FROM webwise.scout_status WHERE trucker_id = :tid"),
@@ -455,23 +389,19 @@ def scout_status(request: Request, user: Optional[Dict] = Depends(current_user))
 
 
 @router.get("/drivers/dashboard-active-loads", response_class=HTMLResponse)
-def dashboard_active_loads(request: Request, user: Optional[Dict] = Depends(current_user)):
+def dashboard_active_loads(request: Request, ctx: Optional[Dict] = Depends(get_driver_context)):
     """
     HTMX: Returns active negotiation card(s) or 'Scanning for Opportunities' placeholder.
     Fetches in-progress negotiations (status in sent, replied, pending) with broker offer,
     AI target, mini-timeline, and action buttons.
     """
+    user = ctx["user"] if ctx else None
     if not user or user.get("role") != "client" or not engine:
         return _dashboard_active_loads_empty(request)
-    with engine.begin() as conn:
-        row = conn.execute(
-            text("SELECT id, display_name FROM webwise.trucker_profiles WHERE user_id = :uid"),
-            {"uid": user.get("id")},
-        ).first()
-    if not row or not (row.display_name or "").strip():
+    if not ctx["trucker_id"] or not (ctx["display_name"] or "").strip():
         return _dashboard_active_loads_empty(request)
-    trucker_id = row.id
-    display_name = (row.display_name or "").strip().lower()
+    trucker_id = ctx["trucker_id"]
+    display_name = (ctx["display_name"] or "").strip().lower()
 
     try:
         with engine.begin() as conn:
@@ -505,25 +435,41 @@ def dashboard_active_loads(request: Request, user: Optional[Dict] = Depends(curr
     if not negotiations:
         return _dashboard_active_loads_empty(request)
 
+    # Last 5 messages per active load in one windowed query (no per-load round trips).
+    # Reads the indexed driver_handle and parse-once offer columns written by inbound_listener.
+    active_load_ids = [str(n.load_id).strip() for n in negotiations if n.load_id and str(n.load_id).strip()]
+    msgs_by_load: Dict[str, list] = {}
+    if active_load_ids:
+        with engine.begin() as conn:
+            msg_rows = conn.execute(
+                text("""
+                    SELECT load_id, extracted_offer, broker_ready, parser_version, received_at, created_at,
+                           CASE WHEN parser_version IS DISTINCT FROM :ver THEN body_text END AS body_text
+                    FROM (
+                        SELECT m.load_id, m.extracted_offer, m.broker_ready, m.parser_version, m.body_text,
+                               m.received_at, m.created_at,
+                               ROW_NUMBER() OVER (
+                                   PARTITION BY m.load_id
+                                   ORDER BY COALESCE(m.received_at, m.created_at) DESC NULLS LAST
+                               ) AS rn
+                        FROM webwise.messages m
+                        WHERE m.driver_handle = :dn
+                          AND m.load_id = ANY(:load_ids)
+                    ) ranked
+                    WHERE rn <= 5
+                    ORDER BY load_id, rn
+                """),
+                {"dn": display_name, "load_ids": active_load_ids, "ver": PARSER_VERSION},
+            ).fetchall()
+        for m in msg_rows:
+            msgs_by_load.setdefault(m.load_id, []).append(m)
+
     loads_data = []
     for neg in negotiations:
         load_id = str(neg.load_id or "").strip() if neg.load_id else ""
         if not load_id:
             continue
-
-        msgs = []
-        with engine.begin() as conn2:
-            msg_rows = conn2.execute(
-                text("""
-                    SELECT sender_email, body_text, received_at, created_at
-                    FROM webwise.messages
-                    WHERE LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1)) = :dn
-                    AND load_id = :load_id
-                    ORDER BY COALESCE(received_at, created_at) DESC NULLS LAST
-                    LIMIT 5
-                """),
-                {"dn": display_name, "load_id": load_id},
-            ).fetchall()
+        msg_rows = msgs_by_load.get(load_id, [])
 
         broker_offer = None
         broker_ready = False
@@ -538,10 +484,11 @@ def dashboard_active_loads(request: Request, user: Optional[Dict] = Depends(curr
             dt = getattr(m, "received_at", None) or getattr(m, "created_at", None)
             if dt and hasattr(dt, "strftime"):
                 ts = dt.strftime("%I:%M %p").lstrip("0")
-            parsed = extract_bid_details(m.body_text or "")
+            # Stored at ingest; body_text only comes back for rows not yet backfilled
+            parsed = bid_details_from_row(m)
             if parsed.get("extracted_offer") is not None:
                 broker_offer = parsed["extracted_offer"]
-            broker_ready = parsed.get("broker_ready", False)
+            broker_ready = bool(parsed.get("broker_ready", False))
             timeline.append({"time": ts, "text": "Broker replied. AI countering with Market Intel."})
             if len(timeline) >= 3:
                 break
@@ -571,7 +518,7 @@ def dashboard_active_loads(request: Request, user: Optional[Dict] = Depends(curr
         })
 
     if not loads_data:
-        balance = VestingService.get_claimable_balance(engine, trucker_id) if trucker_id else 0
+        balance = get_dashboard_snapshot(engine, trucker_id, ctx["mc_number"])["balance"]
         return _dashboard_active_loads_empty(request, balance or 0)
 
     return templates.TemplateResponse(
@@ -1495,6 +1442,7 @@ def century_onboarding_submit(
                         "payment_intent_id": payment_intent_id,
                     })
                     referral_id = referral_id_result.scalar()
+                invalidate_dashboard_snapshot(trucker_id)
         except Exception as e:
             import logging
             logger = logging.getLogger(__name__)
@@ -1830,6 +1778,7 @@ def submit_factoring_application(
                         "current_factoring_company": referral_data["current_factoring_company"],
                         "preferred_funding_speed": referral_data["preferred_funding_speed"],
                     })
+                invalidate_dashboard_snapshot(trucker_id)
         except Exception:
             pass
     if result.get("status") == "success":
@@ -1988,7 +1937,8 @@ def negotiation_terminal(request: Request, load_id: str, user: Optional[Dict] =
 
         messages = conn.execute(
             text("""
-                SELECT id, sender_email, subject, body_text, is_read, received_at
+                SELECT id, sender_email, subject, body_text, is_read, received_at,
+                       extracted_offer, broker_ready, parser_version
                 FROM webwise.messages
                 WHERE LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1)) = :display_name
                 AND load_id = :load_id
@@ -2016,8 +1966,7 @@ def negotiation_terminal(request: Request, load_id: str, user: Optional[Dict] =
     gap = None
     broker_ready = False
     if msgs:
-        last_body = msgs[-1].get("body_text", "")
-        parsed = extract_bid_details(last_body)
+        parsed = bid_details_from_row(messages[-1])
         latest_offer = parsed.get("extracted_offer")
         broker_ready = parsed.get("broker_ready", False)
         if latest_offer is not None:
@@ -2140,11 +2089,37 @@ def negotiation_terminal(request: Request, load_id: str, user: Optional[Dict] =
     )
 
 
+def _debit_outbound_email(trucker_id: int, load_id: str, event_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    Charge OUTBOUND_EMAIL_COST before an email is sent. Returns the debit (pass it to
+    _refund_outbound_email if the send fails), or None when event_id was already charged
+    (the email went out or is queued; do not send it again). Raises 402 if the balance is short.
+    """
+    debit = debit_fuel(engine, trucker_id, load_id, "MANUAL_EMAIL", event_id=event_id)
+    if debit["status"] == "duplicate":
+        return None
+    if debit["status"] in ("insufficient", "no_profile"):
+        raise HTTPException(
+            status_code=402,
+            detail=f"Insufficient $CANDLE. Need {OUTBOUND_EMAIL_COST} for outbound email, have {debit['balance']:.2f}.",
+        )
+    if not debit["charged"]:
+        raise HTTPException(status_code=500, detail="Could not charge outbound email")
+    invalidate_dashboard_snapshot(trucker_id)
+    return debit
+
+
+def _refund_outbound_email(trucker_id: int, load_id: str, debit: Dict, message: Optional[str]) -> None:
+    print(f"Email for {load_id} failed, refunding: {message}")
+    refund_fuel(engine, debit["ledger_id"])
+    invalidate_dashboard_snapshot(trucker_id)
+
+
 @router.post("/drivers/negotiate/{load_id}/counter", response_class=HTMLResponse)
 def negotiate_counter(
     load_id: str,
     request: Request,
-    user: Optional[Dict] = Depends(current_user),
+    ctx: Optional[Dict] = Depends(get_driver_context),
     increment: int = Form(100),
     truck_number: Optional[str] = Form(None),
 ):
@@ -2152,6 +2127,7 @@ def negotiate_counter(
     Driver taps Counter +$100 (or custom increment). Finds broker from last message,
     computes new rate, sends negotiation email. HTMX: hx-swap=none, then trigger refresh.
     """
+    user = ctx["user"] if ctx else None
     if not user or user.get("role") != "client":
         if request.headers.get("HX-Request"):
             raise HTTPException(status_code=401, detail="Unauthorized")
@@ -2159,23 +2135,19 @@ def negotiate_counter(
     if not engine:
         raise HTTPException(status_code=503, detail="Database not configured")
 
-    with engine.begin() as conn:
-        r = conn.execute(
-            text("SELECT id, display_name FROM webwise.trucker_profiles WHERE user_id = :uid"),
-            {"uid": user.get("id")},
-        )
-        row = r.first()
-        if not row:
-            raise HTTPException(status_code=403, detail="No trucker profile")
-        trucker_id = row.id
-        display_name = (row.display_name or "").strip().lower()
-        if not display_name:
-            raise HTTPException(status_code=400, detail="Display name required")
+    if not ctx["trucker_id"]:
+        raise HTTPException(status_code=403, detail="No trucker profile")
+    trucker_id = ctx["trucker_id"]
+    mc_number = ctx["mc_number"]
+    display_name = (ctx["display_name"] or "").strip().lower()
+    if not display_name:
+        raise HTTPException(status_code=400, detail="Display name required")
 
+    with engine.begin() as conn:
         # Last message for this load (broker's reply)
         msgs = conn.execute(
             text("""
-                SELECT sender_email, subject, body_text
+                SELECT id, sender_email, subject, body_text, extracted_offer, broker_ready, parser_version
                 FROM webwise.messages
                 WHERE LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1)) = :display_name
                 AND load_id = :load_id
@@ -2189,7 +2161,7 @@ def negotiate_counter(
         raise HTTPException(status_code=400, detail="No broker messages for this load")
 
     # Balance check: 0.1 $CANDLE per outbound email
-    balance = VestingService.get_claimable_balance(engine, trucker_id)
+    balance = VestingService.get_claimable_balance(engine, trucker_id, mc_number=mc_number)
     if balance < OUTBOUND_EMAIL_COST:
         raise HTTPException(
             status_code=402,
@@ -2201,7 +2173,7 @@ def negotiate_counter(
     if not broker_email or "@" not in broker_email:
         raise HTTPException(status_code=400, detail="Could not extract broker email")
 
-    parsed = extract_bid_details(last.body_text or "")
+    parsed = bid_details_from_row(last)
     base_offer = parsed.get("extracted_offer")
     current_rate = float(base_offer) if base_offer is not None else 0.0
     new_rate = int(current_rate) + int(increment)
@@ -2243,6 +2215,18 @@ def negotiate_counter(
 
     subject = f"Re: {last.subject}" if last.subject else f"Counter Offer - Load {load_id}"
     body = f"We can do ${new_rate:,} all-in. Let me know."
+    # Charged before sending (one atomic conditional debit). The key is scoped to the broker
+    # message being answered, so a double-click / retry of this submission is collapsed (no
+    # second charge, no second email) while the same rate sent after a new broker reply is not.
+    counter_event = f"counter-{negotiation_id}-{last.id}-{new_rate}"
+    debit = _debit_outbound_email(trucker_id, load_id, event_id=counter_event)
+    if debit is None:
+        return HTMLResponse(content="", status_code=204, headers={"HX-Trigger": "negotiationUpdated"})
+
+    def _refund_if_failed(sent: Dict) -> None:
+        if sent.get("status") != "success":
+            _refund_outbound_email(trucker_id, load_id, debit, sent.get("message"))
+
     result = send_negotiation_email(
         to_email=broker_email,
         subject=subject,
@@ -2252,13 +2236,15 @@ def negotiate_counter(
         driver_name=display_name,
         load_source=None,
         truck_number=truck_number,
+        background=EMAIL_OUTBOX_ENABLED,
+        on_sent=_refund_if_failed if EMAIL_OUTBOX_ENABLED else None,
     )
 
-    if result.get("status") != "success":
+    # "queued": the outbox sends in the background and refunds via on_sent if the send fails.
+    if result.get("status") not in ("success", "queued"):
+        _refund_outbound_email(trucker_id, load_id, debit, result.get("message"))
         raise HTTPException(status_code=500, detail=result.get("message", "Failed to send email"))
 
-    record_usage(engine, trucker_id, load_id, "MANUAL_EMAIL")
-
     # HTMX: swap=none, trigger refresh so terminal updates
     return HTMLResponse(
         content="",
@@ -2299,7 +2285,7 @@ def negotiate_counter_to_market(
 
         msgs = conn.execute(
             text("""
-                SELECT sender_email, subject, body_text
+                SELECT sender_email, subject, body_text, extracted_offer, broker_ready, parser_version
                 FROM webwise.messages
                 WHERE LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1)) = :display_name
                 AND load_id = :load_id
@@ -2375,6 +2361,7 @@ def negotiate_counter_to_market(
 
     subject = f"Re: {last.subject}" if last.subject else f"Counter Offer - Load {load_id}"
     body = f"Based on current lane rates (${market_rpm:.2f}/mi), we can do ${new_rate:,} all-in. Fair market for this run. Let me know."
+    debit = _debit_outbound_email(trucker_id, load_id)
     result = send_negotiation_email(
         to_email=broker_email,
         subject=subject,
@@ -2387,10 +2374,9 @@ def negotiate_counter_to_market(
     )
 
     if result.get("status") != "success":
+        _refund_outbound_email(trucker_id, load_id, debit, result.get("message"))
         raise HTTPException(status_code=500, detail=result.get("message", "Failed to send email"))
 
-    record_usage(engine, trucker_id, load_id, "MANUAL_EMAIL")
-
     return HTMLResponse(
         content="",
         status_code=204,
@@ -2427,14 +2413,14 @@ def negotiate_accept(
         # Last message for rate extraction
         msgs = conn.execute(
             text("""
-                SELECT body_text FROM webwise.messages
+                SELECT body_text, extracted_offer, broker_ready, parser_version FROM webwise.messages
                 WHERE LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1)) = :dn
                 AND load_id = :load_id
                 ORDER BY received_at DESC LIMIT 1
             """),
             {"dn": (row.display_name or "").strip().lower(), "load_id": load_id},
         ).first()
-        parsed = extract_bid_details(msgs.body_text if msgs else "") if msgs else {}
+        parsed = bid_details_from_row(msgs) if msgs else {}
         final_rate = parsed.get("extracted_offer")
 
         neg = conn.execute(
@@ -4385,6 +4371,8 @@ async def generate_api_key(request: Request, user: Optional[Dict] = Depends(curr
             """),
             {"api_key": new_api_key, "trucker_id": trucker_id}
         )
+    # Old key stops authenticating here immediately; other workers follow within the cache TTL
+    invalidate_api_key_cache(trucker_id=trucker_id, api_key=new_api_key)
     
     # Fetch updated profile info for display
     mc_number = None
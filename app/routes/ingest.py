@@ -2,8 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends, Request, Header
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import logging
-from app.core.deps import get_db, engine
-from sqlalchemy import text
+from app.core.deps import get_db
+from app.core.deps_trucker import resolve_trucker_by_api_key
 import app.crud as crud
 from app.schemas.load import LoadCreate
 
@@ -24,21 +24,6 @@ def analyze_profitability(load: LoadCreate):
         return False, 0
 
 
-def get_trucker_by_api_key(api_key: Optional[str]) -> Optional[int]:
-    """Get trucker_id from API key. Returns None if invalid."""
-    if not api_key or not engine:
-        return None
-    try:
-        with engine.begin() as conn:
-            row = conn.execute(
-                text("SELECT id FROM webwise.trucker_profiles WHERE scout_api_key = :api_key"),
-                {"api_key": api_key}
-            ).fetchone()
-            return row.id if row else None
-    except Exception as e:
-        logger.error(f"Error looking up API key: {e}")
-        return None
-
 @router.post("/loads", status_code=200)
 def ingest_loads(
     loads: List[LoadCreate], 
@@ -51,7 +36,7 @@ def ingest_loads(
     Requires API key authentication via X-API-Key header.
     """
     # Authenticate via API key
-    trucker_id = get_trucker_by_api_key(x_api_key)
+    trucker_id = resolve_trucker_by_api_key(x_api_key)
     
     if not trucker_id:
         logger.warning("⚠️ [INGEST] Unauthorized request - missing or invalid API key")
@@ -59,26 +44,31 @@ def ingest_loads(
     
     logger.info(f"📥 [INGEST] Received payload batch of {len(loads)} loads from trucker_id={trucker_id}")
 
+    # Dedupe within the batch (first occurrence wins), then drop refs we already have
+    unique_loads = {}
+    for load_data in loads:
+        if load_data.ref_id and load_data.ref_id not in unique_loads:
+            unique_loads[load_data.ref_id] = load_data
+
+    existing_refs = crud.get_existing_load_refs(db, list(unique_loads.keys()))
+    candidates = [l for ref, l in unique_loads.items() if ref not in existing_refs]
+
+    # Single multi-row insert; ON CONFLICT covers a concurrent scrape of the same board
+    inserted_refs = crud.bulk_create_loads(db, candidates, discovered_by_id=trucker_id)
+
     new_count = 0
     high_value_count = 0
-
-    for load_data in loads:
-        # Deduplicate
-        existing_load = crud.get_load_by_ref(db, ref_id=load_data.ref_id)
-        if existing_load:
+    for load_data in candidates:
+        if load_data.ref_id not in inserted_refs:
             continue
+        new_count += 1
 
         # Analyze
         is_winner, numeric_price = analyze_profitability(load_data)
-
         if is_winner:
             logger.info(f"🔥 HOT LOAD: {load_data.origin} -> {load_data.destination} (${numeric_price})")
             high_value_count += 1
 
-        # Save with discoverer tracking
-        crud.create_load(db=db, load=load_data, discovered_by_id=trucker_id)
-        new_count += 1
-
     return {
         "status": "success", 
         "new": new_count, 
@@ -3,12 +3,14 @@ Ops routes: treasury visibility.
 """
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
 
 from sqlalchemy.engine import Engine
 
 from app.core.deps import get_engine, require_admin
-from app.services.burn import get_treasury_stats
+from app.services.burn import get_treasury_stats, get_treasury_history
 
 router = APIRouter(prefix="/ops", tags=["ops"], dependencies=[Depends(require_admin)])
 
@@ -22,3 +24,12 @@ def treasury_stats(engine: Engine = Depends(get_engine)):
         "last_burn_tx_hash": stats.last_burn_tx_hash,
         "last_burn_at": stats.last_burn_at,
     }
+
+
+@router.get("/treasury/history")
+def treasury_history(
+    days: int = Query(90, ge=1, le=3650),
+    bucket: Literal["day", "week"] = Query("day"),
+    engine: Engine = Depends(get_engine),
+):
+    return {"bucket": bucket, "days": days, "rows": get_treasury_history(engine, days=days, bucket=bucket)}
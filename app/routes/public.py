@@ -1,15 +1,17 @@
+import json
 import os
 from fastapi import APIRouter, Request, Form, Body, HTTPException, BackgroundTasks, status, UploadFile, File
 from fastapi.responses import RedirectResponse
 from sqlalchemy import text
 from sqlalchemy.exc import ProgrammingError
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from app.services.load_board import LoadBoardService
 from app.services.email import parse_broker_reply, send_contact_form_email, send_factoring_referral_email
 from app.services.storage import upload_bol, get_presigned_url, convert_bol_image_to_pdf
 from app.services.email import send_bol_email
 #from app.core.templates import templates
-from app.core.deps import templates, engine, run_assistant_message
+from app.core.deps import templates, engine
 
 router = APIRouter()
 @router.get("/beta", response_class=HTMLResponse)
@@ -330,47 +332,93 @@ def testimonials_submit(
         })
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @router.post("/api/chat")
-async def chat_api(payload: dict):
+async def chat_api(request: Request, payload: dict):
     """
     Chat endpoint using OpenAI Responses API.
     
     Payload:
         - message: User's message (required)
         - response_id: Previous response ID for threading (optional, for new conversations)
+        - stream: true (or Accept: text/event-stream) for Server-Sent Events:
+          "start" {conversation_id}, "delta" {text} per token chunk, "done" {reply, response_id},
+          or "error" {detail}
     
     Returns:
         - reply: Assistant's response
         - response_id: Response ID to use for next message (for threading)
+
+    At most CHAT_MAX_CONCURRENT_PER_IP turns per client IP run at once (429 beyond that).
     """
-    try:
-        from app.core.chat_responses import run_responses_chat, get_greeting
-        
-        message = (payload.get("message") if payload else "") or ""
-        response_id = payload.get("response_id") if payload else None
-        
-        # If no message and no response_id, send greeting
-        if not message and not response_id:
-            return get_greeting()
-        
-        result = run_responses_chat(message=message, response_id=response_id)
-        return result
-        
-    except HTTPException:
-        # Re-raise HTTP exceptions (they have proper status codes)
-        raise
-    except Exception as e:
-        # Catch any other exceptions and return a proper error
-        import traceback
-        error_msg = str(e)
-        error_type = type(e).__name__
-        print(f"Chat API error: {error_type}: {error_msg}")
-        print(traceback.format_exc())
+    from app.core.chat_responses import arun_responses_chat, aget_greeting, stream_responses_chat, chat_limiter
+
+    message = (payload.get("message") if payload else "") or ""
+    response_id = payload.get("response_id") if payload else None
+    wants_stream = bool(payload and payload.get("stream")) or "text/event-stream" in request.headers.get("accept", "")
+
+    # Real client IP behind nginx: uvicorn --proxy-headers (deploy/dispatch.service) rewrites it
+    slot = chat_limiter.acquire(request.client.host if request.client else "unknown")
+    if slot is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Chat service error: {error_msg}"
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many chats in progress. Please wait for the current reply."
         )
 
+    if not wants_stream or (not message and not response_id):
+        try:
+            # If no message and no response_id, send greeting
+            if not message and not response_id:
+                return await aget_greeting()
+            return await arun_responses_chat(message=message, response_id=response_id)
+        except HTTPException:
+            # Re-raise HTTP exceptions (they have proper status codes)
+            raise
+        except Exception as e:
+            # Catch any other exceptions and return a proper error
+            import traceback
+            error_msg = str(e)
+            error_type = type(e).__name__
+            print(f"Chat API error: {error_type}: {error_msg}")
+            print(traceback.format_exc())
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Chat service error: {error_msg}"
+            )
+        finally:
+            slot.release()
+
+    events = stream_responses_chat(message=message, response_id=response_id)
+    try:
+        # Pull the first event here so validation / OpenAI errors still get a real status code.
+        first = await events.__anext__()
+    except BaseException:
+        slot.release()
+        raise
+
+    async def event_stream():
+        try:
+            yield _sse(first["type"], first)
+            async for event in events:
+                if await request.is_disconnected():
+                    break  # finally below closes the OpenAI stream: no more tokens generated
+                yield _sse(event["type"], event)
+        except HTTPException as e:
+            yield _sse("error", {"type": "error", "detail": e.detail})
+        finally:
+            await events.aclose()
+            slot.release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(slot.release),
+    )
+
 
 @router.get("/api/chat/greeting")
 async def chat_greeting():
@@ -382,8 +430,8 @@ async def chat_greeting():
         - response_id: Response ID to use for first user message
     """
     try:
-        from app.core.chat_responses import get_greeting
-        return get_greeting()
+        from app.core.chat_responses import aget_greeting
+        return await aget_greeting()
     except HTTPException:
         raise
     except Exception as e:
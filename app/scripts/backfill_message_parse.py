@@ -0,0 +1,43 @@
+"""
+Reprocess webwise.messages whose parser_version is missing or older than
+app.services.ai_logic.PARSER_VERSION (run after bumping the parser).
+Usage: python -m app.scripts.backfill_message_parse [--chunk-size 500] [--max-chunks N]
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+    base_dir = Path(__file__).resolve().parent.parent.parent
+    load_dotenv(base_dir / ".env")
+except ImportError:
+    pass
+
+from app.core.db import make_engine
+from app.services.ai_logic import PARSER_VERSION
+from app.services.message_store import reparse_stale_messages
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Backfill parsed offer columns on webwise.messages")
+    ap.add_argument("--chunk-size", type=int, default=500, help="Rows per transaction")
+    ap.add_argument("--max-chunks", type=int, default=None, help="Stop after N chunks (default: all)")
+    args = ap.parse_args()
+
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        print("❌ DATABASE_URL not set in environment")
+        sys.exit(1)
+    engine = make_engine(database_url, name="backfill_message_parse", pool_size=1, max_overflow=0)
+
+    print(f"🔁 Reparsing messages older than parser v{PARSER_VERSION} (chunk={args.chunk_size})...")
+    start = time.time()
+    updated = reparse_stale_messages(engine, chunk_size=args.chunk_size, max_chunks=args.max_chunks)
+    print(f"✅ Updated {updated} messages in {time.time() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
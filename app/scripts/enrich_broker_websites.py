@@ -5,15 +5,18 @@ Searches for brokers WHERE website IS NULL using:
   "{company_name} {city} {state} freight transportation"
 
 Updates webwise.brokers.website with the first search result URL.
+Runs as a stage of app/services/enrichment.py: brokers are searched concurrently under the
+shared DuckDuckGo rate limit, websites are written back one UPDATE per page, and the last MC
+is checkpointed so an interrupted run resumes (--restart to start over).
 
 Usage:
   PYTHONPATH=. python3 app/scripts/enrich_broker_websites.py
   PYTHONPATH=. python3 app/scripts/enrich_broker_websites.py --limit 100
   PYTHONPATH=. python3 app/scripts/enrich_broker_websites.py --dry-run
+  PYTHONPATH=. python3 app/scripts/enrich_broker_websites.py --concurrency 16 --restart
 """
 import argparse
 import re
-import time
 from pathlib import Path
 
 # Load .env before app imports
@@ -23,21 +26,19 @@ try:
 except ImportError:
     pass
 
-try:
-    from ddgs import DDGS
-    HAS_DDGS = True
-except ImportError:
-    try:
-        from duckduckgo_search import DDGS
-        HAS_DDGS = True
-    except ImportError:
-        HAS_DDGS = False
-        print("⚠️  'ddgs' not installed. Install with: pip install ddgs")
-        print("   Falling back to HTML scraping (less reliable)")
-
-import requests
 from sqlalchemy import text
-from app.core.deps import SessionLocal
+from app.services.enrichment import (
+    HAS_DDGS,
+    EnrichmentClient,
+    EnrichmentStage,
+    add_runner_arguments,
+    get_client,
+    run_stage,
+)
+
+if not HAS_DDGS:
+    print("⚠️  'ddgs' not installed. Install with: pip install ddgs")
+    print("   Falling back to HTML scraping (less reliable)")
 
 # DuckDuckGo HTML search (no API key needed) - fallback if library not available
 DDG_SEARCH_URL = "https://html.duckduckgo.com/html/"
@@ -67,11 +68,18 @@ def clean_url(url: str) -> str | None:
     return None
 
 
-def search_website(company_name: str, city: str | None, state: str | None, debug: bool = False) -> str | None:
+def search_website(
+    company_name: str,
+    city: str | None,
+    state: str | None,
+    debug: bool = False,
+    client: EnrichmentClient | None = None,
+) -> str | None:
     """
     Search DuckDuckGo for broker website.
     Returns cleaned domain (e.g. 'triplettransport.com') or None.
     """
+    client = client or get_client()
     # Build search query: Try simpler first, then add keywords if needed
     # Start with: "Company Name City State" (broader, catches more)
     query_parts = [company_name]
@@ -99,81 +107,80 @@ def search_website(company_name: str, city: str | None, state: str | None, debug
             for search_q in search_queries:
                 if debug:
                     print(f"      Trying query: {search_q}")
-                with DDGS() as ddgs:
-                    results = list(ddgs.text(search_q, max_results=10))
+                results = client.search(search_q, max_results=10)
+                if debug:
+                    print(f"      Found {len(results)} results")
+                
+                for result in results:
+                    url = result.get("href", "")
                     if debug:
-                        print(f"      Found {len(results)} results")
-                    
-                    for result in results:
-                        url = result.get("href", "")
-                        if debug:
-                            print(f"      Checking: {url}")
-                        domain = clean_url(url)
-                        if domain:
-                            # Aggressively filter out directory/review sites
-                            skip_domains = [
-                                "duckduckgo.com", "wikipedia.org", "linkedin.com", 
-                                "facebook.com", "yellowpages.com", "manta.com",
-                                "truckingdatabase.com", "transportreviews.com",
-                                "seakexperts.com", "safer.fmcsa.dot.gov",
-                                "carrierlists.com", "freightquote.com",
-                                "truckinginfo.com", "truckersreport.com",
-                                "indeed.com", "glassdoor.com", "zoominfo.com",
-                                "crunchbase.com", "bloomberg.com", "youtube.com",
-                                "google.com", "bing.com", "yahoo.com"
-                            ]
-                            if any(skip in domain for skip in skip_domains):
-                                continue
-                            
-                            # Extract root domain (remove www. and subdomains)
-                            domain_parts = domain.lower().replace("www.", "").split(".")
-                            if len(domain_parts) >= 2:
-                                root_domain = ".".join(domain_parts[-2:])  # e.g. "embarktrucks.com"
-                                domain_name = domain_parts[-2]  # e.g. "embarktrucks"
+                        print(f"      Checking: {url}")
+                    domain = clean_url(url)
+                    if domain:
+                        # Aggressively filter out directory/review sites
+                        skip_domains = [
+                            "duckduckgo.com", "wikipedia.org", "linkedin.com", 
+                            "facebook.com", "yellowpages.com", "manta.com",
+                            "truckingdatabase.com", "transportreviews.com",
+                            "seakexperts.com", "safer.fmcsa.dot.gov",
+                            "carrierlists.com", "freightquote.com",
+                            "truckinginfo.com", "truckersreport.com",
+                            "indeed.com", "glassdoor.com", "zoominfo.com",
+                            "crunchbase.com", "bloomberg.com", "youtube.com",
+                            "google.com", "bing.com", "yahoo.com"
+                        ]
+                        if any(skip in domain for skip in skip_domains):
+                            continue
+                        
+                        # Extract root domain (remove www. and subdomains)
+                        domain_parts = domain.lower().replace("www.", "").split(".")
+                        if len(domain_parts) >= 2:
+                            root_domain = ".".join(domain_parts[-2:])  # e.g. "embarktrucks.com"
+                            domain_name = domain_parts[-2]  # e.g. "embarktrucks"
+                        else:
+                            root_domain = domain.lower()
+                            domain_name = domain_parts[0] if domain_parts else ""
+                        
+                        # Extract meaningful words from company name (skip common words)
+                        skip_words = {"inc", "llc", "corp", "ltd", "transportation", "transport", "logistics", "trucking", "freight"}
+                        company_words = [
+                            w.lower().strip(".,&") 
+                            for w in company_name.split() 
+                            if len(w) > 2 and w.lower() not in skip_words
+                        ]
+                        
+                        # Strong match: root domain name contains a significant company word
+                        # e.g. "armen" in "armentransportation.com" or "mawson" in "mawsonandmawson2290.com"
+                        strong_match = any(word in domain_name for word in company_words if len(word) > 3)
+                        
+                        if strong_match:
+                            # Prefer root domain over subdomains (embarktrucks.com > investors.embarktrucks.com)
+                            if "." not in domain_name and domain.count(".") <= 2:
+                                if debug:
+                                    print(f"      ✅ Selected (strong name match): {root_domain}")
+                                return root_domain
                             else:
-                                root_domain = domain.lower()
-                                domain_name = domain_parts[0] if domain_parts else ""
-                            
-                            # Extract meaningful words from company name (skip common words)
-                            skip_words = {"inc", "llc", "corp", "ltd", "transportation", "transport", "logistics", "trucking", "freight"}
-                            company_words = [
-                                w.lower().strip(".,&") 
-                                for w in company_name.split() 
-                                if len(w) > 2 and w.lower() not in skip_words
-                            ]
-                            
-                            # Strong match: root domain name contains a significant company word
-                            # e.g. "armen" in "armentransportation.com" or "mawson" in "mawsonandmawson2290.com"
-                            strong_match = any(word in domain_name for word in company_words if len(word) > 3)
-                            
-                            if strong_match:
-                                # Prefer root domain over subdomains (embarktrucks.com > investors.embarktrucks.com)
-                                if "." not in domain_name and domain.count(".") <= 2:
+                                # Subdomain match - save but keep looking for root
+                                if not best_domain or "investors" not in domain.lower():
+                                    best_domain = root_domain
                                     if debug:
-                                        print(f"      ✅ Selected (strong name match): {root_domain}")
-                                    return root_domain
-                                else:
-                                    # Subdomain match - save but keep looking for root
-                                    if not best_domain or "investors" not in domain.lower():
-                                        best_domain = root_domain
-                                        if debug:
-                                            print(f"      💾 Saved subdomain match: {root_domain}")
-                            
-                            # Weak match: save as fallback but keep looking
-                            elif not best_domain:
-                                best_domain = root_domain
-                                if debug:
-                                    print(f"      💾 Saved as fallback: {root_domain}")
-                    
-                    # If we found a strong root domain match, stop searching
-                    if best_domain:
-                        # Check if best_domain has a strong name match
-                        best_parts = best_domain.lower().replace("www.", "").split(".")
-                        best_name = best_parts[-2] if len(best_parts) >= 2 else best_parts[0]
-                        if any(word in best_name for word in company_words if len(word) > 3):
+                                        print(f"      💾 Saved subdomain match: {root_domain}")
+                        
+                        # Weak match: save as fallback but keep looking
+                        elif not best_domain:
+                            best_domain = root_domain
                             if debug:
-                                print(f"      ✅ Stopping search, found strong match: {best_domain}")
-                            break
+                                print(f"      💾 Saved as fallback: {root_domain}")
+                
+                # If we found a strong root domain match, stop searching
+                if best_domain:
+                    # Check if best_domain has a strong name match
+                    best_parts = best_domain.lower().replace("www.", "").split(".")
+                    best_name = best_parts[-2] if len(best_parts) >= 2 else best_parts[0]
+                    if any(word in best_name for word in company_words if len(word) > 3):
+                        if debug:
+                            print(f"      ✅ Stopping search, found strong match: {best_domain}")
+                        break
             
             # Return best match found, but only if it has some name match
             if best_domain:
@@ -194,11 +201,8 @@ def search_website(company_name: str, city: str | None, state: str | None, debug
 
     # Fallback: HTML scraping
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
         params = {"q": query}
-        response = requests.get(DDG_SEARCH_URL, params=params, headers=headers, timeout=10)
+        response = client.get(DDG_SEARCH_URL, params=params, timeout=10)
         response.raise_for_status()
 
         html = response.text
@@ -248,75 +252,68 @@ def search_website(company_name: str, city: str | None, state: str | None, debug
     return None
 
 
-def enrich_brokers(limit: int | None = None, dry_run: bool = False, debug: bool = False):
-    """Enrich broker websites from DuckDuckGo search."""
-    db = SessionLocal()
-    try:
-        # Get brokers without websites
-        query = text("""
-            SELECT mc_number, company_name, phy_city, phy_state
-            FROM webwise.brokers
-            WHERE website IS NULL
-              AND company_name IS NOT NULL
-              AND company_name != 'Unknown'
-            ORDER BY mc_number
-            LIMIT :limit
-        """)
-        result = db.execute(query, {"limit": limit or 999999})
-        brokers = result.fetchall()
-
-        if not brokers:
-            print("✅ No brokers need website enrichment.")
-            return
+class WebsiteStage(EnrichmentStage):
+    """Find a website for brokers that have none."""
 
-        print(f"🔍 Found {len(brokers)} brokers without websites. Starting enrichment...")
-        if dry_run:
-            print("   [DRY RUN MODE - No updates will be made]")
-
-        updated = 0
-        failed = 0
-        skipped = 0
+    name = "broker_websites"
+    select_sql = """
+        SELECT mc_number, company_name, phy_city, phy_state
+        FROM webwise.brokers
+        WHERE website IS NULL
+          AND company_name IS NOT NULL
+          AND company_name != 'Unknown'
+          AND mc_number > :after
+        ORDER BY mc_number
+        LIMIT :page_size
+    """
 
-        for idx, (mc, name, city, state) in enumerate(brokers, 1):
-            print(f"\n[{idx}/{len(brokers)}] MC {mc}: {name} ({city}, {state})")
-            if dry_run:
-                domain = search_website(name, city, state, debug=debug)
-                if domain:
-                    print(f"   → Would set website = {domain}")
-                else:
-                    print(f"   → No website found")
-                time.sleep(1.5)  # Rate limit even in dry-run
-                continue
+    def process(self, broker, client, debug=False):
+        return search_website(
+            broker["company_name"], broker["phy_city"], broker["phy_state"], debug=debug, client=client
+        )
 
-            domain = search_website(name, city, state, debug=debug)
-            if domain:
-                update_query = text("""
-                    UPDATE webwise.brokers
-                    SET website = :domain, updated_at = CURRENT_TIMESTAMP
-                    WHERE mc_number = :mc
-                """)
-                db.execute(update_query, {"domain": domain, "mc": mc})
-                db.commit()
-                updated += 1
-                print(f"   ✅ Set website = {domain}")
-            else:
-                failed += 1
-                print(f"   ❌ No website found")
+    def describe(self, broker, domain, dry_run):
+        if not domain:
+            return ["   ❌ No website found"]
+        return [f"   → Would set website = {domain}" if dry_run else f"   ✅ Set website = {domain}"]
 
-            # Rate limiting: be respectful to DuckDuckGo
-            if idx < len(brokers):
-                time.sleep(1.5)  # 1.5 second delay between searches
+    def write(self, conn, batch):
+        conn.execute(
+            text("""
+                UPDATE webwise.brokers
+                SET website = :domain, updated_at = CURRENT_TIMESTAMP
+                WHERE mc_number = :mc AND website IS NULL
+            """),
+            [{"domain": domain, "mc": broker["mc_number"]} for broker, domain in batch],
+        )
+        return {"updated": len(batch)}
 
-        print(f"\n📊 Summary:")
-        print(f"   ✅ Updated: {updated}")
-        print(f"   ❌ Not found: {failed}")
-        print(f"   ⏭️  Skipped: {skipped}")
 
+def enrich_brokers(
+    limit: int | None = None,
+    dry_run: bool = False,
+    debug: bool = False,
+    concurrency: int | None = None,
+    page_size: int | None = None,
+    restart: bool = False,
+    offline: bool = False,
+    no_cache: bool = False,
+):
+    """Enrich broker websites from DuckDuckGo search."""
+    try:
+        return run_stage(
+            WebsiteStage(),
+            limit=limit,
+            dry_run=dry_run,
+            debug=debug,
+            concurrency=concurrency,
+            page_size=page_size,
+            resume=not restart,
+            use_cache=not no_cache,
+            offline=offline,
+        )
     except Exception as e:
         print(f"❌ Enrichment failed: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
@@ -324,5 +321,15 @@ if __name__ == "__main__":
     parser.add_argument("--limit", type=int, help="Limit number of brokers to process (for testing)")
     parser.add_argument("--dry-run", action="store_true", help="Search but don't update database")
     parser.add_argument("--debug", action="store_true", help="Show detailed search debugging")
+    add_runner_arguments(parser)
     args = parser.parse_args()
-    enrich_brokers(limit=args.limit, dry_run=args.dry_run, debug=args.debug)
+    enrich_brokers(
+        limit=args.limit,
+        dry_run=args.dry_run,
+        debug=args.debug,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        restart=args.restart,
+        offline=args.offline,
+        no_cache=args.no_cache,
+    )
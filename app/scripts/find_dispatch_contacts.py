@@ -7,6 +7,10 @@ Uses multiple strategies:
 3. If website exists, scrape it for contact info
 4. Extract emails and phone numbers from search results
 
+Runs as a stage of app/services/enrichment.py: brokers are processed concurrently with
+per-host rate limits, emails/phones are upserted once per page, and the last MC is
+checkpointed so an interrupted run resumes (--restart to start over).
+
 Usage:
   PYTHONPATH=. python3 app/scripts/find_dispatch_contacts.py
   PYTHONPATH=. python3 app/scripts/find_dispatch_contacts.py --limit 100
@@ -14,7 +18,6 @@ Usage:
 """
 import argparse
 import re
-import time
 from pathlib import Path
 
 # Load .env before app imports
@@ -24,22 +27,20 @@ try:
 except ImportError:
     pass
 
-try:
-    from ddgs import DDGS
-    HAS_DDGS = True
-except ImportError:
-    try:
-        from duckduckgo_search import DDGS
-        HAS_DDGS = True
-    except ImportError:
-        HAS_DDGS = False
-        print("⚠️  'ddgs' not installed. Install with: pip install ddgs")
-        print("   Falling back to HTML scraping (less reliable)")
-
-import requests
 from sqlalchemy import text
-from app.core.deps import SessionLocal
-from scripts.attach_packet_emails import score_email, promote_best
+from app.services.enrichment import (
+    HAS_DDGS,
+    EnrichmentClient,
+    EnrichmentStage,
+    add_runner_arguments,
+    get_client,
+    run_stage,
+)
+from scripts.attach_packet_emails import score_email, promote_best_many
+
+if not HAS_DDGS:
+    print("⚠️  'ddgs' not installed. Install with: pip install ddgs")
+    print("   Falling back to HTML scraping (less reliable)")
 
 EMAIL_RE = re.compile(r"\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b")
 PHONE_RE = re.compile(r'(\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})')
@@ -106,11 +107,17 @@ def extract_phones_from_text(text: str) -> set[str]:
     return phones
 
 
-def search_dispatch_contacts(company_name: str, mc_number: str | None = None, debug: bool = False) -> tuple[set[str], set[str]]:
+def search_dispatch_contacts(
+    company_name: str,
+    mc_number: str | None = None,
+    debug: bool = False,
+    client: EnrichmentClient | None = None,
+) -> tuple[set[str], set[str]]:
     """
     Search for dispatch emails and phone numbers.
     Returns (emails_set, phones_set).
     """
+    client = client or get_client()
     emails = set()
     phones = set()
     
@@ -135,56 +142,49 @@ def search_dispatch_contacts(company_name: str, mc_number: str | None = None, de
         return emails, phones
     
     try:
-        with DDGS() as ddgs:
-            for query in queries:
+        for query in queries:
+            if debug:
+                print(f"      Searching: {query}")
+            
+            try:
+                results = client.search(query, max_results=5)
                 if debug:
-                    print(f"      Searching: {query}")
+                    print(f"         Found {len(results)} results")
                 
-                try:
-                    results = list(ddgs.text(query, max_results=5))
-                    if debug:
-                        print(f"         Found {len(results)} results")
+                for result in results:
+                    # Extract from title and snippet
+                    text_content = f"{result.get('title', '')} {result.get('body', '')}"
                     
-                    for result in results:
-                        # Extract from title and snippet
-                        text_content = f"{result.get('title', '')} {result.get('body', '')}"
-                        
-                        found_emails = extract_emails_from_text(text_content)
-                        found_phones = extract_phones_from_text(text_content)
-                        
-                        emails.update(found_emails)
-                        phones.update(found_phones)
-                        
-                        if debug and (found_emails or found_phones):
-                            print(f"         Found: {list(found_emails)[:2]} {list(found_phones)[:2]}")
-                        
-                        # Also try fetching the URL to scrape more content
-                        url = result.get("href", "")
-                        if url and (len(emails) < 3 or len(phones) < 2):  # Only if we need more
-                            try:
-                                headers = {
-                                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                                }
-                                response = requests.get(url, headers=headers, timeout=5, allow_redirects=True)
-                                if response.status_code == 200:
-                                    page_emails = extract_emails_from_text(response.text)
-                                    page_phones = extract_phones_from_text(response.text)
-                                    emails.update(page_emails)
-                                    phones.update(page_phones)
-                                    if debug and (page_emails or page_phones):
-                                        print(f"         Scraped from {url[:50]}: {list(page_emails)[:2]} {list(page_phones)[:2]}")
-                            except Exception as e:
-                                if debug:
-                                    print(f"         ⚠️  Could not fetch {url[:50]}: {e}")
+                    found_emails = extract_emails_from_text(text_content)
+                    found_phones = extract_phones_from_text(text_content)
                     
-                    # Rate limit between queries
-                    time.sleep(1)
+                    emails.update(found_emails)
+                    phones.update(found_phones)
                     
-                except Exception as e:
-                    if debug:
-                        print(f"      ⚠️  Search error for '{query}': {e}")
-                    continue
+                    if debug and (found_emails or found_phones):
+                        print(f"         Found: {list(found_emails)[:2]} {list(found_phones)[:2]}")
                     
+                    # Also try fetching the URL to scrape more content
+                    url = result.get("href", "")
+                    if url and (len(emails) < 3 or len(phones) < 2):  # Only if we need more
+                        try:
+                            response = client.get(url, timeout=5, allow_redirects=True)
+                            if response.status_code == 200:
+                                page_emails = extract_emails_from_text(response.text)
+                                page_phones = extract_phones_from_text(response.text)
+                                emails.update(page_emails)
+                                phones.update(page_phones)
+                                if debug and (page_emails or page_phones):
+                                    print(f"         Scraped from {url[:50]}: {list(page_emails)[:2]} {list(page_phones)[:2]}")
+                        except Exception as e:
+                            if debug:
+                                print(f"         ⚠️  Could not fetch {url[:50]}: {e}")
+                
+            except Exception as e:
+                if debug:
+                    print(f"      ⚠️  Search error for '{query}': {e}")
+                continue
+                
     except Exception as e:
         if debug:
             print(f"      ⚠️  DDGS error: {e}")
@@ -192,8 +192,13 @@ def search_dispatch_contacts(company_name: str, mc_number: str | None = None, de
     return emails, phones
 
 
-def scrape_website_for_contacts(website: str, debug: bool = False) -> tuple[set[str], set[str]]:
+def scrape_website_for_contacts(
+    website: str,
+    debug: bool = False,
+    client: EnrichmentClient | None = None,
+) -> tuple[set[str], set[str]]:
     """Scrape a website for emails and phone numbers."""
+    client = client or get_client()
     emails = set()
     phones = set()
     
@@ -204,10 +209,7 @@ def scrape_website_for_contacts(website: str, debug: bool = False) -> tuple[set[
         website = f"https://{website}"
     
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-        response = requests.get(website, headers=headers, timeout=10, allow_redirects=True)
+        response = client.get(website, timeout=10, allow_redirects=True)
         response.raise_for_status()
         
         html = response.text
@@ -224,7 +226,14 @@ def scrape_website_for_contacts(website: str, debug: bool = False) -> tuple[set[
     return emails, phones
 
 
-def find_contacts_for_broker(mc: str, company_name: str, website: str | None, mc_number: str | None = None, debug: bool = False) -> tuple[list[tuple[str, float]], list[str]]:
+def find_contacts_for_broker(
+    mc: str,
+    company_name: str,
+    website: str | None,
+    mc_number: str | None = None,
+    debug: bool = False,
+    client: EnrichmentClient | None = None,
+) -> tuple[list[tuple[str, float]], list[str]]:
     """
     Find dispatch contacts for a broker using all available methods.
     Returns ([(email, confidence_score), ...], [phone, ...]).
@@ -235,7 +244,7 @@ def find_contacts_for_broker(mc: str, company_name: str, website: str | None, mc
     # Strategy 1: Search DuckDuckGo
     if debug:
         print(f"   🔍 Searching DuckDuckGo...")
-    search_emails, search_phones = search_dispatch_contacts(company_name, mc_number, debug=debug)
+    search_emails, search_phones = search_dispatch_contacts(company_name, mc_number, debug=debug, client=client)
     all_emails.update(search_emails)
     all_phones.update(search_phones)
     
@@ -243,7 +252,7 @@ def find_contacts_for_broker(mc: str, company_name: str, website: str | None, mc
     if website:
         if debug:
             print(f"   🌐 Scraping website {website}...")
-        site_emails, site_phones = scrape_website_for_contacts(website, debug=debug)
+        site_emails, site_phones = scrape_website_for_contacts(website, debug=debug, client=client)
         all_emails.update(site_emails)
         all_phones.update(site_phones)
     
@@ -260,166 +269,171 @@ def find_contacts_for_broker(mc: str, company_name: str, website: str | None, mc
     return scored_emails, list(all_phones)
 
 
-def enrich_brokers(limit: int | None = None, mc_filter: str | None = None, dry_run: bool = False, debug: bool = False):
-    """Find dispatch contacts for brokers."""
-    db = SessionLocal()
-    try:
-        # Build query
+def _normalize_phone(phone: str | None) -> str:
+    return re.sub(r"[^\d]", "", phone) if phone else ""
+
+
+def pick_phone_updates(
+    phones: list[str],
+    existing_primary: str | None,
+    existing_secondary: str | None,
+) -> tuple[str | None, str | None]:
+    """
+    Choose (new_primary, new_secondary) for a broker: fill an empty primary_phone, then set
+    secondary_phone to the first number that differs from primary (at most one per run).
+    """
+    new_primary = None
+    new_secondary = None
+    primary = existing_primary
+    for phone in phones:
+        cleaned = clean_phone(phone)
+        if not cleaned:
+            continue
+        if not primary:
+            new_primary = primary = cleaned
+        elif _normalize_phone(cleaned) != _normalize_phone(primary):
+            if not existing_secondary or _normalize_phone(cleaned) != _normalize_phone(existing_secondary):
+                new_secondary = cleaned
+            break
+    return new_primary, new_secondary
+
+
+_UPSERT_EMAIL_SQL = text("""
+    INSERT INTO webwise.broker_emails (mc_number, email, source, confidence)
+    VALUES (:mc, :email, 'search', :score)
+    ON CONFLICT (mc_number, email) DO UPDATE
+        SET confidence = GREATEST(webwise.broker_emails.confidence, EXCLUDED.confidence)
+""")
+
+_UPDATE_PHONES_SQL = text("""
+    UPDATE webwise.brokers
+    SET primary_phone = COALESCE(:primary, primary_phone),
+        secondary_phone = COALESCE(:secondary, secondary_phone),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE mc_number = :mc
+""")
+
+
+class DispatchContactsStage(EnrichmentStage):
+    """Search + website scrape for brokers missing a primary email or phone."""
+
+    name = "dispatch_contacts"
+    select_sql = """
+        SELECT mc_number, company_name, website, dot_number, primary_phone, secondary_phone
+        FROM webwise.brokers
+        WHERE ((primary_email IS NULL OR primary_email = '')
+            OR (primary_phone IS NULL OR primary_phone = ''))
+          AND mc_number > :after
+        ORDER BY mc_number
+        LIMIT :page_size
+    """
+
+    def __init__(self, mc_filter: str | None = None):
         if mc_filter:
-            query = text("""
-                SELECT mc_number, company_name, website, dot_number
+            self.select_sql = """
+                SELECT mc_number, company_name, website, dot_number, primary_phone, secondary_phone
                 FROM webwise.brokers
-                WHERE mc_number = :mc
-            """)
-            result = db.execute(query, {"mc": mc_filter})
-        else:
-            # Get brokers missing email or phone
-            query = text("""
-                SELECT mc_number, company_name, website, dot_number
-                FROM webwise.brokers
-                WHERE (primary_email IS NULL OR primary_email = '')
-                   OR (primary_phone IS NULL OR primary_phone = '')
+                WHERE mc_number = :mc AND mc_number > :after
                 ORDER BY mc_number
-                LIMIT :limit
-            """)
-            result = db.execute(query, {"limit": limit or 999999})
-        
-        brokers = result.fetchall()
-        
-        if not brokers:
-            print("✅ No brokers need contact enrichment.")
-            return
-        
-        print(f"🔍 Found {len(brokers)} brokers needing contacts. Starting search...")
-        if dry_run:
-            print("   [DRY RUN MODE - No updates will be made]")
-        
-        updated_emails = 0
-        updated_phones = 0
-        found_emails_count = 0
-        found_phones_count = 0
-        failed = 0
-        
-        for idx, (mc, name, website, dot) in enumerate(brokers, 1):
-            print(f"\n[{idx}/{len(brokers)}] MC {mc}: {name}")
-            if website:
-                print(f"   Website: {website}")
-            
-            if dry_run:
-                emails_scored, phones = find_contacts_for_broker(mc, name, website, mc, debug=debug)
-                if emails_scored:
-                    print(f"   → Would add {len(emails_scored)} emails:")
-                    for email, score in emails_scored[:3]:
-                        print(f"      {email} (confidence: {score:.2f})")
-                if phones:
-                    print(f"   → Would add {len(phones)} phones:")
-                    for phone in phones[:3]:
-                        print(f"      {phone}")
-                if not emails_scored and not phones:
-                    print(f"   → No contacts found")
-                time.sleep(2)
-                continue
-            
-            emails_scored, phones = find_contacts_for_broker(mc, name, website, mc, debug=debug)
-            
-            has_updates = False
-            
-            # Insert emails
-            if emails_scored:
-                for email, score in emails_scored:
-                    insert_query = text("""
-                        INSERT INTO webwise.broker_emails (mc_number, email, source, confidence)
-                        VALUES (:mc, :email, 'search', :score)
-                        ON CONFLICT (mc_number, email) DO UPDATE SET confidence = GREATEST(confidence, :score)
-                    """)
-                    db.execute(insert_query, {"mc": mc, "email": email, "score": score})
-                    found_emails_count += 1
-                
-                # Promote best email
-                raw_conn = db.connection().connection
-                promoted = promote_best(raw_conn, mc)
-                if promoted:
-                    updated_emails += 1
-                    has_updates = True
-                    print(f"   ✅ Added {len(emails_scored)} emails, promoted best to primary_email")
-                else:
-                    print(f"   ✅ Added {len(emails_scored)} emails")
-            
-            # Insert phones
-            if phones:
-                # Check existing phones
-                existing_check = db.execute(
-                    text("SELECT primary_phone, secondary_phone FROM webwise.brokers WHERE mc_number = :mc"),
-                    {"mc": mc}
-                ).fetchone()
-                
-                existing_primary = existing_check[0] if existing_check else None
-                existing_secondary = existing_check[1] if existing_check and len(existing_check) > 1 else None
-                
-                # Normalize for comparison
-                normalize_phone = lambda p: re.sub(r'[^\d]', '', p) if p else ""
-                
-                for phone in phones:
-                    cleaned = clean_phone(phone)
-                    if not cleaned:
-                        continue
-                    
-                    new_normalized = normalize_phone(cleaned)
-                    primary_normalized = normalize_phone(existing_primary) if existing_primary else ""
-                    secondary_normalized = normalize_phone(existing_secondary) if existing_secondary else ""
-                    
-                    if not existing_primary:
-                        # No primary phone - set it
-                        update_query = text("""
-                            UPDATE webwise.brokers
-                            SET primary_phone = :phone, updated_at = CURRENT_TIMESTAMP
-                            WHERE mc_number = :mc
-                        """)
-                        db.execute(update_query, {"phone": cleaned, "mc": mc})
-                        existing_primary = cleaned
-                        updated_phones += 1
-                        has_updates = True
-                        print(f"   ✅ Set primary_phone: {cleaned}")
-                    elif new_normalized != primary_normalized:
-                        # Different from primary - set as secondary if not already there
-                        if not existing_secondary or new_normalized != secondary_normalized:
-                            update_query = text("""
-                                UPDATE webwise.brokers
-                                SET secondary_phone = :phone, updated_at = CURRENT_TIMESTAMP
-                                WHERE mc_number = :mc
-                            """)
-                            db.execute(update_query, {"phone": cleaned, "mc": mc})
-                            existing_secondary = cleaned
-                            updated_phones += 1
-                            has_updates = True
-                            print(f"   ✅ Set secondary_phone: {cleaned}")
-                        break  # Only add one phone per run
-            
-            if has_updates:
-                db.commit()
-            
-            if not emails_scored and not phones:
-                failed += 1
-                print(f"   ❌ No contacts found")
-            
-            # Rate limiting
-            if idx < len(brokers):
-                time.sleep(2)
-        
-        print(f"\n📊 Summary:")
-        print(f"   ✅ Brokers with new emails: {updated_emails}")
-        print(f"   📞 Brokers with new phones: {updated_phones}")
-        print(f"   📧 Total emails found: {found_emails_count}")
-        print(f"   📞 Total phones found: {found_phones_count}")
-        print(f"   ❌ No contacts found: {failed}")
-    
+                LIMIT :page_size
+            """
+        self.mc_filter = mc_filter
+
+    def params(self):
+        return {"mc": self.mc_filter} if self.mc_filter else {}
+
+    def process(self, broker, client, debug=False):
+        mc = broker["mc_number"]
+        emails_scored, phones = find_contacts_for_broker(
+            mc, broker["company_name"], broker["website"], mc, debug=debug, client=client
+        )
+        new_primary, new_secondary = pick_phone_updates(
+            phones, broker["primary_phone"], broker["secondary_phone"]
+        )
+        return {
+            "emails": emails_scored,
+            "phones": phones,
+            "primary_phone": new_primary,
+            "secondary_phone": new_secondary,
+        }
+
+    def found(self, result):
+        return bool(result and (result["emails"] or result["phones"]))
+
+    def describe(self, broker, result, dry_run):
+        lines = []
+        if broker.get("website"):
+            lines.append(f"   Website: {broker['website']}")
+        if not self.found(result):
+            return lines + ["   ❌ No contacts found"]
+        verb = "Would add" if dry_run else "Found"
+        if result["emails"]:
+            lines.append(f"   → {verb} {len(result['emails'])} emails:")
+            lines.extend(f"      {email} (confidence: {score:.2f})" for email, score in result["emails"][:3])
+        if result["phones"]:
+            lines.append(f"   → {verb} {len(result['phones'])} phones:")
+            lines.extend(f"      {phone}" for phone in result["phones"][:3])
+        if result["primary_phone"]:
+            lines.append(f"   {'→ Would set' if dry_run else '✅ Set'} primary_phone: {result['primary_phone']}")
+        if result["secondary_phone"]:
+            lines.append(f"   {'→ Would set' if dry_run else '✅ Set'} secondary_phone: {result['secondary_phone']}")
+        return lines
+
+    def write(self, conn, batch):
+        email_rows = [
+            {"mc": broker["mc_number"], "email": email, "score": score}
+            for broker, result in batch
+            for email, score in result["emails"]
+        ]
+        phone_rows = [
+            {"mc": broker["mc_number"], "primary": result["primary_phone"], "secondary": result["secondary_phone"]}
+            for broker, result in batch
+            if result["primary_phone"] or result["secondary_phone"]
+        ]
+        promoted = []
+        if email_rows:
+            conn.execute(_UPSERT_EMAIL_SQL, email_rows)
+            mcs = sorted({row["mc"] for row in email_rows})
+            promoted = promote_best_many(conn.connection, mcs)
+        if phone_rows:
+            conn.execute(_UPDATE_PHONES_SQL, phone_rows)
+        return {
+            "emails_found": len(email_rows),
+            "phones_found": sum(len(result["phones"]) for _, result in batch),
+            "brokers_new_primary_email": len(promoted),
+            "brokers_new_phone": len(phone_rows),
+        }
+
+
+def enrich_brokers(
+    limit: int | None = None,
+    mc_filter: str | None = None,
+    dry_run: bool = False,
+    debug: bool = False,
+    concurrency: int | None = None,
+    page_size: int | None = None,
+    restart: bool = False,
+    offline: bool = False,
+    no_cache: bool = False,
+):
+    """Find dispatch contacts for brokers."""
+    try:
+        return run_stage(
+            DispatchContactsStage(mc_filter),
+            limit=limit,
+            dry_run=dry_run,
+            debug=debug,
+            concurrency=concurrency,
+            page_size=page_size,
+            resume=not restart,
+            use_cache=not no_cache,
+            offline=offline,
+            use_checkpoint=not mc_filter,
+        )
     except Exception as e:
         print(f"❌ Enrichment failed: {e}")
         import traceback
         traceback.print_exc()
-        db.rollback()
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
@@ -428,5 +442,16 @@ if __name__ == "__main__":
     parser.add_argument("--mc", help="Process specific MC number only")
     parser.add_argument("--dry-run", action="store_true", help="Search but don't update database")
     parser.add_argument("--debug", action="store_true", help="Show detailed debugging")
+    add_runner_arguments(parser)
     args = parser.parse_args()
-    enrich_brokers(limit=args.limit, mc_filter=args.mc, dry_run=args.dry_run, debug=args.debug)
+    enrich_brokers(
+        limit=args.limit,
+        mc_filter=args.mc,
+        dry_run=args.dry_run,
+        debug=args.debug,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        restart=args.restart,
+        offline=args.offline,
+        no_cache=args.no_cache,
+    )
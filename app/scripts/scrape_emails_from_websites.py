@@ -4,13 +4,17 @@ Scrape emails from broker websites (when website IS NOT NULL).
 For brokers that already have a website URL, fetch the page and extract emails.
 Much more reliable than searching for websites - you already know the site exists.
 
+Runs as a stage of app/services/enrichment.py: sites are fetched concurrently with per-host
+rate limits, emails are upserted once per page, and the last MC is checkpointed so an
+interrupted run resumes (--restart to start over).
+
 Usage:
   PYTHONPATH=. python3 app/scripts/scrape_emails_from_websites.py
   PYTHONPATH=. python3 app/scripts/scrape_emails_from_websites.py --limit 100
+  PYTHONPATH=. python3 app/scripts/scrape_emails_from_websites.py --offline --dry-run   # replay from HTTP cache
 """
 import argparse
 import re
-import time
 from pathlib import Path
 
 # Load .env before app imports
@@ -20,10 +24,15 @@ try:
 except ImportError:
     pass
 
-import requests
 from sqlalchemy import text
-from app.core.deps import SessionLocal
-from scripts.attach_packet_emails import score_email, promote_best
+from app.services.enrichment import (
+    EnrichmentClient,
+    EnrichmentStage,
+    add_runner_arguments,
+    get_client,
+    run_stage,
+)
+from scripts.attach_packet_emails import score_email, promote_best_many
 
 EMAIL_RE = re.compile(r"\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b")
 
@@ -47,19 +56,22 @@ def extract_emails_from_html(html: str, domain: str) -> list[str]:
     return sorted(emails)
 
 
-def scrape_broker_website(mc: str, website: str, debug: bool = False) -> list[tuple[str, float]]:
+def scrape_broker_website(
+    mc: str,
+    website: str,
+    debug: bool = False,
+    client: EnrichmentClient | None = None,
+) -> list[tuple[str, float]]:
     """
     Scrape emails from a broker's website.
     Returns list of (email, confidence_score) tuples.
     """
+    client = client or get_client()
     if not website or not website.startswith(("http://", "https://")):
         website = f"https://{website}"
     
     try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        }
-        response = requests.get(website, headers=headers, timeout=10, allow_redirects=True)
+        response = client.get(website, timeout=10, allow_redirects=True)
         response.raise_for_status()
         
         html = response.text
@@ -84,89 +96,76 @@ def scrape_broker_website(mc: str, website: str, debug: bool = False) -> list[tu
         return []
 
 
-def scrape_brokers(limit: int | None = None, dry_run: bool = False, debug: bool = False):
+_UPSERT_EMAIL_SQL = text("""
+    INSERT INTO webwise.broker_emails (mc_number, email, source, confidence)
+    VALUES (:mc, :email, 'website', :score)
+    ON CONFLICT (mc_number, email) DO UPDATE
+        SET confidence = GREATEST(webwise.broker_emails.confidence, EXCLUDED.confidence)
+""")
+
+
+class WebsiteEmailsStage(EnrichmentStage):
+    """Scrape the known website of brokers that still have no primary_email."""
+
+    name = "website_emails"
+    select_sql = """
+        SELECT mc_number, company_name, website
+        FROM webwise.brokers
+        WHERE website IS NOT NULL
+          AND (primary_email IS NULL OR primary_email = '')
+          AND mc_number > :after
+        ORDER BY mc_number
+        LIMIT :page_size
+    """
+
+    def process(self, broker, client, debug=False):
+        scored = scrape_broker_website(broker["mc_number"], broker["website"], debug=debug, client=client)
+        return sorted(scored, key=lambda x: x[1], reverse=True)
+
+    def describe(self, broker, emails_scored, dry_run):
+        lines = [f"   Website: {broker['website']}"]
+        if not emails_scored:
+            return lines + ["   ❌ No emails found"]
+        lines.append(f"   → {'Would add' if dry_run else 'Found'} {len(emails_scored)} emails:")
+        lines.extend(f"      {email} (confidence: {score:.2f})" for email, score in emails_scored[:3])
+        return lines
+
+    def write(self, conn, batch):
+        rows = [
+            {"mc": broker["mc_number"], "email": email, "score": score}
+            for broker, emails_scored in batch
+            for email, score in emails_scored
+        ]
+        conn.execute(_UPSERT_EMAIL_SQL, rows)
+        promoted = promote_best_many(conn.connection, sorted({broker["mc_number"] for broker, _ in batch}))
+        return {"emails_found": len(rows), "brokers_updated": len(promoted)}
+
+
+def scrape_brokers(
+    limit: int | None = None,
+    dry_run: bool = False,
+    debug: bool = False,
+    concurrency: int | None = None,
+    page_size: int | None = None,
+    restart: bool = False,
+    offline: bool = False,
+    no_cache: bool = False,
+):
     """Scrape emails from broker websites."""
-    db = SessionLocal()
     try:
-        # Get brokers WITH websites but WITHOUT primary_email
-        query = text("""
-            SELECT mc_number, company_name, website
-            FROM webwise.brokers
-            WHERE website IS NOT NULL
-              AND (primary_email IS NULL OR primary_email = '')
-            ORDER BY mc_number
-            LIMIT :limit
-        """)
-        result = db.execute(query, {"limit": limit or 999999})
-        brokers = result.fetchall()
-
-        if not brokers:
-            print("✅ No brokers need email scraping (all have websites with emails or no websites).")
-            return
-
-        print(f"🔍 Found {len(brokers)} brokers with websites but no primary_email. Starting scrape...")
-        if dry_run:
-            print("   [DRY RUN MODE - No updates will be made]")
-
-        updated = 0
-        found_emails = 0
-        failed = 0
-
-        for idx, (mc, name, website) in enumerate(brokers, 1):
-            print(f"\n[{idx}/{len(brokers)}] MC {mc}: {name}")
-            print(f"   Website: {website}")
-            
-            if dry_run:
-                emails_scored = scrape_broker_website(mc, website, debug=debug)
-                if emails_scored:
-                    print(f"   → Would add {len(emails_scored)} emails:")
-                    for email, score in sorted(emails_scored, key=lambda x: x[1], reverse=True)[:3]:
-                        print(f"      {email} (confidence: {score:.2f})")
-                else:
-                    print(f"   → No emails found")
-                time.sleep(2)  # Rate limit
-                continue
-
-            emails_scored = scrape_broker_website(mc, website, debug=debug)
-            if emails_scored:
-                # Insert into broker_emails
-                for email, score in emails_scored:
-                    insert_query = text("""
-                        INSERT INTO webwise.broker_emails (mc_number, email, source, confidence)
-                        VALUES (:mc, :email, 'website', :score)
-                        ON CONFLICT (mc_number, email) DO UPDATE SET confidence = GREATEST(confidence, :score)
-                    """)
-                    db.execute(insert_query, {"mc": mc, "email": email, "score": score})
-                    found_emails += 1
-                
-                # Promote best email to primary_email
-                raw_conn = db.connection().connection
-                promoted = promote_best(raw_conn, mc)
-                db.commit()
-                
-                if promoted:
-                    updated += 1
-                    print(f"   ✅ Added {len(emails_scored)} emails, promoted best to primary_email")
-                else:
-                    print(f"   ✅ Added {len(emails_scored)} emails")
-            else:
-                failed += 1
-                print(f"   ❌ No emails found")
-
-            # Rate limiting
-            if idx < len(brokers):
-                time.sleep(2)  # 2 second delay between scrapes
-
-        print(f"\n📊 Summary:")
-        print(f"   ✅ Brokers updated: {updated}")
-        print(f"   📧 Total emails found: {found_emails}")
-        print(f"   ❌ No emails found: {failed}")
-
+        return run_stage(
+            WebsiteEmailsStage(),
+            limit=limit,
+            dry_run=dry_run,
+            debug=debug,
+            concurrency=concurrency,
+            page_size=page_size,
+            resume=not restart,
+            use_cache=not no_cache,
+            offline=offline,
+        )
     except Exception as e:
         print(f"❌ Scraping failed: {e}")
-        db.rollback()
-    finally:
-        db.close()
 
 
 if __name__ == "__main__":
@@ -174,5 +173,15 @@ if __name__ == "__main__":
     parser.add_argument("--limit", type=int, help="Limit number of brokers to process")
     parser.add_argument("--dry-run", action="store_true", help="Scrape but don't update database")
     parser.add_argument("--debug", action="store_true", help="Show detailed debugging")
+    add_runner_arguments(parser)
     args = parser.parse_args()
-    scrape_brokers(limit=args.limit, dry_run=args.dry_run, debug=args.debug)
+    scrape_brokers(
+        limit=args.limit,
+        dry_run=args.dry_run,
+        debug=args.debug,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        restart=args.restart,
+        offline=args.offline,
+        no_cache=args.no_cache,
+    )
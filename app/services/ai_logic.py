@@ -4,6 +4,12 @@ AI logic for parsing broker replies and extracting bid details.
 import re
 from typing import Any
 
+# Bump when extract_bid_details / is_rate_con_message change; rows with an older
+# messages.parser_version are reprocessed by `python -m app.scripts.backfill_message_parse`.
+PARSER_VERSION = 1
+
+RATE_CON_KEYWORDS = ["rate confirmation", "ratecon", "rate con", "rc attached", "signed copy", "rate confirmation attached"]
+
 
 def extract_bid_details(email_body: str) -> dict[str, Any]:
     """
@@ -35,6 +41,42 @@ def extract_bid_details(email_body: str) -> dict[str, Any]:
     return {"extracted_offer": extracted_offer, "broker_ready": broker_ready}
 
 
+def is_rate_con_message(subject: str, body: str) -> bool:
+    """Detect Rate Confirmation keywords in email subject or body."""
+    content = ((subject or "") + " " + (body or ""))[:2000].lower()
+    return any(k in content for k in RATE_CON_KEYWORDS)
+
+
+def parse_message(subject: str, body: str) -> dict[str, Any]:
+    """
+    Parse-once stage for stored broker messages.
+    Returns: {extracted_offer, broker_ready, is_rate_con, parser_version} — the values
+    persisted on webwise.messages so readers never re-run the regexes.
+    """
+    details = extract_bid_details(body or "")
+    return {
+        "extracted_offer": details.get("extracted_offer"),
+        "broker_ready": bool(details.get("broker_ready", False)),
+        "is_rate_con": is_rate_con_message(subject, body),
+        "parser_version": PARSER_VERSION,
+    }
+
+
+def bid_details_from_row(row: Any) -> dict[str, Any]:
+    """
+    {extracted_offer, broker_ready} for a webwise.messages row.
+    Uses the stored columns when parsed by the current PARSER_VERSION; otherwise
+    (legacy / not yet backfilled) falls back to parsing row.body_text.
+    """
+    if getattr(row, "parser_version", None) == PARSER_VERSION:
+        offer = row.extracted_offer
+        return {
+            "extracted_offer": float(offer) if offer is not None else None,
+            "broker_ready": bool(row.broker_ready),
+        }
+    return extract_bid_details(getattr(row, "body_text", None) or "")
+
+
 def parse_sender_email(raw_from: str) -> str:
     """
     Extract clean email from 'Name <email@domain.com>' or 'email@domain.com'.
@@ -50,3 +92,14 @@ def parse_sender_email(raw_from: str) -> str:
     if "@" in raw:
         return raw.lower()
     return ""
+
+
+def driver_handle_from_recipient(recipient_tagged: str) -> str:
+    """
+    Driver handle from a tagged recipient (e.g. 'mike+LOAD-1@gcdloads.com' -> 'mike').
+    Mirrors LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1)) so stored
+    messages.driver_handle matches the legacy SQL expression exactly.
+    """
+    if not recipient_tagged or not isinstance(recipient_tagged, str):
+        return ""
+    return recipient_tagged.split("@", 1)[0].split("+", 1)[0].lower()
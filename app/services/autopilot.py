@@ -17,12 +17,14 @@ def process_autopilot_logic(
     driver_name: str,
     floor_price: float,
     target_price: float,
+    parsed: Optional[dict] = None,
 ) -> str:
     """
     Decides whether to counter, accept, or alert the driver.
+    parsed: fields already extracted at ingest (message_store); skips re-parsing the body.
     Returns: AUTO_ACCEPTED | AUTO_COUNTERED | BELOW_FLOOR_MANUAL_REQUIRED | NO_PRICE_DETECTED
     """
-    details = extract_bid_details(email_body)
+    details = parsed if parsed else extract_bid_details(email_body)
     offer = details.get("extracted_offer")
 
     if offer is None:
@@ -0,0 +1,192 @@
+"""
+Broker directory search over webwise.brokers / webwise.broker_emails (FMCSA broker set).
+
+search_brokers(q) picks the lookup from the shape of the query:
+  - email or domain ("loads@acme.com", "acme.com")  -> owner of that domain (website, primary
+    email, broker_emails candidates), ranked by how the domain matched;
+  - digits, optionally prefixed MC / DOT / USDOT     -> exact MC or DOT, then MC/DOT prefixes;
+  - anything else                                    -> company / DBA name: prefix matches
+    first, then pg_trgm similarity (typo tolerant).
+Every branch is served by an index from sql/create_broker_search_indexes.sql.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+SEARCH_LIMIT_MAX = 50
+# Below this length trigrams are useless; only the prefix index is used.
+MIN_TRGM_LENGTH = 3
+
+_NUMBER_RE = re.compile(r"^(?:(?:us)?dot|mc)?[\s\-#:]*(\d{1,10})$", re.IGNORECASE)
+_DOMAIN_RE = re.compile(r"^[a-z0-9-]+(\.[a-z0-9-]+)+$")
+
+_COLUMNS = """
+    b.mc_number, b.dot_number, b.company_name, b.dba_name, b.website,
+    b.primary_email, b.primary_phone, b.phy_city, b.phy_state
+"""
+
+_NUMBER_SQL = text(f"""
+    SELECT {_COLUMNS},
+           CASE
+               WHEN b.mc_number = :num THEN 'mc'
+               WHEN b.dot_number = :num THEN 'dot'
+               WHEN b.mc_number LIKE :prefix THEN 'mc_prefix'
+               ELSE 'dot_prefix'
+           END AS match,
+           CASE
+               WHEN b.mc_number = :num OR b.dot_number = :num THEN 1.0
+               ELSE 0.5
+           END AS score
+    FROM webwise.brokers b
+    WHERE b.mc_number = :num
+       OR b.dot_number = :num
+       OR b.mc_number LIKE :prefix
+       OR (:only_dot AND b.dot_number LIKE :prefix)
+    ORDER BY score DESC, length(b.mc_number), b.mc_number
+    LIMIT :limit
+""")
+
+_NAME_PREFIX_SQL = text(f"""
+    SELECT {_COLUMNS}, 'name_prefix' AS match, 1.0 AS score
+    FROM webwise.brokers b
+    WHERE lower(b.company_name) LIKE :prefix
+    ORDER BY b.company_name
+    LIMIT :limit
+""")
+
+_NAME_TRGM_SQL = text(f"""
+    SELECT {_COLUMNS},
+           CASE
+               WHEN lower(b.company_name) LIKE :prefix OR lower(b.dba_name) LIKE :prefix THEN 'name_prefix'
+               WHEN lower(b.company_name) LIKE :contains OR lower(b.dba_name) LIKE :contains THEN 'name_contains'
+               ELSE 'name_similar'
+           END AS match,
+           GREATEST(
+               similarity(lower(b.company_name), :q),
+               similarity(lower(COALESCE(b.dba_name, '')), :q)
+           ) AS score
+    FROM webwise.brokers b
+    WHERE lower(b.company_name) % :q
+       OR lower(b.dba_name) % :q
+       OR lower(b.company_name) LIKE :contains
+       OR lower(b.dba_name) LIKE :contains
+    ORDER BY (lower(b.company_name) LIKE :prefix OR lower(b.dba_name) LIKE :prefix) DESC,
+             score DESC,
+             b.company_name
+    LIMIT :limit
+""")
+
+# Website domain is the strongest signal, then the promoted primary_email, then any
+# candidate in broker_emails (weighted by its confidence).
+_DOMAIN_SQL = text(f"""
+    WITH hits AS (
+        SELECT mc_number, 'website' AS match, 1.0 AS score
+        FROM webwise.brokers
+        WHERE webwise.url_domain(website) = :domain
+        UNION ALL
+        SELECT mc_number, 'primary_email', 0.95
+        FROM webwise.brokers
+        WHERE lower(split_part(primary_email, '@', 2)) = :domain
+        UNION ALL
+        SELECT mc_number, 'broker_email', 0.5 + 0.4 * MAX(confidence)
+        FROM webwise.broker_emails
+        WHERE lower(split_part(email, '@', 2)) = :domain
+        GROUP BY mc_number
+    ),
+    best AS (
+        SELECT DISTINCT ON (mc_number) mc_number, match, score
+        FROM hits
+        ORDER BY mc_number, score DESC
+    )
+    SELECT {_COLUMNS}, best.match, best.score
+    FROM best
+    JOIN webwise.brokers b ON b.mc_number = best.mc_number
+    ORDER BY best.score DESC, b.company_name
+    LIMIT :limit
+""")
+
+
+def normalize_domain(value: Optional[str]) -> str:
+    """
+    'Loads@Acme.com', 'https://www.acme.com/contact' or 'acme.com' -> 'acme.com'.
+    Same rule as webwise.url_domain() so lookups hit the expression indexes.
+    """
+    if not value:
+        return ""
+    s = value.strip().lower()
+    if "@" in s:
+        s = s.rsplit("@", 1)[1]
+    s = re.sub(r"^([a-z][a-z0-9+.-]*://)?(www\.)?", "", s)
+    return s.split("/", 1)[0]
+
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _rows(conn, stmt, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    out = []
+    for r in conn.execute(stmt, params).mappings():
+        row = dict(r)
+        row["score"] = round(float(row["score"] or 0), 3)
+        out.append(row)
+    return out
+
+
+def search_by_domain(engine: Engine, value: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Brokers owning the domain of an email / URL / bare domain, best match first."""
+    domain = normalize_domain(value)
+    if not engine or not domain:
+        return []
+    with engine.connect() as conn:
+        return _rows(conn, _DOMAIN_SQL, {"domain": domain, "limit": limit})
+
+
+def search_by_number(engine: Engine, value: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Exact MC / DOT match first, then MC prefixes (and DOT prefixes when asked for DOT)."""
+    m = _NUMBER_RE.match(value.strip())
+    if not engine or not m:
+        return []
+    num = m.group(1)
+    only_dot = value.strip().lower().startswith(("dot", "usdot"))
+    with engine.connect() as conn:
+        return _rows(conn, _NUMBER_SQL, {
+            "num": num,
+            "prefix": _like_escape(num) + "%",
+            "only_dot": only_dot,
+            "limit": limit,
+        })
+
+
+def search_by_name(engine: Engine, value: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """Company / DBA name: prefix matches first, then trigram similarity."""
+    q = " ".join(value.strip().lower().split())
+    if not engine or not q:
+        return []
+    params = {"q": q, "prefix": _like_escape(q) + "%", "limit": limit}
+    with engine.connect() as conn:
+        if len(q) < MIN_TRGM_LENGTH:
+            return _rows(conn, _NAME_PREFIX_SQL, params)
+        params["contains"] = "%" + _like_escape(q) + "%"
+        return _rows(conn, _NAME_TRGM_SQL, params)
+
+
+def search_brokers(engine: Engine, q: Optional[str], limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Ranked broker matches for a typeahead query (see module docstring for the rules).
+    Each row: mc_number, dot_number, company_name, dba_name, website, primary_email,
+    primary_phone, phy_city, phy_state, match (how it matched), score (0–1).
+    """
+    q = (q or "").strip()
+    if not engine or not q:
+        return []
+    limit = max(1, min(int(limit), SEARCH_LIMIT_MAX))
+    if _NUMBER_RE.match(q):
+        return search_by_number(engine, q, limit)
+    if "@" in q or (" " not in q and _DOMAIN_RE.match(normalize_domain(q))):
+        return search_by_domain(engine, q, limit)
+    return search_by_name(engine, q, limit)
@@ -3,15 +3,17 @@ Platform treasury + burn service (ORM-based).
 """
 from __future__ import annotations
 
+import os
 import uuid
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
 
-from sqlalchemy import select, update, func
+from sqlalchemy import select, update, func, text
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
+from app.core.cache import TTLCache
 from app.models.treasury import (
     PlatformRevenueLedger,
     BurnBatch,
@@ -29,6 +31,60 @@ class TreasuryStats:
     last_burn_at: datetime | None
 
 
+# Treasury stats come from webwise.treasury_daily_rollup (sql/create_treasury_daily_rollup.sql):
+# one row per (UTC day of created_at, source_type, status), kept in step with the ledger by
+# record_revenue / reserve_burn_for_batch / execute_batch in the same transaction.
+_STATS_CACHE = TTLCache(max_entries=8, ttl_seconds=float(os.getenv("TREASURY_STATS_TTL_SECONDS", "30")))
+
+_ROLLUP_RECORD_SQL = text("""
+    INSERT INTO webwise.treasury_daily_rollup AS t
+        (day, source_type, status, entry_count, gross_usd, burn_reserved_usd, updated_at)
+    VALUES ((now() AT TIME ZONE 'UTC')::date, :source_type, :status, 1, :gross, 0, now())
+    ON CONFLICT (day, source_type, status) DO UPDATE
+    SET entry_count = t.entry_count + 1,
+        gross_usd = t.gross_usd + EXCLUDED.gross_usd,
+        updated_at = now()
+""")
+
+# Moves rollup totals for ledger rows returned by a status-changing UPDATE (CTE "moved"):
+# subtract from the old status bucket, add to the new one.
+_ROLLUP_MOVE_SQL = """
+    rolled AS (
+        SELECT (created_at AT TIME ZONE 'UTC')::date AS day, source_type,
+               COUNT(*) AS n, SUM(gross_amount_usd) AS gross,
+               SUM(old_burn_reserved_usd) AS old_burn, SUM(burn_reserved_usd) AS new_burn
+        FROM moved
+        GROUP BY 1, 2
+    ),
+    from_bucket AS (
+        UPDATE webwise.treasury_daily_rollup t
+        SET entry_count = t.entry_count - rolled.n,
+            gross_usd = t.gross_usd - rolled.gross,
+            burn_reserved_usd = t.burn_reserved_usd - rolled.old_burn,
+            updated_at = now()
+        FROM rolled
+        WHERE t.day = rolled.day AND t.source_type = rolled.source_type AND t.status = :from_status
+        RETURNING 1
+    ),
+    to_bucket AS (
+        INSERT INTO webwise.treasury_daily_rollup AS t
+            (day, source_type, status, entry_count, gross_usd, burn_reserved_usd, updated_at)
+        SELECT day, source_type, :to_status, n, gross, new_burn, now() FROM rolled
+        ON CONFLICT (day, source_type, status) DO UPDATE
+        SET entry_count = t.entry_count + EXCLUDED.entry_count,
+            gross_usd = t.gross_usd + EXCLUDED.gross_usd,
+            burn_reserved_usd = t.burn_reserved_usd + EXCLUDED.burn_reserved_usd,
+            updated_at = now()
+        RETURNING 1
+    )
+"""
+
+
+def invalidate_treasury_stats() -> None:
+    """Drop cached treasury stats (called after every ledger/batch write in this module)."""
+    _STATS_CACHE.clear()
+
+
 def _to_decimal(amount: Decimal | float | int | str) -> Decimal:
     if isinstance(amount, Decimal):
         return amount
@@ -66,7 +122,12 @@ def record_revenue(
             burn_eligible=burn_eligible,
         )
         session.add(row)
+        session.execute(
+            _ROLLUP_RECORD_SQL,
+            {"source_type": row.source_type, "status": row.status, "gross": amt},
+        )
         session.commit()
+        invalidate_treasury_stats()
         return row.id
 
 
@@ -107,6 +168,49 @@ def create_batch(
         return batch.id
 
 
+# burn_reserved_usd = (gross * bps / 10000).quantize(0.01) with Decimal's default ROUND_HALF_EVEN,
+# computed in integer micro-dollars so it is bit-identical to burn_amount_usd(): n = cents * bps,
+# whole cents = n / 10000 rounded half-to-even. (Postgres ROUND() rounds half away from zero.)
+_RESERVE_BURN_SQL = text("""
+    WITH calc AS (
+        SELECT r.id, r.burn_reserved_usd AS old_burn_reserved_usd,
+               ROUND(r.gross_amount_usd * 100)::bigint * CAST(:bps AS bigint) AS n
+        FROM webwise.platform_revenue_ledger r
+        WHERE r.status = :recorded
+          AND r.burn_batch_id IS NULL
+          AND r.burn_eligible IS TRUE
+          AND r.gross_amount_usd > 0
+          AND r.created_at >= :period_start
+          AND r.created_at < :period_end
+        FOR UPDATE
+    ),
+    moved AS (
+        UPDATE webwise.platform_revenue_ledger r
+        SET burn_reserved_usd = (
+                calc.n / 10000
+                + CASE
+                    WHEN calc.n % 10000 > 5000 THEN 1
+                    WHEN calc.n % 10000 = 5000 AND (calc.n / 10000) % 2 = 1 THEN 1
+                    ELSE 0
+                  END
+            )::numeric / 100,
+            burn_batch_id = CAST(:batch_id AS uuid),
+            status = :reserved
+        FROM calc
+        WHERE r.id = calc.id
+        RETURNING r.created_at, r.source_type, r.gross_amount_usd,
+                  calc.old_burn_reserved_usd, r.burn_reserved_usd
+    ),
+""" + _ROLLUP_MOVE_SQL + """
+    SELECT COALESCE(SUM(burn_reserved_usd), 0) AS total, COUNT(*) AS reserved_rows FROM moved
+""")
+
+
+def burn_amount_usd(gross_amount_usd: Decimal | float | int | str, burn_rate_bps: int) -> Decimal:
+    """Reference per-row burn reservation (the SQL in reserve_burn_for_batch matches it exactly)."""
+    return (_to_decimal(gross_amount_usd) * Decimal(burn_rate_bps) / Decimal(10_000)).quantize(Decimal("0.01"))
+
+
 def reserve_burn_for_batch(
     engine: Engine,
     *,
@@ -122,9 +226,11 @@ def reserve_burn_for_batch(
     Returns usd_reserved total.
     Guardrails: only batch status CREATED; only rows with burn_batch_id IS NULL,
     gross_amount_usd > 0, burn_eligible = true.
+    All rows are reserved by one set-based UPDATE ... RETURNING; the total is summed in SQL.
     """
     with Session(engine) as session:
-        batch = session.get(BurnBatch, batch_id)
+        # Lock the batch so two reservations of the same batch cannot interleave
+        batch = session.get(BurnBatch, batch_id, with_for_update=True)
         if not batch:
             raise ValueError("batch not found")
         if batch.status != BurnBatchStatus.CREATED.value:
@@ -134,44 +240,48 @@ def reserve_burn_for_batch(
         if rate_bps <= 0:
             raise ValueError("burn_rate_bps must be > 0")
 
-        q = (
-            select(PlatformRevenueLedger.id, PlatformRevenueLedger.gross_amount_usd)
-            .where(PlatformRevenueLedger.status == RevenueLedgerStatus.RECORDED.value)
-            .where(PlatformRevenueLedger.burn_batch_id.is_(None))
-            .where(PlatformRevenueLedger.burn_eligible.is_(True))
-            .where(PlatformRevenueLedger.gross_amount_usd > 0)
-            .where(PlatformRevenueLedger.created_at >= batch.period_start)
-            .where(PlatformRevenueLedger.created_at < batch.period_end)
-        )
-        rows = session.execute(q).all()
-
-        total_reserved = Decimal("0.00")
-        for rid, gross in rows:
-            burn_amt = (Decimal(gross) * Decimal(rate_bps) / Decimal(10_000)).quantize(Decimal("0.01"))
-            total_reserved += burn_amt
-
-            session.execute(
-                update(PlatformRevenueLedger)
-                .where(PlatformRevenueLedger.id == rid)
-                .values(
-                    burn_reserved_usd=burn_amt,
-                    burn_batch_id=batch_id,
-                    status=RevenueLedgerStatus.RESERVED.value,
-                )
-            )
+        row = session.execute(
+            _RESERVE_BURN_SQL,
+            {
+                "bps": int(rate_bps),
+                "batch_id": str(batch_id),
+                "recorded": RevenueLedgerStatus.RECORDED.value,
+                "reserved": RevenueLedgerStatus.RESERVED.value,
+                "from_status": RevenueLedgerStatus.RECORDED.value,
+                "to_status": RevenueLedgerStatus.RESERVED.value,
+                "period_start": batch.period_start,
+                "period_end": batch.period_end,
+            },
+        ).one()
+        total_reserved = Decimal(row.total).quantize(Decimal("0.01"))
 
         session.execute(
             update(BurnBatch)
             .where(BurnBatch.id == batch_id)
             .values(
                 burn_rate_bps=rate_bps,
-                usd_reserved=total_reserved.quantize(Decimal("0.01")),
+                usd_reserved=total_reserved,
                 status=BurnBatchStatus.RESERVED.value,
             )
         )
 
         session.commit()
-        return total_reserved.quantize(Decimal("0.01"))
+        invalidate_treasury_stats()
+        return total_reserved
+
+
+_BURN_BATCH_ROWS_SQL = text("""
+    WITH moved AS (
+        UPDATE webwise.platform_revenue_ledger r
+        SET status = :to_status
+        WHERE r.burn_batch_id = CAST(:batch_id AS uuid)
+          AND r.status = :from_status
+        RETURNING r.created_at, r.source_type, r.gross_amount_usd,
+                  r.burn_reserved_usd AS old_burn_reserved_usd, r.burn_reserved_usd
+    ),
+""" + _ROLLUP_MOVE_SQL + """
+    SELECT COUNT(*) FROM moved
+""")
 
 
 def execute_batch(
@@ -196,10 +306,12 @@ def execute_batch(
             raise ValueError("batch not found")
 
         session.execute(
-            update(PlatformRevenueLedger)
-            .where(PlatformRevenueLedger.burn_batch_id == batch_id)
-            .where(PlatformRevenueLedger.status == RevenueLedgerStatus.RESERVED.value)
-            .values(status=RevenueLedgerStatus.BURNED.value)
+            _BURN_BATCH_ROWS_SQL,
+            {
+                "batch_id": str(batch_id),
+                "from_status": RevenueLedgerStatus.RESERVED.value,
+                "to_status": RevenueLedgerStatus.BURNED.value,
+            },
         )
 
         session.execute(
@@ -216,6 +328,7 @@ def execute_batch(
         )
 
         session.commit()
+        invalidate_treasury_stats()
 
 
 def get_batch(engine: Engine, batch_id: uuid.UUID) -> BurnBatch | None:
@@ -237,19 +350,26 @@ def list_batches(
         return list(session.scalars(stmt).all())
 
 
-def get_treasury_stats(engine: Engine) -> TreasuryStats:
+def get_treasury_stats(engine: Engine, *, use_cache: bool = True) -> TreasuryStats:
+    """
+    Totals from the daily rollup (a few rows per day, independent of ledger size) plus the
+    latest burned batch. Cached for TREASURY_STATS_TTL_SECONDS; writes invalidate it.
+    """
+    if use_cache:
+        cached = _STATS_CACHE.get("stats")
+        if cached is not None:
+            return cached
+
     with Session(engine) as session:
-        total_revenue = session.execute(
-            select(func.coalesce(func.sum(PlatformRevenueLedger.gross_amount_usd), 0))
-            .select_from(PlatformRevenueLedger)
-            .where(PlatformRevenueLedger.status != RevenueLedgerStatus.VOID.value)
-        ).scalar_one()
-
-        total_burned = session.execute(
-            select(func.coalesce(func.sum(PlatformRevenueLedger.burn_reserved_usd), 0))
-            .select_from(PlatformRevenueLedger)
-            .where(PlatformRevenueLedger.status == RevenueLedgerStatus.BURNED.value)
-        ).scalar_one()
+        totals = session.execute(
+            text("""
+                SELECT
+                    COALESCE(SUM(gross_usd) FILTER (WHERE status <> :void), 0) AS total_revenue,
+                    COALESCE(SUM(burn_reserved_usd) FILTER (WHERE status = :burned), 0) AS total_burned
+                FROM webwise.treasury_daily_rollup
+            """),
+            {"void": RevenueLedgerStatus.VOID.value, "burned": RevenueLedgerStatus.BURNED.value},
+        ).one()
 
         last = session.execute(
             select(BurnBatch.burn_tx_hash, BurnBatch.executed_at)
@@ -261,9 +381,57 @@ def get_treasury_stats(engine: Engine) -> TreasuryStats:
         last_hash = last[0] if last else None
         last_at = last[1] if last else None
 
-        return TreasuryStats(
-            total_revenue_usd=Decimal(total_revenue).quantize(Decimal("0.01")),
-            total_burned_usd=Decimal(total_burned).quantize(Decimal("0.01")),
+        stats = TreasuryStats(
+            total_revenue_usd=Decimal(totals.total_revenue).quantize(Decimal("0.01")),
+            total_burned_usd=Decimal(totals.total_burned).quantize(Decimal("0.01")),
             last_burn_tx_hash=last_hash,
             last_burn_at=last_at,
         )
+    _STATS_CACHE.set("stats", stats)
+    return stats
+
+
+def get_treasury_history(
+    engine: Engine,
+    *,
+    days: int = 90,
+    bucket: str = "day",
+) -> list[dict]:
+    """
+    Per-day (or per-week, bucket="week") revenue and burn series from the rollup, for charts.
+    Returns [{period, source_type, status, entry_count, gross_usd, burn_reserved_usd}] oldest first.
+    """
+    if bucket not in ("day", "week"):
+        raise ValueError("bucket must be 'day' or 'week'")
+    since: date = datetime.now(timezone.utc).date() - timedelta(days=max(1, days))
+    cache_key = ("history", days, bucket)
+    cached = _STATS_CACHE.get(cache_key)
+    if cached is not None:
+        return cached
+    with Session(engine) as session:
+        rows = session.execute(
+            text("""
+                SELECT date_trunc(:bucket, day)::date AS period, source_type, status,
+                       SUM(entry_count) AS entry_count,
+                       SUM(gross_usd) AS gross_usd,
+                       SUM(burn_reserved_usd) AS burn_reserved_usd
+                FROM webwise.treasury_daily_rollup
+                WHERE day >= :since
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+            """),
+            {"bucket": bucket, "since": since},
+        ).all()
+    history = [
+        {
+            "period": r.period.isoformat(),
+            "source_type": r.source_type,
+            "status": r.status,
+            "entry_count": int(r.entry_count),
+            "gross_usd": str(Decimal(r.gross_usd).quantize(Decimal("0.01"))),
+            "burn_reserved_usd": str(Decimal(r.burn_reserved_usd).quantize(Decimal("0.01"))),
+        }
+        for r in rows
+    ]
+    _STATS_CACHE.set(cache_key, history)
+    return history
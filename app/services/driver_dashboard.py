@@ -0,0 +1,100 @@
+"""
+Driver dashboard snapshot: gate status, banner status, fuel balance and new-driver flag
+from one CTE query, with a short per-trucker micro-cache.
+The dashboard page and its HTMX `load` partials (first-mission, active-loads empty state)
+share the same snapshot, so a page load plus its partials costs one round trip.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.core.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Rapid refreshes / morning login bursts reuse the snapshot; writes call invalidate_dashboard_snapshot.
+_SNAPSHOT_CACHE = TTLCache(
+    max_entries=int(os.getenv("DASHBOARD_SNAPSHOT_CACHE_SIZE", "2048")),
+    ttl_seconds=float(os.getenv("DASHBOARD_SNAPSHOT_TTL_SECONDS", "10")),
+)
+
+STARTER_BALANCES = (10.0, 50.0)
+
+_SNAPSHOT_SQL = text("""
+    WITH referral AS (
+        SELECT status
+        FROM webwise.factoring_referrals
+        WHERE trucker_id = :tid
+        ORDER BY submitted_at DESC
+        LIMIT 1
+    ),
+    fuel AS (
+        -- Maintained balance row; ledger sum only for truckers not materialized yet
+        SELECT COALESCE(
+            (SELECT balance_candle FROM webwise.driver_balances WHERE trucker_id = :tid),
+            (SELECT SUM(amount_candle)
+             FROM webwise.driver_savings_ledger
+             WHERE driver_mc_number = :mc
+               AND status IN ('CREDITED', 'CONSUMED')),
+            0
+        ) AS balance
+    ),
+    neg AS (
+        SELECT EXISTS (SELECT 1 FROM webwise.negotiations WHERE trucker_id = :tid) AS has_negotiations
+    )
+    SELECT
+        (SELECT status FROM referral) AS century_status,
+        fuel.balance,
+        neg.has_negotiations
+    FROM fuel, neg
+""")
+
+
+def get_dashboard_snapshot(
+    engine: Optional[Engine],
+    trucker_id: int,
+    mc_number: Optional[str],
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """
+    Returns {century_status, balance, has_negotiations, is_new_driver}.
+    century_status is the latest factoring_referrals.status (None if never submitted);
+    it drives both the Century/Universal gate and the dashboard banner.
+    is_new_driver: starter balance (10 or 50 $CANDLE) and zero negotiations.
+    DB errors are raised, never turned into an empty snapshot: the gate would read a missing
+    century_status as "never applied" and redirect approved drivers to onboarding.
+    """
+    empty = {"century_status": None, "balance": 0.0, "has_negotiations": False, "is_new_driver": False}
+    if not engine or not trucker_id:
+        return empty
+    if use_cache:
+        cached = _SNAPSHOT_CACHE.get(trucker_id)
+        if cached is not None:
+            return cached
+    try:
+        with engine.begin() as conn:
+            row = conn.execute(_SNAPSHOT_SQL, {"tid": trucker_id, "mc": (mc_number or "").strip() or None}).first()
+    except Exception:
+        logger.exception("Dashboard snapshot query failed for trucker %s", trucker_id)
+        raise
+    balance = float(row.balance or 0) if row else 0.0
+    has_negotiations = bool(row.has_negotiations) if row else False
+    snapshot = {
+        "century_status": row.century_status if row else None,
+        "balance": balance,
+        "has_negotiations": has_negotiations,
+        "is_new_driver": round(balance, 1) in STARTER_BALANCES and not has_negotiations,
+    }
+    _SNAPSHOT_CACHE.set(trucker_id, snapshot)
+    return snapshot
+
+
+def invalidate_dashboard_snapshot(trucker_id: Optional[int]) -> None:
+    """Drop a trucker's cached snapshot after a balance/negotiation/referral write."""
+    if trucker_id:
+        _SNAPSHOT_CACHE.delete(trucker_id)
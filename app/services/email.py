@@ -1,14 +1,15 @@
 import os
 import re
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict
 from datetime import datetime
 from dotenv import load_dotenv
 
+from app.services.smtp_pool import get_smtp_pool, outbox
+
 load_dotenv()
 
 # One source of truth for all email variables
@@ -26,6 +27,10 @@ MXROUTE_SMTP_PORT = MX_PORT
 MXROUTE_SMTP_USER = MX_USER
 MXROUTE_SMTP_PASSWORD = MX_PASS
 
+# Route handlers (e.g. negotiate_counter) queue counter emails on the background outbox
+# instead of sending inline when enabled.
+EMAIL_OUTBOX_ENABLED = os.getenv("EMAIL_OUTBOX_ENABLED", "false").lower() in ("1", "true", "yes")
+
 def send_negotiation_email(
     to_email: str,
     subject: str,
@@ -35,10 +40,14 @@ def send_negotiation_email(
     driver_name: str,
     load_source: Optional[str] = None,
     truck_number: Optional[str] = None,
+    background: bool = False,
+    on_sent: Optional[Callable[[Dict], None]] = None,
 ) -> Dict[str, any]:
     """
-    Sends email from [driver]+[load_id]@gcdloads.com via Fusion SMTP.
+    Sends email from [driver]+[load_id]@gcdloads.com via Fusion SMTP (pooled connection).
     If truck_number is set (fleet), appends professional fleet line to body.
+    background=True queues it on the outbox and returns {"status": "queued", ...};
+    on_sent(result) is called from the outbox thread once the send is attempted.
     """
     if not MXROUTE_SMTP_USER or not MXROUTE_SMTP_PASSWORD:
         return {"status": "error", "message": "SMTP credentials missing in .env"}
@@ -65,10 +74,18 @@ def send_negotiation_email(
         full_body += f"\n\n---\nRef: {load_id}"
         msg.attach(MIMEText(full_body, 'plain'))
 
-        # 3. Connect via SSL to Fusion
-        with smtplib.SMTP_SSL(MXROUTE_SMTP_HOST, MXROUTE_SMTP_PORT) as server:
-            server.login(MXROUTE_SMTP_USER, MXROUTE_SMTP_PASSWORD)
-            server.send_message(msg)
+        # 3. Send via the pooled SSL connection to Fusion
+        pool = get_smtp_pool(MXROUTE_SMTP_HOST, MXROUTE_SMTP_PORT, MXROUTE_SMTP_USER, MXROUTE_SMTP_PASSWORD)
+        if background:
+            # Outbox thread sends it; handler returns now. on_sent gets the final result.
+            outbox.enqueue(pool, msg, on_sent=on_sent)
+            return {
+                "status": "queued",
+                "sent_from": sender_email,
+                "sent_to": tagged_broker_email,
+                "sent_at": datetime.now().isoformat()
+            }
+        pool.send_message(msg)
 
         return {
             "status": "success",
@@ -160,9 +177,7 @@ Sent at {datetime.now().isoformat()}
 """
         msg.attach(MIMEText(body, "plain"))
 
-        with smtplib.SMTP_SSL(host, port) as server:
-            server.login(user, password)
-            server.send_message(msg)
+        get_smtp_pool(host, port, user, password).send_message(msg)
 
         return {"status": "success", "sent_to": to_email}
     except Exception as e:
@@ -210,10 +225,8 @@ Green Candle Dispatch
         msg["Subject"] = f"New Green Candle Dispatch Referral - MC# {mc}"
         msg["Reply-To"] = referral_data.get("email", from_email)
         msg.attach(MIMEText(body, "plain"))
-        with smtplib.SMTP_SSL(host, port) as server:
-            server.login(user, password)
-            recipients = [to_email] + ([cc_email] if cc_email else [])
-            server.send_message(msg, to_addrs=recipients)
+        recipients = [to_email] + ([cc_email] if cc_email else [])
+        get_smtp_pool(host, port, user, password).send_message(msg, to_addrs=recipients)
         return {"status": "success", "sent_to": to_email}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -253,9 +266,7 @@ Green Candle Dispatch
         msg["Subject"] = "You're approved! Log in to your Green Candle Dispatch dashboard"
         msg["Reply-To"] = from_email
         msg.attach(MIMEText(body, "plain"))
-        with smtplib.SMTP_SSL(MX_HOST, MX_PORT) as server:
-            server.login(MX_USER, MX_PASS)
-            server.send_message(msg, to_addrs=[driver_email])
+        get_smtp_pool(MX_HOST, MX_PORT, MX_USER, MX_PASS).send_message(msg, to_addrs=[driver_email])
         return {"status": "success", "sent_to": driver_email}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -285,9 +296,7 @@ Green Candle Dispatch
         msg["Subject"] = "Update from Century Finance – Next Steps"
         msg["Reply-To"] = from_email
         msg.attach(MIMEText(body, "plain"))
-        with smtplib.SMTP_SSL(MX_HOST, MX_PORT) as server:
-            server.login(MX_USER, MX_PASS)
-            server.send_message(msg, to_addrs=[driver_email])
+        get_smtp_pool(MX_HOST, MX_PORT, MX_USER, MX_PASS).send_message(msg, to_addrs=[driver_email])
         return {"status": "success", "sent_to": driver_email}
     except Exception as e:
         return {"status": "error", "message": str(e)}
@@ -354,9 +363,7 @@ The BOL PDF is attached.
         msg.attach(part)
         
         # Send email
-        with smtplib.SMTP_SSL(MX_HOST, MX_PORT) as server:
-            server.login(MX_USER, MX_PASS)
-            server.send_message(msg, to_addrs=[to_email])
+        get_smtp_pool(MX_HOST, MX_PORT, MX_USER, MX_PASS).send_message(msg, to_addrs=[to_email])
         
         return {
             "status": "success",
@@ -0,0 +1,469 @@
+"""
+Shared runner for the broker enrichment scripts (websites, dispatch contacts, website emails).
+
+Each script defines an EnrichmentStage: a keyset-paged broker query, a process() step that does
+the network work for one broker, and a write() step that upserts a whole page of results in one
+transaction. run_stage() drives a stage:
+  - brokers are processed concurrently (ENRICH_CONCURRENCY worker threads, driven from asyncio);
+  - every outbound request goes through EnrichmentClient, which rate-limits per host with a token
+    bucket (ENRICH_HOST_RPS / ENRICH_SEARCH_RPS) and retries connection errors, 429 and 5xx with
+    exponential backoff (ENRICH_MAX_RETRIES), honouring Retry-After;
+  - responses and search results are kept in the on-disk HttpCache (app/services/http_cache.py),
+    so re-runs only revalidate; --offline replays a run entirely from that cache;
+  - after each page is written, the last processed MC is checkpointed to
+    ENRICH_STATE_DIR/<stage>.json so an interrupted run resumes where it stopped. A finished pass
+    clears the checkpoint so the next run starts from the top again.
+"""
+from __future__ import annotations
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+from urllib.parse import urlencode, urlsplit
+
+try:
+    from ddgs import DDGS
+    HAS_DDGS = True
+except ImportError:
+    try:
+        from duckduckgo_search import DDGS
+        HAS_DDGS = True
+    except ImportError:
+        DDGS = None
+        HAS_DDGS = False
+
+import requests
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.services.http_cache import HttpCache
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+ENRICH_CONCURRENCY = int(os.getenv("ENRICH_CONCURRENCY", "8"))
+ENRICH_PAGE_SIZE = int(os.getenv("ENRICH_PAGE_SIZE", "100"))
+ENRICH_HOST_RPS = float(os.getenv("ENRICH_HOST_RPS", "1.0"))
+ENRICH_HOST_BURST = float(os.getenv("ENRICH_HOST_BURST", "2"))
+ENRICH_SEARCH_RPS = float(os.getenv("ENRICH_SEARCH_RPS", "0.5"))
+ENRICH_MAX_RETRIES = int(os.getenv("ENRICH_MAX_RETRIES", "3"))
+ENRICH_BACKOFF_BASE = float(os.getenv("ENRICH_BACKOFF_BASE", "1.0"))
+ENRICH_BACKOFF_MAX = float(os.getenv("ENRICH_BACKOFF_MAX", "30"))
+ENRICH_STATE_DIR = Path(os.getenv("ENRICH_STATE_DIR", str(PROJECT_ROOT / ".enrichment")))
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() not in ("0", "false", "no", "off")
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+SEARCH_HOST = "duckduckgo.com"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: acquire() blocks until a token is available."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(burst, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token; returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def host_key(url: str) -> str:
+    """Rate-limit key for a URL: lowercased host without www (DuckDuckGo mirrors share one key)."""
+    host = (urlsplit(url).hostname or "").lower()
+    if host.endswith("." + SEARCH_HOST):
+        return SEARCH_HOST
+    return host[4:] if host.startswith("www.") else host
+
+
+class EnrichmentClient:
+    """
+    HTTP GET + DuckDuckGo text search shared by all worker threads, with a token bucket per host
+    and retry/backoff. One requests.Session per thread (sessions are not thread-safe).
+    With a cache, fresh hits skip the network (and the rate limit) entirely.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[HttpCache] = None,
+        host_rps: float = ENRICH_HOST_RPS,
+        host_burst: float = ENRICH_HOST_BURST,
+        search_rps: float = ENRICH_SEARCH_RPS,
+        max_retries: int = ENRICH_MAX_RETRIES,
+        backoff_base: float = ENRICH_BACKOFF_BASE,
+        backoff_max: float = ENRICH_BACKOFF_MAX,
+    ):
+        self.host_rps = host_rps
+        self.host_burst = host_burst
+        self.search_rps = search_rps
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats: Dict[str, float] = {"requests": 0, "searches": 0, "retries": 0, "errors": 0, "throttled_s": 0.0}
+
+    def _bucket(self, host: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                if host == SEARCH_HOST:
+                    bucket = TokenBucket(self.search_rps, 1)
+                else:
+                    bucket = TokenBucket(self.host_rps, self.host_burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def _throttle(self, host: str) -> None:
+        waited = self._bucket(host).acquire()
+        with self._lock:
+            self.stats["throttled_s"] += waited
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.headers["User-Agent"] = USER_AGENT
+            self._local.session = session
+        return session
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> None:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if retry_after:
+            try:
+                delay = min(self.backoff_max, max(delay, float(retry_after)))
+            except ValueError:
+                pass
+        time.sleep(delay * (0.5 + random.random() / 2))
+        self._count("retries")
+
+    def get(self, url: str, timeout: float = 10, **kwargs: Any) -> requests.Response:
+        """
+        Rate-limited GET. Retries connection errors, timeouts, 429 and 5xx; the last response
+        (or exception) is returned/raised as-is so callers keep using raise_for_status().
+        """
+        if self.cache is not None:
+            return self.cache.get(self._fetch, url, timeout=timeout, **kwargs)
+        return self._fetch(url, timeout=timeout, **kwargs)
+
+    def _fetch(self, url: str, timeout: float = 10, **kwargs: Any) -> requests.Response:
+        host = host_key(url)
+        attempt = 0
+        while True:
+            self._throttle(host)
+            self._count("requests")
+            try:
+                resp = self._session().get(url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    self._count("errors")
+                    raise
+                logger.debug("GET %s failed (%s), retrying", url, e)
+                self._backoff(attempt)
+                attempt += 1
+                continue
+            if resp.status_code in RETRY_STATUSES and attempt < self.max_retries:
+                logger.debug("GET %s -> %s, retrying", url, resp.status_code)
+                self._backoff(attempt, resp.headers.get("Retry-After"))
+                attempt += 1
+                continue
+            return resp
+
+    def search(self, query: str, max_results: int = 10) -> List[Dict[str, Any]]:
+        """Rate-limited DuckDuckGo text search (ddgs). Retries rate-limit/transport errors."""
+        cache_key = "ddgs:text?" + urlencode({"q": query, "n": max_results})
+        if self.cache is not None:
+            cached = self.cache.get_json(cache_key)
+            if cached is not None:
+                return cached
+        if not HAS_DDGS:
+            raise RuntimeError("ddgs not installed")
+        attempt = 0
+        while True:
+            self._throttle(SEARCH_HOST)
+            self._count("searches")
+            try:
+                with DDGS() as ddgs:
+                    results = list(ddgs.text(query, max_results=max_results))
+                if self.cache is not None:
+                    self.cache.put_json(cache_key, results)
+                return results
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self._count("errors")
+                    raise
+                logger.debug("Search %r failed (%s), retrying", query, e)
+                self._backoff(attempt)
+                attempt += 1
+
+
+_default_client: Optional[EnrichmentClient] = None
+_default_client_lock = threading.Lock()
+
+
+def make_client(use_cache: bool = HTTP_CACHE_ENABLED, offline: bool = False) -> EnrichmentClient:
+    """Client with the env-configured limits and (unless use_cache=False) the on-disk cache."""
+    if offline:
+        return EnrichmentClient(cache=HttpCache(offline=True))
+    return EnrichmentClient(cache=HttpCache() if use_cache else None)
+
+
+def get_client() -> EnrichmentClient:
+    """Process-wide client, so direct calls to the scrape helpers share the same host limits."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = make_client()
+        return _default_client
+
+
+class Checkpoint:
+    """Last processed MC for a stage, stored as JSON under ENRICH_STATE_DIR."""
+
+    def __init__(self, name: str, state_dir: Path = ENRICH_STATE_DIR):
+        self.path = Path(state_dir) / f"{name}.json"
+
+    def load(self) -> Optional[str]:
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return None
+        return data.get("last_mc")
+
+    def save(self, last_mc: str, counts: Mapping[str, int]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "last_mc": last_mc,
+            "counts": dict(counts),
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }))
+        tmp.replace(self.path)
+
+    def clear(self) -> None:
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class EnrichmentStage(abc.ABC):
+    """
+    One enrichment step over webwise.brokers. Subclasses set name/select_sql and implement
+    process() (network work for one broker, runs in a worker thread), describe() (log lines)
+    and write() (batched upsert for a page, runs inside one transaction).
+
+    select_sql must filter on mc_number > :after, ORDER BY mc_number and LIMIT :page_size.
+    """
+
+    name = "stage"
+    select_sql = ""
+
+    def params(self) -> Dict[str, Any]:
+        """Extra bind parameters for select_sql."""
+        return {}
+
+    @abc.abstractmethod
+    def process(self, broker: Mapping[str, Any], client: EnrichmentClient, debug: bool = False) -> Any:
+        """Network work for one broker; the result is passed to found(), describe() and write()."""
+
+    def found(self, result: Any) -> bool:
+        return bool(result)
+
+    def describe(self, broker: Mapping[str, Any], result: Any, dry_run: bool) -> List[str]:
+        return []
+
+    @abc.abstractmethod
+    def write(self, conn, batch: Sequence[Tuple[Mapping[str, Any], Any]]) -> Dict[str, int]:
+        """Persist the found results of one page; returns counters to add to the summary."""
+
+
+async def _run_stage(
+    stage: EnrichmentStage,
+    engine: Engine,
+    client: EnrichmentClient,
+    limit: Optional[int],
+    dry_run: bool,
+    debug: bool,
+    concurrency: int,
+    page_size: int,
+    checkpoint: Optional[Checkpoint],
+    after: str,
+) -> Dict[str, int]:
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"enrich-{stage.name}")
+    sem = asyncio.Semaphore(concurrency)
+    counts: Dict[str, int] = {"processed": 0, "found": 0, "not_found": 0, "errors": 0}
+    select = text(stage.select_sql)
+
+    def fetch_page(after_mc: str, size: int) -> List[Dict[str, Any]]:
+        with engine.connect() as conn:
+            rows = conn.execute(select, {**stage.params(), "after": after_mc, "page_size": size})
+            return [dict(r) for r in rows.mappings()]
+
+    def write_page(batch: List[Tuple[Dict[str, Any], Any]]) -> Dict[str, int]:
+        with engine.begin() as conn:
+            return stage.write(conn, batch)
+
+    async def one(broker: Dict[str, Any]) -> Tuple[Dict[str, Any], Any, Optional[Exception]]:
+        async with sem:
+            try:
+                result = await loop.run_in_executor(executor, stage.process, broker, client, debug)
+                return broker, result, None
+            except Exception as e:
+                return broker, None, e
+
+    try:
+        while limit is None or counts["processed"] < limit:
+            size = page_size if limit is None else min(page_size, limit - counts["processed"])
+            rows = await loop.run_in_executor(executor, fetch_page, after, size)
+            if not rows:
+                if checkpoint and not dry_run:
+                    checkpoint.clear()
+                break
+
+            outcomes = await asyncio.gather(*(one(r) for r in rows))
+            batch: List[Tuple[Dict[str, Any], Any]] = []
+            for broker, result, err in outcomes:
+                counts["processed"] += 1
+                print(f"\n[{counts['processed']}] MC {broker['mc_number']}: {broker.get('company_name')}")
+                if err is not None:
+                    counts["errors"] += 1
+                    print(f"   ⚠️  Error: {err}")
+                    continue
+                for line in stage.describe(broker, result, dry_run):
+                    print(line)
+                if stage.found(result):
+                    counts["found"] += 1
+                    batch.append((broker, result))
+                else:
+                    counts["not_found"] += 1
+
+            if batch and not dry_run:
+                written = await loop.run_in_executor(executor, write_page, batch)
+                for key, value in (written or {}).items():
+                    counts[key] = counts.get(key, 0) + value
+
+            after = rows[-1]["mc_number"]
+            if checkpoint and not dry_run:
+                checkpoint.save(after, counts)
+            if len(rows) < size:
+                if checkpoint and not dry_run:
+                    checkpoint.clear()
+                break
+    finally:
+        executor.shutdown(wait=False)
+    return counts
+
+
+def run_stage(
+    stage: EnrichmentStage,
+    engine: Optional[Engine] = None,
+    *,
+    limit: Optional[int] = None,
+    dry_run: bool = False,
+    debug: bool = False,
+    concurrency: Optional[int] = None,
+    page_size: Optional[int] = None,
+    resume: bool = True,
+    use_checkpoint: bool = True,
+    use_cache: bool = True,
+    offline: bool = False,
+    client: Optional[EnrichmentClient] = None,
+) -> Dict[str, int]:
+    """
+    Run a stage to completion (or limit brokers). Resumes after the checkpointed MC unless
+    resume=False; dry runs neither write nor move the checkpoint. offline=True serves every
+    request from the HTTP cache (uncached URLs fail as errors); use_cache=False (or
+    HTTP_CACHE_ENABLED=false) bypasses it. Returns summary counters.
+    """
+    if engine is None:
+        from app.core.deps import engine as app_engine
+        engine = app_engine
+    if engine is None:
+        raise RuntimeError("DATABASE_URL not set")
+    checkpoint = Checkpoint(stage.name) if use_checkpoint else None
+    after = ""
+    if checkpoint:
+        if resume:
+            after = checkpoint.load() or ""
+        elif not dry_run:
+            checkpoint.clear()
+    if after:
+        print(f"↪️  Resuming {stage.name} after MC {after}")
+    if dry_run:
+        print("   [DRY RUN MODE - No updates will be made]")
+
+    if client is None:
+        use_cache = use_cache and HTTP_CACHE_ENABLED
+        client = make_client(use_cache=use_cache, offline=offline) if (offline or not use_cache) else get_client()
+    started = time.monotonic()
+    counts = asyncio.run(_run_stage(
+        stage,
+        engine,
+        client,
+        limit,
+        dry_run,
+        debug,
+        max(1, concurrency or ENRICH_CONCURRENCY),
+        max(1, page_size or ENRICH_PAGE_SIZE),
+        checkpoint,
+        after,
+    ))
+    elapsed = time.monotonic() - started
+    rate = counts["processed"] / elapsed if elapsed > 0 else 0.0
+    print(f"\n📊 Summary ({stage.name}, {elapsed:.1f}s, {rate:.2f} brokers/s):")
+    for key, value in counts.items():
+        print(f"   {key}: {value}")
+    print(f"   http: {int(client.stats['requests'])} requests, {int(client.stats['searches'])} searches, "
+          f"{int(client.stats['retries'])} retries, {client.stats['throttled_s']:.1f}s throttled")
+    if client.cache is not None:
+        cs = client.cache.stats
+        print(f"   cache: {cs['hits']} hits, {cs['revalidated']} revalidated, {cs['misses']} misses, "
+              f"{cs['evicted']} evicted{' (offline)' if client.cache.offline else ''}")
+    return counts
+
+
+def add_runner_arguments(parser) -> None:
+    """Common CLI flags for the stage scripts."""
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help=f"Brokers processed in parallel (default ENRICH_CONCURRENCY={ENRICH_CONCURRENCY})")
+    parser.add_argument("--page-size", type=int, default=None,
+                        help=f"Brokers per fetch/write batch (default ENRICH_PAGE_SIZE={ENRICH_PAGE_SIZE})")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the saved checkpoint and start from the first MC")
+    parser.add_argument("--offline", action="store_true",
+                        help="Replay from the HTTP cache only; never touch the network")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the on-disk HTTP cache")
@@ -0,0 +1,283 @@
+"""
+On-disk HTTP response cache for the broker enrichment scrapers (app/services/enrichment.py).
+
+Layout under HTTP_CACHE_DIR (default .enrichment/http_cache):
+  index/<ab>/<sha256(normalized url)>.json   metadata: url, status, validators, expiry, blob hash
+  blobs/<ab>/<sha256(body)>.gz               gzip-compressed body, shared by identical pages
+
+- Keys are normalized URLs (lowercase scheme/host, default port and fragment dropped, query
+  sorted), so http://Foo.com:80/?b=2&a=1#top and http://foo.com/?a=1&b=2 hit the same entry.
+- Freshness is a TTL per content type (HTTP_CACHE_TTL_HTML / _JSON / _DEFAULT seconds). A stale
+  entry with an ETag or Last-Modified is revalidated with a conditional GET; a 304 refreshes it
+  without downloading the body again.
+- Total blob size is capped at HTTP_CACHE_MAX_MB; least recently used entries are evicted first.
+- Offline mode (HTTP_CACHE_OFFLINE=true or --offline) serves whatever is cached, stale or not,
+  and never touches the network, so extraction/scoring changes can be replayed from disk.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+HTTP_CACHE_DIR = Path(os.getenv("HTTP_CACHE_DIR", str(PROJECT_ROOT / ".enrichment" / "http_cache")))
+HTTP_CACHE_MAX_MB = int(os.getenv("HTTP_CACHE_MAX_MB", "512"))
+HTTP_CACHE_OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "false").lower() in ("1", "true", "yes", "on")
+
+DAY = 86400
+TTL_BY_TYPE = {
+    "text/html": int(os.getenv("HTTP_CACHE_TTL_HTML", str(7 * DAY))),
+    "application/json": int(os.getenv("HTTP_CACHE_TTL_JSON", str(DAY))),
+}
+TTL_DEFAULT = int(os.getenv("HTTP_CACHE_TTL_DEFAULT", str(3 * DAY)))
+TTL_SEARCH = int(os.getenv("HTTP_CACHE_TTL_SEARCH", str(7 * DAY)))
+
+# Only the headers the scrapers (and revalidation) need are stored.
+_KEPT_HEADERS = ("content-type", "etag", "last-modified")
+
+
+class CacheMiss(requests.ConnectionError):
+    """Raised in offline mode for a URL that was never cached."""
+
+
+def normalize_url(url: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Canonical form of url (+ query params) used as the cache key."""
+    parts = urlsplit(url.strip())
+    scheme = (parts.scheme or "http").lower()
+    host = (parts.hostname or "").lower()
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        query.extend((str(k), str(v)) for k, v in params.items() if v is not None)
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(sorted(query)), ""))
+
+
+def ttl_for(content_type: Optional[str]) -> int:
+    mime = (content_type or "").split(";")[0].strip().lower()
+    return TTL_BY_TYPE.get(mime, TTL_DEFAULT)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class HttpCache:
+    """Content-addressed, size-bounded response cache. Safe to share between threads."""
+
+    def __init__(
+        self,
+        root: Path = HTTP_CACHE_DIR,
+        max_bytes: int = HTTP_CACHE_MAX_MB * 1024 * 1024,
+        offline: bool = HTTP_CACHE_OFFLINE,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0, "evicted": 0}
+
+    # -- paths -----------------------------------------------------------------------------
+
+    def _index_path(self, key: str) -> Path:
+        digest = _sha256(key.encode("utf-8"))
+        return self.root / "index" / digest[:2] / f"{digest}.json"
+
+    def _blob_path(self, body_hash: str) -> Path:
+        return self.root / "blobs" / body_hash[:2] / f"{body_hash}.gz"
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    # -- entries ---------------------------------------------------------------------------
+
+    def lookup(self, key: str) -> Optional[Tuple[Dict[str, Any], bytes]]:
+        """(metadata, body) for key, fresh or stale; None if absent or its blob is gone."""
+        index_path = self._index_path(key)
+        try:
+            meta = json.loads(index_path.read_text())
+            body = gzip.decompress(self._blob_path(meta["body_sha256"]).read_bytes())
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            os.utime(index_path)  # mtime = last access, drives LRU eviction
+        except OSError:
+            pass
+        return meta, body
+
+    def store(self, key: str, url: str, status: int, headers: Dict[str, str], body: bytes) -> Dict[str, Any]:
+        body_hash = _sha256(body)
+        blob_path = self._blob_path(body_hash)
+        added = 0
+        if not blob_path.exists():
+            compressed = gzip.compress(body, compresslevel=6)
+            self._write_atomic(blob_path, compressed)
+            added = len(compressed)
+        kept = {k: v for k, v in ((h, headers.get(h)) for h in _KEPT_HEADERS) if v}
+        now = time.time()
+        meta = {
+            "url": url,
+            "key": key,
+            "status": status,
+            "headers": kept,
+            "body_sha256": body_hash,
+            "size": len(body),
+            "fetched_at": now,
+            "expires_at": now + ttl_for(kept.get("content-type")),
+        }
+        self._write_atomic(self._index_path(key), json.dumps(meta).encode("utf-8"))
+        with self._lock:
+            self.stats["stored"] += 1
+            if self._size is not None:
+                self._size += added
+        if added:
+            self._maybe_evict()
+        return meta
+
+    def refresh(self, key: str, meta: Dict[str, Any], headers: Dict[str, str]) -> None:
+        """Extend a revalidated (304) entry, picking up any new validators."""
+        for h in _KEPT_HEADERS:
+            if headers.get(h):
+                meta["headers"][h] = headers[h]
+        meta["expires_at"] = time.time() + ttl_for(meta["headers"].get("content-type"))
+        self._write_atomic(self._index_path(key), json.dumps(meta).encode("utf-8"))
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    # -- eviction --------------------------------------------------------------------------
+
+    def _scan_size(self) -> int:
+        total = 0
+        for path in (self.root / "blobs").glob("*/*.gz"):
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass  # removed by a concurrent eviction
+        return total
+
+    def _maybe_evict(self) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            if self._size <= self.max_bytes:
+                return
+            self._size = self._evict_locked()
+
+    def _evict_locked(self) -> int:
+        """Drop least recently used index entries until blobs fit in 90% of max_bytes."""
+        entries: List[Tuple[float, Path, str]] = []
+        for path in (self.root / "index").glob("*/*.json"):
+            try:
+                entries.append((path.stat().st_mtime, path, json.loads(path.read_text())["body_sha256"]))
+            except (OSError, ValueError, KeyError):
+                path.unlink(missing_ok=True)
+        refs: Dict[str, int] = {}
+        for _, _, body_hash in entries:
+            refs[body_hash] = refs.get(body_hash, 0) + 1
+        size = self._scan_size()
+        target = int(self.max_bytes * 0.9)
+        for _, path, body_hash in sorted(entries):
+            if size <= target:
+                break
+            path.unlink(missing_ok=True)
+            self.stats["evicted"] += 1
+            refs[body_hash] -= 1
+            if refs[body_hash] == 0:
+                blob = self._blob_path(body_hash)
+                try:
+                    size -= blob.stat().st_size
+                    blob.unlink()
+                except OSError:
+                    pass
+        return size
+
+    # -- requests integration ----------------------------------------------------------------
+
+    @staticmethod
+    def to_response(meta: Dict[str, Any], body: bytes) -> requests.Response:
+        resp = requests.Response()
+        resp.status_code = meta["status"]
+        resp._content = body
+        resp.headers = CaseInsensitiveDict(meta.get("headers") or {})
+        resp.url = meta["url"]
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers) or "utf-8"
+        resp.from_cache = True
+        return resp
+
+    def get(self, fetch, url: str, params: Optional[Dict[str, Any]] = None, **kwargs: Any) -> requests.Response:
+        """
+        Cached GET. fetch(url, params=..., headers=..., **kwargs) performs the network request
+        (e.g. EnrichmentClient's rate-limited, retrying GET). Only 200 responses are stored.
+        """
+        key = normalize_url(url, params)
+        cached = self.lookup(key)
+        if cached is not None:
+            meta, body = cached
+            if self.offline or meta["expires_at"] > time.time():
+                self.count("hits")
+                return self.to_response(meta, body)
+        elif self.offline:
+            self.count("misses")
+            raise CacheMiss(f"offline: {url} not in cache")
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            validators = cached[0]["headers"]
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last-modified"):
+                headers["If-Modified-Since"] = validators["last-modified"]
+
+        resp = fetch(url, params=params, headers=headers or None, **kwargs)
+        if resp.status_code == 304 and cached is not None:
+            meta, body = cached
+            self.refresh(key, meta, resp.headers)
+            self.count("revalidated")
+            return self.to_response(meta, body)
+        self.count("misses")
+        if resp.status_code == 200:
+            self.store(key, resp.url or url, resp.status_code, resp.headers, resp.content)
+        resp.from_cache = False
+        return resp
+
+    def get_json(self, key: str, ttl: int = TTL_SEARCH) -> Optional[Any]:
+        """
+        Cached JSON document for a non-HTTP key (e.g. search results). None when absent or
+        older than ttl; in offline mode a missing key raises CacheMiss instead.
+        """
+        cached = self.lookup(key)
+        if cached is None:
+            if self.offline:
+                self.count("misses")
+                raise CacheMiss(f"offline: {key} not in cache")
+            return None
+        meta, body = cached
+        if not self.offline and meta.get("fetched_at", 0) + ttl <= time.time():
+            return None
+        self.count("hits")
+        return json.loads(body)
+
+    def put_json(self, key: str, value: Any) -> None:
+        self.store(key, key, 200, {"content-type": "application/json"}, json.dumps(value).encode("utf-8"))
@@ -12,7 +12,7 @@ IMPORTANT: As of 2026, ALL $CANDLE service credits are IMMEDIATE-USE.
 """
 from decimal import Decimal
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from sqlalchemy import text
 
 # --- GLOBAL CONSTANTS (SEC-SAFE, DOLLAR-BLIND) ---
@@ -53,10 +53,12 @@ def process_load_settlement(
     trucker_id: int,
     load_id: str,
     total_paid_by_broker: float,
+    mc_number: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Called when a load is settled (e.g. driver accepts). Calculates the 2.5% fee,
     splits into operating buckets, and credits the driver's ledger.
+    Pass mc_number when the caller already has it (skips the profile lookup).
 
     Returns: {gross_fee, credits_issued, credits_usd, infra_allocation}
     """
@@ -76,13 +78,14 @@ def process_load_settlement(
 
     try:
         with engine.begin() as conn:
-            mc_row = conn.execute(
-                text("SELECT mc_number FROM webwise.trucker_profiles WHERE id = :tid"),
-                {"tid": trucker_id},
-            ).first()
-            if not mc_row or not mc_row[0]:
-                return {"gross_fee": float(split["gross_fee"]), "credits_issued": 0, "credits_usd": driver_credits_usd, "infra_allocation": float(split["infra_allocation"])}
-            mc_number = mc_row[0]
+            if not mc_number:
+                mc_row = conn.execute(
+                    text("SELECT mc_number FROM webwise.trucker_profiles WHERE id = :tid"),
+                    {"tid": trucker_id},
+                ).first()
+                if not mc_row or not mc_row[0]:
+                    return {"gross_fee": float(split["gross_fee"]), "credits_issued": 0, "credits_usd": driver_credits_usd, "infra_allocation": float(split["infra_allocation"])}
+                mc_number = mc_row[0]
 
             # Immediate-use credits: no vesting. SEC-safe rebate model.
             conn.execute(
@@ -145,105 +148,312 @@ OUTBOUND_EMAIL_COST = USAGE_RATES["MANUAL_EMAIL"]
 AI_VOICE_CALL_COST = USAGE_RATES["VOICE_ESCALATION"]
 
 
-def has_sufficient_fuel(engine, trucker_id: int, cost: float) -> bool:
+def has_sufficient_fuel(engine, trucker_id: int, cost: float, mc_number: Optional[str] = None) -> bool:
     """Check if driver has enough $CANDLE for an action."""
     if not engine or not trucker_id or cost <= 0:
         return False
     from app.services.vesting import VestingService
-    balance = VestingService.get_claimable_balance(engine, trucker_id)
+    balance = VestingService.get_claimable_balance(engine, trucker_id, mc_number=mc_number)
     return balance >= cost
 
 
-def record_usage(engine, trucker_id: int, load_id: str, action_key: str) -> bool:
+# Charged at most once per (trucker, load, action) without a caller-supplied event_id.
+ONCE_PER_LOAD_ACTIONS = {"AUTO_BOOKING", "FULL_DISPATCH"}
+
+_ENSURE_BALANCE_ROW_SQL = text("""
+    INSERT INTO webwise.driver_balances (trucker_id, mc_number, balance_candle)
+    SELECT tp.id, tp.mc_number,
+           (SELECT COALESCE(SUM(amount_candle), 0)
+            FROM webwise.driver_savings_ledger
+            WHERE driver_mc_number = tp.mc_number AND status IN ('CREDITED', 'CONSUMED'))
+    FROM webwise.trucker_profiles tp
+    WHERE tp.id = :tid
+      AND tp.mc_number IS NOT NULL AND tp.mc_number <> ''
+      AND NOT EXISTS (SELECT 1 FROM webwise.driver_balances WHERE trucker_id = :tid)
+    ON CONFLICT (trucker_id) DO NOTHING
+""")
+
+# Check-and-insert in one statement: the balance row is locked for the statement, the CONSUMED
+# row is only inserted when balance >= cost, and the partial unique index on idempotency_key
+# turns a replay into a no-op. The ledger trigger moves driver_balances in the same transaction.
+_CONDITIONAL_DEBIT_SQL = text("""
+    WITH bal AS (
+        SELECT b.balance_candle, tp.mc_number
+        FROM webwise.driver_balances b
+        JOIN webwise.trucker_profiles tp ON tp.id = b.trucker_id
+        WHERE b.trucker_id = :tid
+        FOR UPDATE OF b
+    ),
+    ins AS (
+        INSERT INTO webwise.driver_savings_ledger
+            (driver_mc_number, load_id, amount_usd, amount_candle, unlocks_at, status, idempotency_key)
+        SELECT bal.mc_number, :load_id, -CAST(:cost AS NUMERIC), -CAST(:cost AS NUMERIC), now(), 'CONSUMED', :ikey
+        FROM bal
+        WHERE bal.balance_candle >= :cost
+          AND (NOT :legacy_guard OR NOT EXISTS (
+                SELECT 1 FROM webwise.driver_savings_ledger
+                WHERE driver_mc_number = bal.mc_number AND load_id = :load_id
+                  AND status = 'CONSUMED' AND idempotency_key IS NULL
+                  AND amount_candle = -CAST(:cost AS NUMERIC)))
+        ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+        RETURNING id
+    )
+    SELECT (SELECT id FROM ins) AS ledger_id, (SELECT balance_candle FROM bal) AS balance_before
+""")
+
+
+def usage_idempotency_key(trucker_id: int, load_id: str, action_key: str, event_id: Optional[str] = None) -> Optional[str]:
     """
-    Deducts Automation Fuel for an action. Returns True if charged, False if insufficient or failed.
-    Checks balance before deducting.
+    Idempotency key for a usage debit: trucker:load:action[:event_id].
+    Repeatable actions (e.g. MANUAL_EMAIL per counter) only get a key when the caller
+    passes event_id; without one they are charged every time, as before.
+    """
+    if event_id is None and action_key not in ONCE_PER_LOAD_ACTIONS:
+        return None
+    key = f"{trucker_id}:{load_id}:{action_key}"
+    return f"{key}:{event_id}" if event_id is not None else key
+
+
+def _debit_on_conn(conn, trucker_id: int, load_id: str, action_key: str, cost: float, ikey: Optional[str]) -> Dict[str, Any]:
+    conn.execute(_ENSURE_BALANCE_ROW_SQL, {"tid": trucker_id})
+    row = conn.execute(
+        _CONDITIONAL_DEBIT_SQL,
+        {
+            "tid": trucker_id,
+            "load_id": load_id,
+            "cost": cost,
+            "ikey": ikey,
+            # Success fees charged before idempotency keys existed must still block a re-charge
+            "legacy_guard": action_key == "AUTO_BOOKING",
+        },
+    ).first()
+    before = float(row.balance_before) if row and row.balance_before is not None else 0.0
+    if row and row.ledger_id is not None:
+        return {"status": "charged", "charged": True, "ledger_id": row.ledger_id, "balance": round(before - cost, 4)}
+    if row is None or row.balance_before is None:
+        return {"status": "no_profile", "charged": False, "balance": 0.0}
+    if ikey is not None:
+        dup = conn.execute(
+            text("SELECT 1 FROM webwise.driver_savings_ledger WHERE idempotency_key = :ikey"),
+            {"ikey": ikey},
+        ).first()
+        if dup:
+            return {"status": "duplicate", "charged": False, "balance": before}
+    if before >= cost:
+        return {"status": "duplicate", "charged": False, "balance": before}  # legacy success fee
+    return {"status": "insufficient", "charged": False, "balance": before}
+
+
+def debit_fuel(
+    engine,
+    trucker_id: int,
+    load_id: str,
+    action_key: str,
+    event_id: Optional[str] = None,
+    idempotency_key: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Atomic conditional debit of USAGE_RATES[action_key] $CANDLE.
+    Returns {status, charged, balance[, ledger_id]} where status is charged / duplicate /
+    insufficient / no_profile / error and balance is the balance after this call.
     """
-    if not engine or not trucker_id or not load_id or not action_key:
-        return False
     cost = USAGE_RATES.get(action_key)
-    if cost is None or cost <= 0:
+    if not engine or not trucker_id or not load_id or cost is None or cost <= 0:
+        return {"status": "error", "charged": False, "balance": 0.0}
+    ikey = idempotency_key or usage_idempotency_key(trucker_id, load_id, action_key, event_id)
+    try:
+        with engine.begin() as conn:
+            return _debit_on_conn(conn, trucker_id, load_id, action_key, float(cost), ikey)
+    except Exception as e:
+        print(f"Ledger debit_fuel error: {e}")
+        return {"status": "error", "charged": False, "balance": 0.0}
+
+
+# Compensating CREDITED row for a CONSUMED debit; "refund:<id>" makes a second refund a no-op.
+# The debit keeps its row (audit trail) but its idempotency key is retired, so a retry of the
+# same action is charged and performed again.
+_REFUND_SQL = text("""
+    WITH debit AS (
+        SELECT id, driver_mc_number, load_id, amount_usd, amount_candle, idempotency_key
+        FROM webwise.driver_savings_ledger
+        WHERE id = :id AND status = 'CONSUMED'
+        FOR UPDATE
+    ),
+    refund AS (
+        INSERT INTO webwise.driver_savings_ledger
+            (driver_mc_number, load_id, amount_usd, amount_candle, unlocks_at, status, idempotency_key)
+        SELECT driver_mc_number, load_id, -amount_usd, -amount_candle, now(), 'CREDITED', 'refund:' || id
+        FROM debit
+        ON CONFLICT (idempotency_key) WHERE idempotency_key IS NOT NULL DO NOTHING
+        RETURNING id
+    ),
+    retired AS (
+        UPDATE webwise.driver_savings_ledger l
+        SET idempotency_key = debit.idempotency_key || ':refunded:' || debit.id
+        FROM debit
+        WHERE l.id = debit.id
+          AND debit.idempotency_key IS NOT NULL
+          AND EXISTS (SELECT 1 FROM refund)
+    )
+    SELECT (SELECT id FROM refund) AS refund_id
+""")
+
+
+def refund_fuel(engine, ledger_id: int) -> bool:
+    """
+    Reverse a debit_fuel charge whose action did not happen (e.g. the email failed to send):
+    a compensating CREDITED row restores the balance (via the ledger trigger) and the debit's
+    idempotency key is released for a retry. Returns True if this call issued the refund.
+    """
+    if not engine or not ledger_id:
         return False
-    if not has_sufficient_fuel(engine, trucker_id, cost):
+    try:
+        with engine.begin() as conn:
+            row = conn.execute(_REFUND_SQL, {"id": ledger_id}).first()
+        return bool(row and row.refund_id is not None)
+    except Exception as e:
+        print(f"Ledger refund_fuel error: {e}")
         return False
 
-    if action_key == "AUTO_BOOKING":
-        return deduct_success_fee(engine, trucker_id, load_id)
 
+def debit_fuel_batch(engine, debits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Batched conditional debits for bulk autopilot actions: one connection and one commit.
+    debits: [{trucker_id, load_id, action_key, event_id?}]. Rows are applied in trucker_id
+    order (consistent lock order, no deadlocks between concurrent batches); results are
+    returned in input order. Each debit is still checked against the running balance.
+    """
+    results: List[Dict[str, Any]] = [{"status": "error", "charged": False, "balance": 0.0} for _ in debits]
+    if not engine or not debits:
+        return results
+    order = sorted(range(len(debits)), key=lambda i: (debits[i].get("trucker_id") or 0, i))
     try:
         with engine.begin() as conn:
-            mc_row = conn.execute(
-                text("SELECT mc_number FROM webwise.trucker_profiles WHERE id = :tid"),
-                {"tid": trucker_id},
-            ).first()
-            if not mc_row or not mc_row[0]:
-                return False
-            mc_number = mc_row[0]
-
-            conn.execute(
-                text("""
-                    INSERT INTO webwise.driver_savings_ledger
-                    (driver_mc_number, load_id, amount_usd, amount_candle, unlocks_at, status)
-                    VALUES (:mc, :load_id, :usd, :candle, now(), 'CONSUMED')
-                """),
-                {
-                    "mc": mc_number,
-                    "load_id": load_id,
-                    "usd": -float(cost),
-                    "candle": -float(cost),
-                },
-            )
-            return True
+            for i in order:
+                d = debits[i]
+                cost = USAGE_RATES.get(d.get("action_key"))
+                if not d.get("trucker_id") or not d.get("load_id") or cost is None or cost <= 0:
+                    continue
+                ikey = d.get("idempotency_key") or usage_idempotency_key(
+                    d["trucker_id"], d["load_id"], d["action_key"], d.get("event_id")
+                )
+                results[i] = _debit_on_conn(conn, d["trucker_id"], d["load_id"], d["action_key"], float(cost), ikey)
     except Exception as e:
-        print(f"Ledger record_usage error: {e}")
-        return False
+        print(f"Ledger debit_fuel_batch error: {e}")
+        return [{"status": "error", "charged": False, "balance": 0.0} for _ in debits]
+    return results
+
+
+def record_usage(
+    engine,
+    trucker_id: int,
+    load_id: str,
+    action_key: str,
+    mc_number: Optional[str] = None,
+    event_id: Optional[str] = None,
+) -> bool:
+    """
+    Deducts Automation Fuel for an action. Returns True if charged, False if insufficient,
+    already charged (same idempotency key) or failed. The balance check and the CONSUMED
+    insert are one statement (debit_fuel), so concurrent actions cannot overdraw.
+    mc_number is accepted for compatibility; the debit reads it with the balance row.
+    """
+    return debit_fuel(engine, trucker_id, load_id, action_key, event_id=event_id)["charged"]
 
 
-def deduct_success_fee(engine, trucker_id: int, load_id: str) -> bool:
+def deduct_success_fee(engine, trucker_id: int, load_id: str, mc_number: Optional[str] = None) -> bool:
     """
-    Deducts AUTOPILOT_COST (3.0) $CANDLE for a successful autonomous booking.
+    Deducts AUTOPILOT_COST $CANDLE for a successful autonomous booking.
     Only called when a Rate Confirmation is detected by the inbound listener.
-    Idempotent: returns False if already charged for this load (no double-billing).
+    Idempotent per (trucker, load): returns False if already charged (no double-billing).
     """
-    if not engine or not trucker_id or not load_id:
-        return False
+    return debit_fuel(engine, trucker_id, load_id, "AUTO_BOOKING")["charged"]
 
-    try:
-        with engine.begin() as conn:
-            mc_row = conn.execute(
-                text("SELECT mc_number FROM webwise.trucker_profiles WHERE id = :tid"),
-                {"tid": trucker_id},
-            ).first()
-            if not mc_row or not mc_row[0]:
-                return False
-            mc_number = mc_row[0]
-
-            # Idempotent: already charged for this load?
-            existing = conn.execute(
-                text("""
-                    SELECT id FROM webwise.driver_savings_ledger
-                    WHERE driver_mc_number = :mc AND load_id = :load_id AND status = 'CONSUMED'
-                """),
-                {"mc": mc_number, "load_id": load_id},
-            ).first()
-            if existing:
-                return False
 
-            # Insert CONSUMED row (negative = deduction)
-            conn.execute(
-                text("""
-                    INSERT INTO webwise.driver_savings_ledger
-                    (driver_mc_number, load_id, amount_usd, amount_candle, unlocks_at, status)
-                    VALUES (:mc, :load_id, :usd, :candle, now(), 'CONSUMED')
-                """),
-                {
-                    "mc": mc_number,
-                    "load_id": load_id,
-                    "usd": -float(AUTOPILOT_COST),
-                    "candle": -float(AUTOPILOT_COST),
-                },
-            )
-            return True
-    except Exception as e:
-        print(f"Ledger deduct_success_fee error: {e}")
-        return False
+# --- Maintained balance (webwise.driver_balances, kept by a ledger trigger) ---
+
+def reconcile_driver_balances(engine, fix: bool = False, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compare webwise.driver_balances with the ledger sum per trucker.
+    Returns {checked, drifted, missing, fixed, samples}. With fix=True each drifted trucker's
+    row is locked and recomputed in its own short transaction (locking first means the sum
+    sees every committed ledger row, so concurrent trigger deltas are not lost).
+    """
+    result: Dict[str, Any] = {"checked": 0, "drifted": 0, "missing": 0, "fixed": 0, "samples": []}
+    if not engine:
+        return result
+    with engine.begin() as conn:
+        result["checked"] = conn.execute(
+            text("SELECT COUNT(*) FROM webwise.trucker_profiles WHERE mc_number IS NOT NULL AND mc_number <> ''")
+        ).scalar() or 0
+        rows = conn.execute(
+            text("""
+                WITH expected AS (
+                    SELECT tp.id AS trucker_id, tp.mc_number,
+                           COALESCE(SUM(l.amount_candle), 0) AS expected
+                    FROM webwise.trucker_profiles tp
+                    LEFT JOIN webwise.driver_savings_ledger l
+                      ON l.driver_mc_number = tp.mc_number
+                     AND l.status IN ('CREDITED', 'CONSUMED')
+                    WHERE tp.mc_number IS NOT NULL AND tp.mc_number <> ''
+                    GROUP BY tp.id, tp.mc_number
+                )
+                SELECT e.trucker_id, e.mc_number, e.expected,
+                       b.balance_candle AS stored, b.mc_number AS stored_mc
+                FROM expected e
+                LEFT JOIN webwise.driver_balances b ON b.trucker_id = e.trucker_id
+                WHERE (b.trucker_id IS NULL AND e.expected <> 0)
+                   OR b.balance_candle <> e.expected
+                   OR b.mc_number <> e.mc_number
+                ORDER BY e.trucker_id
+                LIMIT :lim
+            """),
+            {"lim": limit},
+        ).fetchall()
+
+    for r in rows:
+        if r.stored is None:
+            result["missing"] += 1
+        else:
+            result["drifted"] += 1
+        if len(result["samples"]) < 20:
+            result["samples"].append({
+                "trucker_id": r.trucker_id,
+                "mc_number": r.mc_number,
+                "expected": float(r.expected),
+                "stored": float(r.stored) if r.stored is not None else None,
+            })
+        if not fix:
+            continue
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("""
+                        INSERT INTO webwise.driver_balances (trucker_id, mc_number, balance_candle)
+                        VALUES (:tid, :mc, 0)
+                        ON CONFLICT (trucker_id) DO NOTHING
+                    """),
+                    {"tid": r.trucker_id, "mc": r.mc_number},
+                )
+                conn.execute(
+                    text("SELECT 1 FROM webwise.driver_balances WHERE trucker_id = :tid FOR UPDATE"),
+                    {"tid": r.trucker_id},
+                )
+                conn.execute(
+                    text("""
+                        UPDATE webwise.driver_balances
+                        SET mc_number = :mc,
+                            balance_candle = (
+                                SELECT COALESCE(SUM(amount_candle), 0)
+                                FROM webwise.driver_savings_ledger
+                                WHERE driver_mc_number = :mc AND status IN ('CREDITED', 'CONSUMED')
+                            ),
+                            updated_at = now()
+                        WHERE trucker_id = :tid
+                    """),
+                    {"tid": r.trucker_id, "mc": r.mc_number},
+                )
+            result["fixed"] += 1
+        except Exception as e:
+            print(f"Ledger reconcile error for trucker {r.trucker_id}: {e}")
+    return result
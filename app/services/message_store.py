@@ -0,0 +1,117 @@
+"""
+Broker message storage: parse once at ingest, read columns afterwards.
+Used by inbound_listener.save_to_db and the /webhook/email/broker-reply handler.
+Each stored row carries driver_handle, extracted_offer, broker_ready, is_rate_con and
+parser_version (sql/migrate_messages_parse_once.sql).
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.services.ai_logic import PARSER_VERSION, parse_message, driver_handle_from_recipient
+
+
+def load_id_from_recipient(recipient: str) -> str:
+    """Load tag from plus-addressed recipient (driver+LOAD123@domain -> LOAD123), else GENERAL."""
+    tag_part = recipient.split("@")[0] if recipient and "@" in recipient else ""
+    return tag_part.split("+")[1] if "+" in tag_part else "GENERAL"
+
+
+def fallback_message_id(sender: str, subject: str, body: str) -> str:
+    """Stable id for emails without a Message-ID header (same email = same id)."""
+    raw = f"{sender}|{subject}|{(body or '')[:500]}"
+    return f"gen-{hashlib.sha256(raw.encode()).hexdigest()[:40]}"
+
+
+def save_inbound_message(
+    engine: Engine,
+    sender: str,
+    recipient: str,
+    subject: str,
+    body: str,
+    msg_id: str,
+    load_id: Optional[str] = None,
+) -> Tuple[int, str, Dict[str, Any]]:
+    """
+    Insert a broker message with its parsed fields. Idempotent on message_id.
+    Returns (rowcount, load_id, parsed) — rowcount 0 means we already had it.
+    """
+    load_id = load_id or load_id_from_recipient(recipient)
+    parsed = parse_message(subject, body)
+    with engine.begin() as conn:
+        result = conn.execute(
+            text("""
+                INSERT INTO webwise.messages
+                    (sender_email, recipient_tagged, subject, body_text, load_id, message_id,
+                     driver_handle, extracted_offer, broker_ready, is_rate_con, parser_version)
+                VALUES (:sender, :recipient, :subject, :body, :load_id, :msg_id,
+                        :driver_handle, :extracted_offer, :broker_ready, :is_rate_con, :parser_version)
+                ON CONFLICT (message_id) DO NOTHING
+            """),
+            {
+                "sender": sender,
+                "recipient": recipient,
+                "subject": subject or "",
+                "body": body or "",
+                "load_id": load_id,
+                "msg_id": msg_id,
+                "driver_handle": driver_handle_from_recipient(recipient or ""),
+                **parsed,
+            },
+        )
+    return result.rowcount, load_id, parsed
+
+
+def reparse_stale_messages(engine: Engine, chunk_size: int = 500, max_chunks: Optional[int] = None) -> int:
+    """
+    Backfill: re-run the parser on rows with a missing/older parser_version, chunk by chunk
+    (keyset on id, one short transaction per chunk). Returns number of rows updated.
+    """
+    if not engine:
+        return 0
+    updated = 0
+    last_id = 0
+    chunks = 0
+    while max_chunks is None or chunks < max_chunks:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text("""
+                    SELECT id, recipient_tagged, subject, body_text
+                    FROM webwise.messages
+                    WHERE id > :last_id
+                      AND (parser_version IS NULL OR parser_version < :ver)
+                    ORDER BY id
+                    LIMIT :lim
+                """),
+                {"last_id": last_id, "ver": PARSER_VERSION, "lim": chunk_size},
+            ).fetchall()
+            if not rows:
+                break
+            params = []
+            for r in rows:
+                parsed = parse_message(r.subject or "", r.body_text or "")
+                params.append({
+                    "id": r.id,
+                    "driver_handle": driver_handle_from_recipient(r.recipient_tagged or ""),
+                    **parsed,
+                })
+            conn.execute(
+                text("""
+                    UPDATE webwise.messages
+                    SET driver_handle = :driver_handle,
+                        extracted_offer = :extracted_offer,
+                        broker_ready = :broker_ready,
+                        is_rate_con = :is_rate_con,
+                        parser_version = :parser_version
+                    WHERE id = :id
+                """),
+                params,
+            )
+        updated += len(rows)
+        last_id = rows[-1].id
+        chunks += 1
+    return updated
@@ -0,0 +1,122 @@
+"""
+Concurrent action stage for inbound broker replies (used by inbound_listener.py).
+
+The IMAP thread fetches + parses + stores each message, then hands the follow-up work
+(rate-con success fee, notification, Auto-Pilot counter over SMTP) to a KeyedSerialExecutor
+keyed by load_id: replies for the same load run strictly in arrival order, different loads
+run in parallel on a bounded thread pool, so one slow SMTP handshake no longer stalls every
+other driver's reply. submit() blocks once max_pending items are queued (backpressure).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Hashable, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StageStats:
+    """Rolling latency window for one pipeline stage (seconds)."""
+
+    def __init__(self, window: int = 500):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            count = self.count
+        if not samples:
+            return {"count": count, "avg_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        return {
+            "count": count,
+            "avg_ms": round(sum(samples) / len(samples) * 1000, 1),
+            "p95_ms": round(p95 * 1000, 1),
+            "max_ms": round(samples[-1] * 1000, 1),
+        }
+
+
+class KeyedSerialExecutor:
+    """
+    Runs callables on a bounded pool with per-key ordering.
+    At most one task per key runs at a time; tasks for a key run in submit order.
+    """
+
+    def __init__(self, max_workers: int = 8, max_pending: int = 1000, name: str = "reply-actions"):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._queues: Dict[Hashable, Deque[Tuple[float, Callable, tuple, dict]]] = {}
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.running = 0
+        self.failed = 0
+        self.queue_wait = StageStats()
+        self.run_time = StageStats()
+
+    def submit(self, key: Hashable, fn: Callable, *args, **kwargs) -> None:
+        """Queue fn(*args, **kwargs) behind any earlier work for key. Blocks while the pipeline is full."""
+        self._slots.acquire()
+        item = (time.monotonic(), fn, args, kwargs)
+        with self._lock:
+            self.pending += 1
+            q = self._queues.get(key)
+            if q is not None:
+                q.append(item)  # a drainer is already active for this key
+                return
+            self._queues[key] = deque([item])
+        self._pool.submit(self._drain, key)
+
+    def _drain(self, key: Hashable) -> None:
+        while True:
+            with self._lock:
+                q = self._queues[key]
+                if not q:
+                    del self._queues[key]
+                    return
+                enqueued_at, fn, args, kwargs = q.popleft()
+                self.pending -= 1
+                self.running += 1
+            started = time.monotonic()
+            self.queue_wait.observe(started - enqueued_at)
+            try:
+                fn(*args, **kwargs)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Reply action failed for {key}: {e}")
+            finally:
+                self.run_time.observe(time.monotonic() - started)
+                with self._lock:
+                    self.running -= 1
+                self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Backpressure metrics: queue depth, in-flight, active keys, per-stage latency."""
+        with self._lock:
+            depth, running, keys = self.pending, self.running, len(self._queues)
+        return {
+            "queue_depth": depth,
+            "in_flight": running,
+            "active_keys": keys,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "failed": self.failed,
+            "queue_wait": self.queue_wait.snapshot(),
+            "run_time": self.run_time.snapshot(),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting work; with wait=True, drain everything already queued."""
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,285 @@
+"""
+Pooled, persistent SMTP connections + optional background outbox.
+
+Every send used to open a fresh SMTP_SSL connection (TLS handshake + AUTH per email).
+SMTPConnectionPool keeps a few logged-in connections alive, health-checks idle ones with
+NOOP, reconnects once on failure and recycles a connection after max_messages.
+EmailOutbox lets HTTP handlers enqueue a message and return immediately; a daemon thread
+drains the queue in batches through the pool.
+
+Works against any SMTP server, including a local aiosmtpd stand-in
+(SMTPConnectionPool(host, port, use_ssl=False, user=None)).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import Message
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_MAX_MESSAGES_PER_CONN = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONN", "100"))
+SMTP_NOOP_AFTER_SECONDS = float(os.getenv("SMTP_NOOP_AFTER_SECONDS", "30"))
+SMTP_MAX_IDLE_SECONDS = float(os.getenv("SMTP_MAX_IDLE_SECONDS", "240"))
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+
+
+class _DataTracking:
+    """Records whether DATA was started, i.e. whether the server may already have the message."""
+
+    data_started = False
+
+    def data(self, msg):
+        self.data_started = True
+        return super().data(msg)
+
+
+class _SMTP(_DataTracking, smtplib.SMTP):
+    pass
+
+
+class _SMTP_SSL(_DataTracking, smtplib.SMTP_SSL):
+    pass
+
+
+def _safe_to_retry(server: smtplib.SMTP, error: Exception) -> bool:
+    """
+    A dropped connection before DATA: nothing was delivered, so resending cannot duplicate.
+    SMTP protocol errors (refused recipients, data errors, ...) subclass OSError too but are
+    not retried, nor is anything once DATA has begun.
+    """
+    if getattr(server, "data_started", True):
+        return False
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class _PooledConnection:
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """Bounded pool of logged-in SMTP connections for one (host, port, user)."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        user: Optional[str] = None,
+        password: Optional[str] = None,
+        use_ssl: bool = True,
+        max_size: int = SMTP_POOL_SIZE,
+        max_messages_per_conn: int = SMTP_MAX_MESSAGES_PER_CONN,
+        noop_after_seconds: float = SMTP_NOOP_AFTER_SECONDS,
+        max_idle_seconds: float = SMTP_MAX_IDLE_SECONDS,
+        timeout: float = SMTP_TIMEOUT_SECONDS,
+    ):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.use_ssl = use_ssl
+        self.max_messages_per_conn = max_messages_per_conn
+        self.noop_after_seconds = noop_after_seconds
+        self.max_idle_seconds = max_idle_seconds
+        self.timeout = timeout
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self.connects = 0
+        self.reconnects = 0
+        self.sent = 0
+
+    def _open(self) -> _PooledConnection:
+        if self.use_ssl:
+            server = _SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            server = _SMTP(self.host, self.port, timeout=self.timeout)
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        with self._lock:
+            self.connects += 1
+        return _PooledConnection(server)
+
+    @staticmethod
+    def _close(conn: _PooledConnection) -> None:
+        try:
+            conn.server.quit()
+        except Exception:
+            try:
+                conn.server.close()
+            except Exception:
+                pass
+
+    def _healthy(self, conn: _PooledConnection) -> bool:
+        idle = time.monotonic() - conn.last_used
+        if idle > self.max_idle_seconds:
+            return False  # servers typically drop idle sessions; don't wait for the error
+        if idle > self.noop_after_seconds:
+            try:
+                return conn.server.noop()[0] == 250
+            except Exception:
+                return False
+        return True
+
+    def _checkout(self) -> _PooledConnection:
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._open()
+            if self._healthy(conn):
+                return conn
+            self._close(conn)
+
+    def _checkin(self, conn: _PooledConnection) -> None:
+        conn.last_used = time.monotonic()
+        if conn.sent >= self.max_messages_per_conn:
+            self._close(conn)
+            return
+        with self._lock:
+            self._idle.append(conn)
+
+    def send_message(self, msg: Message, to_addrs: Optional[List[str]] = None) -> None:
+        """
+        Send on a pooled connection. If the connection turns out to be dead before DATA
+        (see _safe_to_retry), reconnect and retry once; any other error is raised as-is so a
+        message the server may have accepted is never sent twice.
+        """
+        self._slots.acquire()
+        try:
+            conn = self._checkout()
+            conn.server.data_started = False
+            try:
+                conn.server.send_message(msg, to_addrs=to_addrs)
+            except Exception as e:
+                self._close(conn)
+                if not _safe_to_retry(conn.server, e):
+                    raise
+                with self._lock:
+                    self.reconnects += 1
+                conn = self._open()
+                try:
+                    conn.server.send_message(msg, to_addrs=to_addrs)
+                except Exception:
+                    self._close(conn)
+                    raise
+            conn.sent += 1
+            with self._lock:
+                self.sent += 1
+            self._checkin(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"idle": len(self._idle), "connects": self.connects, "reconnects": self.reconnects, "sent": self.sent}
+
+
+_pools: Dict[Tuple[str, int, Optional[str]], SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, user: Optional[str], password: Optional[str]) -> SMTPConnectionPool:
+    """Shared pool per (host, port, user). SSL unless EMAIL_SMTP_SSL=false (e.g. local test server)."""
+    key = (host, int(port), user)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            use_ssl = os.getenv("EMAIL_SMTP_SSL", "true").lower() not in ("0", "false", "no")
+            pool = SMTPConnectionPool(host, int(port), user, password, use_ssl=use_ssl)
+            _pools[key] = pool
+        return pool
+
+
+class EmailOutbox:
+    """
+    Background sender: enqueue() returns immediately; a daemon thread drains the queue in
+    batches through an SMTPConnectionPool. on_sent(result) runs after each attempt
+    with {"status": "success"} or {"status": "error", "message": ...}.
+    """
+
+    def __init__(self, batch_size: int = 20, max_queue: int = 1000):
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+                self._thread.start()
+
+    def enqueue(
+        self,
+        pool: SMTPConnectionPool,
+        msg: Message,
+        to_addrs: Optional[List[str]] = None,
+        on_sent: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> None:
+        self._ensure_started()
+        self._queue.put((pool, msg, to_addrs, on_sent))
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for pool, msg, to_addrs, on_sent in batch:
+                try:
+                    pool.send_message(msg, to_addrs=to_addrs)
+                    result = {"status": "success"}
+                    with self._lock:
+                        self.sent += 1
+                except Exception as e:
+                    result = {"status": "error", "message": f"SMTP Error: {e}"}
+                    with self._lock:
+                        self.failed += 1
+                    logger.error(f"Outbox send failed to {msg.get('To')}: {e}")
+                if on_sent:
+                    try:
+                        on_sent(result)
+                    except Exception as cb_err:
+                        logger.error(f"Outbox callback error: {cb_err}")
+                self._queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far has been attempted. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"queue_depth": self._queue.qsize(), "sent": self.sent, "failed": self.failed}
+
+
+outbox = EmailOutbox(
+    batch_size=int(os.getenv("EMAIL_OUTBOX_BATCH", "20")),
+    max_queue=int(os.getenv("EMAIL_OUTBOX_MAX_QUEUE", "1000")),
+)
@@ -9,13 +9,24 @@ Workflow:
     1. Driver uploads → upload_bol() → dispatch/raw/bol/
     2. OCR processes → get_object() reads from raw → save_processed_bol() → dispatch/processed/bol/
     3. Factoring packet → uses processed BOL from dispatch/processed/bol/
+
+Driver uploads (upload_bol, upload_load_document) never hold the file in memory or block the
+event loop: the upload is spooled to a temp file, images are converted to PDF on a small
+worker pool, and the result is sent with an S3 multipart upload (parts of UPLOAD_PART_SIZE_MB,
+at most UPLOAD_PART_CONCURRENCY in flight) from a thread. UPLOAD_MAX_CONCURRENT caps uploads
+in progress per worker; further uploads wait for a slot. Any S3-compatible endpoint works
+(DO_SPACES_ENDPOINT=http://localhost:9000 for minio, or moto's server mode).
 """
+import asyncio
 import io
 import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Tuple
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from fastapi import UploadFile
 
 from app.core.config import settings
@@ -30,6 +41,17 @@ DO_SPACES_REGION = os.getenv("DO_SPACES_REGION", "nyc3")
 DO_SPACES_BUCKET = os.getenv("DO_SPACES_BUCKET", "greencandle")
 DO_SPACES_ENDPOINT = os.getenv("DO_SPACES_ENDPOINT") or f"https://{DO_SPACES_REGION}.digitaloceanspaces.com"
 
+# Upload pipeline limits (per uvicorn worker)
+UPLOAD_MAX_CONCURRENT = int(os.getenv("UPLOAD_MAX_CONCURRENT", "4"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "25")) * 1024 * 1024
+UPLOAD_CONVERT_WORKERS = int(os.getenv("UPLOAD_CONVERT_WORKERS", "2"))
+# S3 minimum part size is 5 MB; memory per upload is about part size x part concurrency.
+UPLOAD_PART_SIZE = max(5, int(os.getenv("UPLOAD_PART_SIZE_MB", "8"))) * 1024 * 1024
+UPLOAD_PART_CONCURRENCY = int(os.getenv("UPLOAD_PART_CONCURRENCY", "2"))
+_SPOOL_CHUNK = 1024 * 1024
+
+IMAGE_EXTENSIONS = ("jpg", "jpeg", "png", "gif", "webp")
+
 
 def get_s3_client():
     """Get boto3 S3 client configured for DigitalOcean Spaces."""
@@ -72,47 +94,22 @@ async def upload_bol(file: UploadFile, mc_number: str, load_id: str) -> Tuple[st
         print("⚠️  WARNING: No DigitalOcean Keys found. Returning MOCK bucket/key.")
         return (DO_SPACES_BUCKET or "greencandle", file_path)
 
-    s3 = get_s3_client()
     try:
-        await file.seek(0)
-        file_content = await file.read()
-        if not file_content:
-            raise ValueError("File content is empty")
-        
-        # Check if it's an image and convert to PDF
-        ext = (file.filename or "").split(".")[-1].lower() if "." in (file.filename or "") else "jpg"
-        content_type = (file.content_type or "").lower()
-        is_image = ext in ("jpg", "jpeg", "png", "gif", "webp") or "image/" in content_type
-        
-        if is_image:
-            # Convert image to PDF
-            print(f"🖼️  Converting image to PDF...")
-            file_content = _image_to_pdf(file_content, content_type)
-            content_type = "application/pdf"
-        elif ext == "pdf" or "pdf" in content_type:
-            # Already PDF, use as-is
-            content_type = "application/pdf"
-        else:
+        ext, content_type = _upload_type(file)
+        is_image = ext in IMAGE_EXTENSIONS or "image/" in content_type
+        is_pdf = ext == "pdf" or "pdf" in content_type
+        if not is_image and not is_pdf:
             # Unknown format, try to convert if it looks like an image
             print(f"⚠️  Unknown file type '{ext}', attempting PDF conversion...")
-            file_content = _image_to_pdf(file_content, content_type)
-            content_type = "application/pdf"
-        
         print(f"📤 Uploading RAW BOL (as PDF) to bucket '{DO_SPACES_BUCKET}' key '{file_path}' (private)")
-        s3.put_object(
-            Bucket=DO_SPACES_BUCKET,
-            Key=file_path,
-            Body=file_content,
-            ContentType=content_type,
-            # No ACL = private; backend generates URLs when needed
-        )
+        await _ingest_upload(file, file_path, convert=not is_pdf, upload=True)
         return (DO_SPACES_BUCKET, file_path)
     except Exception as e:
         error_type = type(e).__name__
         error_msg = str(e)
         
         # Enhanced error message for NoSuchBucket
-        if "NoSuchBucket" in error_type or "does not exist" in error_msg:
+        if "NoSuchBucket" in error_type or "NoSuchBucket" in error_msg or "does not exist" in error_msg:
             available_buckets = list_buckets()
             bucket_info = f"Trying bucket: '{DO_SPACES_BUCKET}' in region '{DO_SPACES_REGION}'"
             if available_buckets:
@@ -266,6 +263,106 @@ def _image_to_pdf(content: bytes, content_type: str) -> bytes:
     return pdf_bytes
 
 
+# -- Streaming upload pipeline --------------------------------------------------------------
+
+_convert_pool = ThreadPoolExecutor(max_workers=UPLOAD_CONVERT_WORKERS, thread_name_prefix="doc-convert")
+_upload_slots: Optional[asyncio.Semaphore] = None
+
+
+def _slots() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop.
+    global _upload_slots
+    if _upload_slots is None:
+        _upload_slots = asyncio.Semaphore(UPLOAD_MAX_CONCURRENT)
+    return _upload_slots
+
+
+def _upload_type(file: UploadFile) -> Tuple[str, str]:
+    """(extension, content type) of an upload, lowercased; extension defaults to jpg."""
+    ext = (file.filename or "").split(".")[-1].lower() if "." in (file.filename or "") else "jpg"
+    return ext, (file.content_type or "").lower()
+
+
+def _spool_to_temp(src, max_bytes: Optional[int] = None) -> Tuple[str, int]:
+    """Copy a file object to a temp file in chunks. Returns (path, size). Runs in a thread."""
+    if max_bytes is None:
+        max_bytes = UPLOAD_MAX_BYTES
+    src.seek(0)
+    fd, path = tempfile.mkstemp(prefix="upload_", suffix=".bin")
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(_SPOOL_CHUNK)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"File too large (max {max_bytes // (1024 * 1024)} MB)")
+                out.write(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, size
+
+
+def _image_file_to_pdf(src_path: str) -> str:
+    """Convert an image file to a single-page PDF temp file. Returns its path. Runs on _convert_pool."""
+    import img2pdf
+    fd, pdf_path = tempfile.mkstemp(prefix="upload_", suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            img2pdf.convert(src_path, outputstream=out)
+    except BaseException:
+        os.unlink(pdf_path)
+        raise
+    return pdf_path
+
+
+def _multipart_upload(path: str, key: str, content_type: str) -> None:
+    """Upload a local file with bounded multipart parts (private, no ACL). Runs in a thread."""
+    config = TransferConfig(
+        multipart_threshold=UPLOAD_PART_SIZE,
+        multipart_chunksize=UPLOAD_PART_SIZE,
+        max_concurrency=UPLOAD_PART_CONCURRENCY,
+        use_threads=UPLOAD_PART_CONCURRENCY > 1,
+    )
+    get_s3_client().upload_file(
+        path,
+        DO_SPACES_BUCKET,
+        key,
+        ExtraArgs={"ContentType": content_type},
+        Config=config,
+    )
+
+
+async def _ingest_upload(file: UploadFile, key: str, convert: bool, upload: bool) -> None:
+    """
+    Spool -> (convert to PDF) -> multipart upload, off the event loop and within the per-worker
+    upload cap. Temp files are always removed. Raises ValueError for empty / too-large files.
+    """
+    async with _slots():
+        loop = asyncio.get_running_loop()
+        spooled, size = await asyncio.to_thread(_spool_to_temp, file.file)
+        paths = [spooled]
+        try:
+            if size == 0:
+                raise ValueError("File content is empty")
+            body = spooled
+            if convert:
+                print("🖼️  Converting image to PDF...")
+                body = await loop.run_in_executor(_convert_pool, _image_file_to_pdf, spooled)
+                paths.append(body)
+            if upload:
+                await asyncio.to_thread(_multipart_upload, body, key, "application/pdf")
+        finally:
+            for path in paths:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+
 async def upload_load_document(
     file: UploadFile,
     trucker_id: int,
@@ -279,35 +376,16 @@ async def upload_load_document(
     """
     prefix = settings.STORAGE_BUCKET_PREFIX.rstrip("/")
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    ext = (file.filename or "").split(".")[-1].lower() if "." in (file.filename or "") else "jpg"
-    content_type = (file.content_type or "").lower()
-
-    await file.seek(0)
-    content = await file.read()
-    if not content:
-        raise ValueError("File content is empty")
-
-    is_image = ext in ("jpg", "jpeg", "png", "gif", "webp") or "image/" in content_type
-    target_ext = "pdf"
-    target_content_type = "application/pdf"
+    ext, content_type = _upload_type(file)
+    is_image = ext in IMAGE_EXTENSIONS or "image/" in content_type
 
-    if is_image:
-        content = _image_to_pdf(content, content_type)
-        target_ext = "pdf"
-        target_content_type = "application/pdf"
-
-    file_path = f"{prefix}/trucker_{trucker_id}/load_{load_id}/{doc_type}_{timestamp}.{target_ext}"
+    file_path = f"{prefix}/trucker_{trucker_id}/load_{load_id}/{doc_type}_{timestamp}.pdf"
 
     if not DO_SPACES_KEY or not DO_SPACES_SECRET:
+        # Still spool + convert, so bad files fail the same way in dev.
+        await _ingest_upload(file, file_path, convert=is_image, upload=False)
         print("⚠️  WARNING: No DigitalOcean Keys. Returning MOCK bucket/key.")
         return (DO_SPACES_BUCKET or "greencandle", file_path)
 
-    s3 = get_s3_client()
-    s3.put_object(
-        Bucket=DO_SPACES_BUCKET,
-        Key=file_path,
-        Body=content,
-        ContentType=target_content_type,
-        # No ACL = private; backend generates URLs when needed
-    )
-    return (DO_SPACES_BUCKET, file_path)
\ No newline at end of file
+    await _ingest_upload(file, file_path, convert=is_image, upload=True)
+    return (DO_SPACES_BUCKET, file_path)
@@ -11,27 +11,37 @@ class VestingService:
     """Available Automation Fuel—$CANDLE credits for AI agents."""
 
     @staticmethod
-    def get_claimable_balance(engine: Optional[Engine], trucker_id: int) -> float:
+    def get_claimable_balance(engine: Optional[Engine], trucker_id: int, mc_number: Optional[str] = None) -> float:
         """Available $CANDLE balance for automation. Alias for get_available_service_balance."""
-        return VestingService.get_available_service_balance(engine, trucker_id)
+        return VestingService.get_available_service_balance(engine, trucker_id, mc_number=mc_number)
 
     @staticmethod
-    def get_available_service_balance(engine: Optional[Engine], trucker_id: int) -> float:
+    def get_available_service_balance(engine: Optional[Engine], trucker_id: int, mc_number: Optional[str] = None) -> float:
         """
         Total Available Fuel: sum of CREDITED (positive) + CONSUMED (negative).
         All earned credits are immediately available—no lock or maturity period.
+        Reads the maintained webwise.driver_balances row (constant time); falls back to
+        summing the ledger for truckers without a row yet (sql/create_driver_balances.sql).
+        Pass mc_number (e.g. from get_driver_context) to skip the profile lookup.
         """
         if not engine or not trucker_id:
             return 0.0
         try:
             with engine.begin() as conn:
-                mc_row = conn.execute(
-                    text("SELECT mc_number FROM webwise.trucker_profiles WHERE id = :trucker_id"),
+                maintained = conn.execute(
+                    text("SELECT balance_candle FROM webwise.driver_balances WHERE trucker_id = :trucker_id"),
                     {"trucker_id": trucker_id}
                 ).fetchone()
-                if not mc_row or not mc_row[0]:
-                    return 0.0
-                mc_number = mc_row[0]
+                if maintained is not None:
+                    return float(maintained[0] or 0.0)
+                if not mc_number:
+                    mc_row = conn.execute(
+                        text("SELECT mc_number FROM webwise.trucker_profiles WHERE id = :trucker_id"),
+                        {"trucker_id": trucker_id}
+                    ).fetchone()
+                    if not mc_row or not mc_row[0]:
+                        return 0.0
+                    mc_number = mc_row[0]
                 # CREDITED = positive. CONSUMED = negative. Sum = available.
                 # LEGACY: VESTED/LOCKED statuses removed - credits are immediate-use only
                 result = conn.execute(
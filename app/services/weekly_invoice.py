@@ -1,92 +1,149 @@
 """
 Weekly invoice batching for drivers who use WEEKLY_INVOICE billing (no factoring).
 Accumulates uninvoiced DISPATCH_FEE rows from platform_revenue_ledger into driver_invoice_batches.
-Run via cron/APScheduler (e.g. every Sunday night).
+Run via cron/APScheduler (e.g. every Sunday night): python -m app.jobs.weekly_invoice [--dry-run]
+
+Bulk pipeline: one query finds the drivers to bill, then each chunk of drivers is billed by a
+single statement (INSERT ... SELECT ... GROUP BY driver_mc_number RETURNING for the batches,
+UPDATE ... FROM to attach the ledger rows) in its own short transaction.
 """
 from __future__ import annotations
 
+import os
 from datetime import datetime, timezone, timedelta
-from decimal import Decimal
 from typing import List, Dict, Any
-from uuid import UUID
 
 from sqlalchemy import text
 from sqlalchemy.engine import Engine
 
+INVOICE_CHUNK_SIZE = int(os.getenv("WEEKLY_INVOICE_CHUNK_SIZE", "1000"))
+
+# Drivers on WEEKLY_INVOICE that have uninvoiced DISPATCH_FEE rows. The distinct MCs come
+# from the partial index ix_platform_revenue_ledger_driver_uninvoiced; trucker_profiles is
+# probed once per MC (EXISTS, so an MC shared by several profiles is not double-counted).
+_CANDIDATE_MCS_SQL = text("""
+    SELECT u.mc
+    FROM (
+        SELECT DISTINCT driver_mc_number AS mc
+        FROM webwise.platform_revenue_ledger
+        WHERE invoice_batch_id IS NULL
+          AND source_type = 'DISPATCH_FEE'
+          AND driver_mc_number IS NOT NULL
+    ) u
+    WHERE EXISTS (
+        SELECT 1 FROM webwise.trucker_profiles tp
+        WHERE tp.mc_number = u.mc AND tp.billing_method = 'WEEKLY_INVOICE'
+    )
+    ORDER BY u.mc
+""")
+
+_PREVIEW_SQL = text("""
+    SELECT driver_mc_number,
+           SUM(gross_amount_usd) AS total,
+           COUNT(*) AS row_count
+    FROM webwise.platform_revenue_ledger
+    WHERE driver_mc_number = ANY(:mcs)
+      AND invoice_batch_id IS NULL
+      AND source_type = 'DISPATCH_FEE'
+    GROUP BY driver_mc_number
+    HAVING SUM(gross_amount_usd) > 0
+    ORDER BY driver_mc_number
+""")
+
+# Locks the chunk's uninvoiced rows, creates one batch per driver from their sum and attaches
+# exactly those rows (a fee recorded mid-run waits for next week instead of joining a batch
+# whose total excludes it).
+_BILL_CHUNK_SQL = text("""
+    WITH pending AS (
+        SELECT id, driver_mc_number, gross_amount_usd
+        FROM webwise.platform_revenue_ledger
+        WHERE driver_mc_number = ANY(:mcs)
+          AND invoice_batch_id IS NULL
+          AND source_type = 'DISPATCH_FEE'
+        FOR UPDATE
+    ),
+    batches AS (
+        INSERT INTO webwise.driver_invoice_batches
+            (driver_mc_number, period_start, period_end, total_amount_usd, status)
+        SELECT driver_mc_number, :period_start, :period_end, SUM(gross_amount_usd), 'CREATED'
+        FROM pending
+        GROUP BY driver_mc_number
+        HAVING SUM(gross_amount_usd) > 0
+        RETURNING id, driver_mc_number, total_amount_usd
+    ),
+    assigned AS (
+        UPDATE webwise.platform_revenue_ledger prl
+        SET invoice_batch_id = b.id,
+            invoiced_at = NOW()
+        FROM pending p
+        JOIN batches b ON b.driver_mc_number = p.driver_mc_number
+        WHERE prl.id = p.id
+        RETURNING prl.invoice_batch_id
+    ),
+    counts AS (
+        SELECT invoice_batch_id, COUNT(*) AS row_count FROM assigned GROUP BY invoice_batch_id
+    )
+    SELECT b.id, b.driver_mc_number, b.total_amount_usd, COALESCE(c.row_count, 0) AS row_count
+    FROM batches b
+    LEFT JOIN counts c ON c.invoice_batch_id = b.id
+    ORDER BY b.driver_mc_number
+""")
+
 
 def create_weekly_invoice_batches(
     engine: Engine,
     *,
     period_days: int = 7,
+    chunk_size: int | None = None,
+    dry_run: bool = False,
 ) -> List[Dict[str, Any]]:
     """
     Find drivers on WEEKLY_INVOICE with uninvoiced DISPATCH_FEE rows;
     create one batch per driver and assign ledger rows to it.
-    Returns list of created batches: [{ batch_id, driver_mc_number, total_amount_usd }, ...].
+    Returns list of created batches: [{ batch_id, driver_mc_number, total_amount_usd, row_count }, ...].
+    - chunk_size: drivers per transaction (default WEEKLY_INVOICE_CHUNK_SIZE); a failed chunk
+      rolls back only itself, and already-billed chunks are skipped on re-run.
+    - dry_run: write nothing; return the batches that would be created (batch_id None).
     """
     if not engine:
         return []
     period_end = datetime.now(timezone.utc)
     period_start = period_end - timedelta(days=period_days)
+    size = max(1, chunk_size or INVOICE_CHUNK_SIZE)
     created: List[Dict[str, Any]] = []
 
-    try:
+    with engine.connect() as conn:
+        mcs = [r[0] for r in conn.execute(_CANDIDATE_MCS_SQL)]
+
+    for i in range(0, len(mcs), size):
+        chunk = mcs[i:i + size]
+        if dry_run:
+            with engine.connect() as conn:
+                rows = conn.execute(_PREVIEW_SQL, {"mcs": chunk}).mappings().all()
+            created.extend(
+                {
+                    "batch_id": None,
+                    "driver_mc_number": r["driver_mc_number"],
+                    "total_amount_usd": float(r["total"]),
+                    "row_count": int(r["row_count"]),
+                }
+                for r in rows
+            )
+            continue
+
         with engine.begin() as conn:
-            # Only drivers with billing_method = WEEKLY_INVOICE and uninvoiced DISPATCH_FEE
             rows = conn.execute(
-                text("""
-                    SELECT prl.driver_mc_number,
-                           SUM(prl.gross_amount_usd) AS total
-                    FROM webwise.platform_revenue_ledger prl
-                    JOIN webwise.trucker_profiles tp ON tp.mc_number = prl.driver_mc_number
-                    WHERE prl.invoice_batch_id IS NULL
-                      AND prl.source_type = 'DISPATCH_FEE'
-                      AND tp.billing_method = 'WEEKLY_INVOICE'
-                    GROUP BY prl.driver_mc_number
-                    HAVING SUM(prl.gross_amount_usd) > 0
-                """),
+                _BILL_CHUNK_SQL,
+                {"mcs": chunk, "period_start": period_start, "period_end": period_end},
             ).mappings().all()
-
-            for row in rows:
-                mc = row["driver_mc_number"]
-                total = row["total"]
-                if not mc or (total or 0) <= 0:
-                    continue
-
-                batch_row = conn.execute(
-                    text("""
-                        INSERT INTO webwise.driver_invoice_batches
-                        (driver_mc_number, period_start, period_end, total_amount_usd, status)
-                        VALUES (:mc, :period_start, :period_end, :total, 'CREATED')
-                        RETURNING id, driver_mc_number, total_amount_usd
-                    """),
-                    {
-                        "mc": mc,
-                        "period_start": period_start,
-                        "period_end": period_end,
-                        "total": total,
-                    },
-                ).mappings().one()
-
-                batch_id = batch_row["id"]
-                conn.execute(
-                    text("""
-                        UPDATE webwise.platform_revenue_ledger
-                        SET invoice_batch_id = :batch_id,
-                            invoiced_at = NOW()
-                        WHERE driver_mc_number = :mc
-                          AND invoice_batch_id IS NULL
-                          AND source_type = 'DISPATCH_FEE'
-                    """),
-                    {"batch_id": batch_id, "mc": mc},
-                )
-
-                created.append({
-                    "batch_id": str(batch_id),
-                    "driver_mc_number": mc,
-                    "total_amount_usd": float(total),
-                })
-    except Exception:
-        raise
+        created.extend(
+            {
+                "batch_id": str(r["id"]),
+                "driver_mc_number": r["driver_mc_number"],
+                "total_amount_usd": float(r["total_amount_usd"]),
+                "row_count": int(r["row_count"]),
+            }
+            for r in rows
+        )
 
     return created
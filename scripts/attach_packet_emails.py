@@ -4,14 +4,26 @@ Attach emails from carrier packet text to webwise.brokers + webwise.broker_email
 Extracts MC/DOT and emails from a text file (e.g. from PDF extraction or forwarded email),
 inserts candidates into broker_emails, and promotes the best to brokers.primary_email if empty.
 
+Batch mode (a directory, a glob or several files): packets are parsed in a process pool,
+MC/DOT/website lookups are done once for the whole batch, candidates are inserted with
+execute_values, promote_best runs once per affected MC, and files whose content hash is in
+webwise.packet_ingest_log (sql/create_packet_ingest_log.sql) are skipped.
+
 Usage (from project root, DATABASE_URL in .env or env):
   python3 scripts/attach_packet_emails.py /path/to/packet_text.txt
   python3 scripts/attach_packet_emails.py /path/to/packet.txt --evidence "packet_123.pdf"
+  python3 scripts/attach_packet_emails.py /path/to/packets/ --workers 8 --report summary.json
+  python3 scripts/attach_packet_emails.py "/path/to/packets/**/*.txt"
 """
 import argparse
+import glob
+import hashlib
+import json
 import os
 import re
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 # Project root = parent of scripts/
@@ -28,6 +40,7 @@ def _load_dotenv():
 _load_dotenv()
 
 import psycopg2
+from psycopg2.extras import execute_values
 
 EMAIL_RE = re.compile(r"\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b")
 MC_RE = re.compile(r"\bMC[\s\-#:]*([0-9]{4,10})\b", re.IGNORECASE)
@@ -311,29 +324,304 @@ def promote_best(conn, mc: str) -> bool:
         return False
 
 
+def promote_best_many(conn, mcs: list[str]) -> list[str]:
+    """
+    Set-based promote_best for many MCs in one statement (same rule: fill an empty
+    primary_email, or replace it when the best candidate is PROMOTION_THRESHOLD higher).
+    Returns the MCs whose primary_email was updated.
+    """
+    if not mcs:
+        return []
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            WITH best AS (
+                SELECT DISTINCT ON (mc_number) mc_number, email, confidence
+                FROM webwise.broker_emails
+                WHERE mc_number = ANY(%s)
+                ORDER BY mc_number, confidence DESC, created_at DESC
+            )
+            UPDATE webwise.brokers b
+            SET primary_email = best.email, source = 'enriched', updated_at = now()
+            FROM best
+            WHERE b.mc_number = best.mc_number
+              AND (
+                  COALESCE(TRIM(b.primary_email), '') = ''
+                  OR best.confidence >= COALESCE((
+                      SELECT cur.confidence FROM webwise.broker_emails cur
+                      WHERE cur.mc_number = b.mc_number AND cur.email = TRIM(b.primary_email)
+                      LIMIT 1
+                  ), 0) + %s
+              )
+            RETURNING b.mc_number
+            """,
+            (list(mcs), PROMOTION_THRESHOLD),
+        )
+        return [r[0] for r in cur.fetchall()]
+
+
+# ---------------------------------------------------------------------------
+# Batch mode
+# ---------------------------------------------------------------------------
+
+GLOB_CHARS = ("*", "?", "[")
+# Packets in these states are not re-read on the next run (see packet_ingest_log).
+DONE_STATUSES = ("attached", "no_emails")
+
+
+def collect_packet_paths(inputs: list[str], pattern: str = "*.txt", recursive: bool = False) -> list[Path]:
+    """Expand files, directories (pattern inside, optionally recursive) and globs; sorted, unique."""
+    found: set[Path] = set()
+    for raw in inputs:
+        if any(c in raw for c in GLOB_CHARS):
+            found.update(Path(p) for p in glob.glob(raw, recursive=True))
+            continue
+        path = Path(raw)
+        if path.is_dir():
+            found.update(path.rglob(pattern) if recursive else path.glob(pattern))
+        else:
+            found.add(path)
+    return sorted(p for p in found if p.is_file())
+
+
+def parse_packet(path_str: str) -> dict:
+    """Worker: read one packet, hash it and extract MC/DOT/emails (no DB access)."""
+    try:
+        data = Path(path_str).read_bytes()
+    except OSError as e:
+        return {"path": path_str, "error": str(e)}
+    text = data.decode("utf-8", errors="ignore")
+    return {
+        "path": path_str,
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "mc": extract_mc(text),
+        "dot": extract_dot(text),
+        "emails": extract_emails_with_context(text),
+    }
+
+
+def _fetch_pairs(conn, sql: str, values: list[str]) -> dict:
+    if not values:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute(sql, (values,))
+        return {k: v for k, v in cur.fetchall()}
+
+
+def run_batch(
+    dsn: str,
+    paths: list[Path],
+    workers: int | None = None,
+    force: bool = False,
+    dry_run: bool = False,
+) -> dict:
+    """
+    Attach emails from many packet files in one transaction. Returns a summary report with
+    per-file status: attached | no_emails | no_mc | unknown_broker | skipped | duplicate | error.
+    """
+    started = time.monotonic()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parsed = list(pool.map(parse_packet, [str(p) for p in paths], chunksize=8))
+
+    files: list[dict] = []
+    by_hash: dict[str, dict] = {}
+    for item in parsed:
+        entry = {"path": item["path"], "mc": None, "emails": 0}
+        files.append(entry)
+        if "error" in item:
+            entry["status"] = "error"
+            entry["error"] = item["error"]
+            continue
+        if item["sha256"] in by_hash:
+            entry["status"] = "duplicate"
+            continue
+        by_hash[item["sha256"]] = item
+        item["entry"] = entry
+
+    with psycopg2.connect(dsn) as conn:
+        done: set[str] = set()
+        if not force and by_hash:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    SELECT content_sha256 FROM webwise.packet_ingest_log
+                    WHERE content_sha256 = ANY(%s) AND status = ANY(%s)
+                    """,
+                    (list(by_hash), list(DONE_STATUSES)),
+                )
+                done = {r[0] for r in cur.fetchall()}
+
+        todo = [item for h, item in by_hash.items() if h not in done]
+        for h in done:
+            by_hash[h]["entry"]["status"] = "skipped"
+
+        dots = sorted({item["dot"] for item in todo if not item["mc"] and item["dot"]})
+        mc_by_dot = _fetch_pairs(
+            conn,
+            """
+            SELECT DISTINCT ON (dot_number) dot_number, mc_number
+            FROM webwise.brokers WHERE dot_number = ANY(%s)
+            ORDER BY dot_number, mc_number
+            """,
+            dots,
+        )
+        for item in todo:
+            if not item["mc"] and item["dot"]:
+                item["mc"] = mc_by_dot.get(item["dot"])
+        mcs = sorted({item["mc"] for item in todo if item["mc"]})
+        website_by_mc = _fetch_pairs(
+            conn,
+            "SELECT mc_number, website FROM webwise.brokers WHERE mc_number = ANY(%s)",
+            mcs,
+        )
+
+        # (mc, email) -> (confidence, evidence); one row per key so a single INSERT never
+        # touches the same conflict target twice.
+        candidates: dict[tuple[str, str], tuple[float, str]] = {}
+        log_rows = []
+        for item in todo:
+            entry = item["entry"]
+            mc = item["mc"]
+            entry["mc"] = mc
+            if not item["emails"]:
+                entry["status"] = "no_emails"
+            elif not mc:
+                entry["status"] = "no_mc"
+            elif mc not in website_by_mc:
+                entry["status"] = "unknown_broker"
+            else:
+                entry["status"] = "attached"
+                entry["emails"] = len(item["emails"])
+                domain = _broker_domain_from_website(website_by_mc[mc])
+                evidence = Path(item["path"]).name
+                for email, nearby_text in item["emails"]:
+                    conf = score_email(email, "carrier_packet", nearby_text, domain)
+                    prev = candidates.get((mc, email))
+                    if prev is None or conf > prev[0]:
+                        candidates[(mc, email)] = (conf, prev[1] if prev else evidence)
+            log_rows.append((item["sha256"], Path(item["path"]).name, mc, entry["emails"], entry["status"]))
+
+        affected = sorted({mc for mc, _ in candidates})
+        promoted: list[str] = []
+        if not dry_run:
+            with conn.cursor() as cur:
+                if candidates:
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO webwise.broker_emails (mc_number, email, source, confidence, evidence)
+                        VALUES %s
+                        ON CONFLICT (mc_number, email) DO UPDATE SET
+                            confidence = GREATEST(webwise.broker_emails.confidence, EXCLUDED.confidence),
+                            evidence = COALESCE(webwise.broker_emails.evidence, EXCLUDED.evidence)
+                        """,
+                        [(mc, email, "carrier_packet", conf, ev) for (mc, email), (conf, ev) in candidates.items()],
+                        page_size=500,
+                    )
+                if log_rows:
+                    execute_values(
+                        cur,
+                        """
+                        INSERT INTO webwise.packet_ingest_log
+                            (content_sha256, filename, mc_number, email_count, status)
+                        VALUES %s
+                        ON CONFLICT (content_sha256) DO UPDATE SET
+                            filename = EXCLUDED.filename,
+                            mc_number = EXCLUDED.mc_number,
+                            email_count = EXCLUDED.email_count,
+                            status = EXCLUDED.status,
+                            processed_at = now()
+                        """,
+                        log_rows,
+                        page_size=500,
+                    )
+            promoted = promote_best_many(conn, affected)
+            conn.commit()
+        else:
+            conn.rollback()
+
+    counts: dict[str, int] = {}
+    for entry in files:
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return {
+        "files": len(files),
+        "by_status": counts,
+        "candidates": len(candidates),
+        "mcs_affected": len(affected),
+        "mcs_promoted": len(promoted),
+        "dry_run": dry_run,
+        "elapsed_s": round(time.monotonic() - started, 2),
+        "details": files,
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"Processed {report['files']} packet files in {report['elapsed_s']}s"
+          f"{' (dry run, nothing written)' if report['dry_run'] else ''}.")
+    for status, n in sorted(report["by_status"].items()):
+        print(f"  {status:<15} {n}")
+    print(f"  email candidates {report['candidates']} across {report['mcs_affected']} MCs; "
+          f"promoted primary_email for {report['mcs_promoted']}")
+    for entry in report["details"]:
+        if entry["status"] in ("no_mc", "unknown_broker", "error"):
+            extra = entry.get("error") or (f"MC {entry['mc']}" if entry["mc"] else "")
+            print(f"  ! {entry['status']}: {entry['path']} {extra}".rstrip())
+
+
 def main() -> None:
     ap = argparse.ArgumentParser(
         description="Attach emails from carrier packet text to broker_emails and promote best to brokers.primary_email"
     )
-    ap.add_argument("path", type=Path, help="Path to packet text file")
+    ap.add_argument("paths", nargs="+", help="Packet text file, or directories / globs for batch mode")
     ap.add_argument(
         "--evidence",
         type=str,
         default=None,
-        help="Evidence string (default: basename of path)",
+        help="Evidence string (default: basename of path; single-file mode only)",
     )
+    ap.add_argument("--batch", action="store_true", help="Use batch mode even for a single file")
+    ap.add_argument("--pattern", default="*.txt", help="File pattern inside directories (default *.txt)")
+    ap.add_argument("--recursive", action="store_true", help="Recurse into sub-directories")
+    ap.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    ap.add_argument("--force", action="store_true", help="Re-process files already in packet_ingest_log")
+    ap.add_argument("--dry-run", action="store_true", help="Parse and match but write nothing")
+    ap.add_argument("--report", type=Path, default=None, help="Write the batch summary as JSON to this path")
     args = ap.parse_args()
 
-    path = args.path
-    if not path.is_file():
-        print(f"File not found: {path}", file=sys.stderr)
-        sys.exit(1)
-
     dsn = os.getenv("DATABASE_URL")
     if not dsn:
         print("DATABASE_URL not set.", file=sys.stderr)
         sys.exit(1)
 
+    # --force / --dry-run / --report are implemented by run_batch only, so any of them selects
+    # batch mode (a single file is then a batch of one).
+    batch = (
+        args.batch
+        or args.force
+        or args.dry_run
+        or args.report is not None
+        or len(args.paths) > 1
+        or any(c in args.paths[0] for c in GLOB_CHARS)
+        or Path(args.paths[0]).is_dir()
+    )
+    if batch and args.evidence:
+        ap.error("--evidence applies to single-file mode only (not with --batch/--force/--dry-run/--report)")
+    if batch:
+        paths = collect_packet_paths(args.paths, args.pattern, args.recursive)
+        if not paths:
+            print("No packet files found.")
+            return
+        report = run_batch(dsn, paths, workers=args.workers, force=args.force, dry_run=args.dry_run)
+        print_report(report)
+        if args.report:
+            args.report.write_text(json.dumps(report, indent=2))
+        return
+
+    path = Path(args.paths[0])
+    if not path.is_file():
+        print(f"File not found: {path}", file=sys.stderr)
+        sys.exit(1)
+
     evidence = args.evidence or path.name
     text = path.read_text(encoding="utf-8", errors="ignore")
 
@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 """
 Load FMCSA Census CSV into webwise.brokers (Master Broker Directory).
-- Reads CSV, keeps rows where carship contains 'B' (brokers).
+- Streams the CSV row by row, keeps rows where carship contains 'B' (brokers).
 - Cleans: strip 'MC' prefix from docket1, lowercase emails, strip whitespace.
-- Upserts into webwise.brokers using mc_number as key.
+- COPYs cleaned rows into a TEMP staging table (private to this run's session, dropped at
+  commit, so concurrent runs can't see or truncate each other's rows), then merges into
+  webwise.brokers with one set-based upsert keyed on mc_number (last occurrence in the CSV wins).
+  Only rows whose content hash changed are rewritten (needs sql/migrate_brokers_content_hash.sql).
+Memory stays flat regardless of census size.
 
 Usage (from project root, with .env DATABASE_URL set):
   python scripts/load_fmcsa_brokers.py
@@ -11,10 +15,13 @@ Usage (from project root, with .env DATABASE_URL set):
 """
 import argparse
 import csv
+import io
 import os
 import re
 import sys
+import time
 from pathlib import Path
+from typing import Dict, Iterator, Optional
 
 # Project root = parent of scripts/
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -29,7 +36,7 @@ def load_dotenv():
 
 load_dotenv()
 
-from sqlalchemy import create_engine, text
+from app.core.db import make_engine
 
 DEFAULT_CSV = PROJECT_ROOT / "docs" / "az4n-8mr2.csv"
 
@@ -67,6 +74,152 @@ def _clean_str(raw: str, max_len: int | None = None) -> str | None:
     return s
 
 
+BROKER_COLUMNS = (
+    "mc_number", "dot_number", "company_name", "dba_name",
+    "primary_email", "primary_phone", "fax",
+    "phy_street", "phy_city", "phy_state", "phy_zip",
+)
+
+STAGING_DDL = """
+    CREATE TEMP TABLE brokers_fmcsa_staging (
+        seq           BIGINT NOT NULL,
+        mc_number     VARCHAR(20) NOT NULL,
+        dot_number    VARCHAR(20),
+        company_name  VARCHAR(255),
+        dba_name      VARCHAR(255),
+        primary_email VARCHAR(255),
+        primary_phone VARCHAR(50),
+        fax           VARCHAR(50),
+        phy_street    VARCHAR(255),
+        phy_city      VARCHAR(100),
+        phy_state     VARCHAR(50),
+        phy_zip       VARCHAR(20)
+    ) ON COMMIT DROP
+"""
+
+# One statement: dedupe staging (last CSV occurrence per MC), hash the content, insert new
+# MCs and rewrite only those whose hash changed. xmax = 0 identifies freshly inserted rows.
+MERGE_SQL = """
+    WITH src AS (
+        SELECT DISTINCT ON (mc_number)
+               mc_number, dot_number, company_name, dba_name,
+               primary_email, primary_phone, fax,
+               phy_street, phy_city, phy_state, phy_zip,
+               md5(concat_ws(chr(31), dot_number, company_name, dba_name,
+                             primary_email, primary_phone, fax,
+                             phy_street, phy_city, phy_state, phy_zip)) AS content_hash
+        FROM brokers_fmcsa_staging
+        ORDER BY mc_number, seq DESC
+    ),
+    merged AS (
+        INSERT INTO webwise.brokers AS b (
+            mc_number, dot_number, company_name, dba_name,
+            primary_email, primary_phone, fax,
+            phy_street, phy_city, phy_state, phy_zip,
+            content_hash, source, updated_at
+        )
+        SELECT mc_number, dot_number, company_name, dba_name,
+               primary_email, primary_phone, fax,
+               phy_street, phy_city, phy_state, phy_zip,
+               content_hash, 'FMCSA', CURRENT_TIMESTAMP
+        FROM src
+        ON CONFLICT (mc_number) DO UPDATE SET
+            dot_number = EXCLUDED.dot_number,
+            company_name = EXCLUDED.company_name,
+            dba_name = EXCLUDED.dba_name,
+            primary_email = EXCLUDED.primary_email,
+            primary_phone = EXCLUDED.primary_phone,
+            fax = EXCLUDED.fax,
+            phy_street = EXCLUDED.phy_street,
+            phy_city = EXCLUDED.phy_city,
+            phy_state = EXCLUDED.phy_state,
+            phy_zip = EXCLUDED.phy_zip,
+            content_hash = EXCLUDED.content_hash,
+            source = EXCLUDED.source,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE b.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        (SELECT COUNT(*) FROM src) AS total,
+        COUNT(*) FILTER (WHERE inserted) AS inserted,
+        COUNT(*) FILTER (WHERE NOT inserted) AS updated
+    FROM merged
+"""
+
+
+class _Stats:
+    def __init__(self):
+        self.rows_read = 0
+        self.brokers = 0
+        self.valid = 0
+
+
+def iter_broker_records(csv_path: Path, stats: _Stats) -> Iterator[Dict[str, Optional[str]]]:
+    """Yield cleaned broker records one at a time (never holds the file in memory)."""
+    with open(csv_path, newline="", encoding="utf-8", errors="replace") as f:
+        for row in csv.DictReader(f):
+            stats.rows_read += 1
+            carship = (row.get("carship") or "").strip().upper()
+            if "B" not in carship:
+                continue
+            stats.brokers += 1
+            mc = _clean_mc(row.get("docket1") or "")
+            if not mc:
+                continue
+            stats.valid += 1
+            yield {
+                "mc_number": mc,
+                "dot_number": _clean_str(row.get("dot_number"), 20),
+                "company_name": _clean_str(row.get("legal_name"), 255),
+                "dba_name": _clean_str(row.get("dba_name"), 255),
+                "primary_email": _clean_email(row.get("email_address")),
+                "primary_phone": _clean_str(row.get("phone"), 50),
+                "fax": _clean_str(row.get("fax"), 50),
+                "phy_street": _clean_str(row.get("phy_street"), 255),
+                "phy_city": _clean_str(row.get("phy_city"), 100),
+                "phy_state": _clean_str(row.get("phy_state"), 50),
+                "phy_zip": _clean_str(row.get("phy_zip"), 20),
+            }
+
+
+class _CopySource(io.RawIOBase):
+    """
+    File-like COPY source: renders records as CSV lazily as psycopg2 reads, so only one
+    buffer of rows is in memory at a time. NULL is the unquoted empty field.
+    """
+
+    def __init__(self, records: Iterator[Dict[str, Optional[str]]]):
+        self._records = enumerate(records)
+        self._buf = b""
+        self._text = io.StringIO()
+        self._writer = csv.writer(self._text, lineterminator="\n")
+
+    def readable(self) -> bool:
+        return True
+
+    def _fill(self, size: int) -> None:
+        while len(self._buf) < size:
+            chunk = 0
+            for seq, r in self._records:
+                # None -> unquoted empty field -> NULL (_clean_* never returns "")
+                self._writer.writerow([seq] + [r[c] for c in BROKER_COLUMNS])
+                chunk += 1
+                if chunk >= 1000:
+                    break
+            if not chunk:
+                return
+            self._buf += self._text.getvalue().encode("utf-8")
+            self._text.seek(0)
+            self._text.truncate(0)
+
+    def read(self, size: int = -1) -> bytes:
+        self._fill(size if size and size > 0 else 65536)
+        n = size if size and size > 0 else len(self._buf)
+        out, self._buf = self._buf[:n], self._buf[n:]
+        return out
+
+
 def main():
     ap = argparse.ArgumentParser(description="Load FMCSA broker CSV into webwise.brokers")
     ap.add_argument("--csv", type=Path, default=DEFAULT_CSV, help="Path to FMCSA Census CSV")
@@ -83,88 +236,51 @@ def main():
         print("DATABASE_URL not set. Set it in .env or use --dry-run.", file=sys.stderr)
         sys.exit(1)
 
-    # Read CSV and filter brokers (carship contains 'B')
-    rows_read = 0
-    broker_rows = []
-    with open(csv_path, newline="", encoding="utf-8", errors="replace") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            rows_read += 1
-            carship = (row.get("carship") or "").strip().upper()
-            if "B" not in carship:
-                continue
-            broker_rows.append(row)
-
-    # Build records with cleaned MC (required), email, phone, etc.
-    records = []
-    for row in broker_rows:
-        raw_docket = row.get("docket1") or ""
-        mc = _clean_mc(raw_docket)
-        if not mc:
-            continue
-        records.append({
-            "mc_number": mc,
-            "dot_number": _clean_str(row.get("dot_number"), 20),
-            "company_name": _clean_str(row.get("legal_name"), 255),
-            "dba_name": _clean_str(row.get("dba_name"), 255),
-            "primary_email": _clean_email(row.get("email_address")),
-            "primary_phone": _clean_str(row.get("phone"), 50),
-            "fax": _clean_str(row.get("fax"), 50),
-            "phy_street": _clean_str(row.get("phy_street"), 255),
-            "phy_city": _clean_str(row.get("phy_city"), 100),
-            "phy_state": _clean_str(row.get("phy_state"), 50),
-            "phy_zip": _clean_str(row.get("phy_zip"), 20),
-        })
-
-    # Dedupe by mc_number (keep last occurrence)
-    by_mc = {r["mc_number"]: r for r in records}
-    records = list(by_mc.values())
-
-    print(f"Rows read: {rows_read}")
-    print(f"Brokers (carship contains 'B'): {len(broker_rows)}")
-    print(f"With valid MC (after clean): {len(records)}")
-
-    # Sample validation output
-    for r in list(records)[:5]:
-        print(f"  MC {r['mc_number']} | {r['company_name'] or '(no name)'} | {r['primary_email'] or '(no email)'}")
+    stats = _Stats()
+    start = time.time()
 
     if args.dry_run:
+        for r in iter_broker_records(csv_path, stats):
+            if stats.valid <= 5:
+                print(f"  MC {r['mc_number']} | {r['company_name'] or '(no name)'} | {r['primary_email'] or '(no email)'}")
+        elapsed = time.time() - start
+        print(f"Rows read: {stats.rows_read} ({stats.rows_read / max(elapsed, 1e-6):,.0f} rows/s)")
+        print(f"Brokers (carship contains 'B'): {stats.brokers}")
+        print(f"With valid MC (after clean): {stats.valid}")
         print("--dry-run: skipping database write.")
         return
 
-    engine = create_engine(database_url, future=True)
-    upsert_sql = text("""
-        INSERT INTO webwise.brokers (
-            mc_number, dot_number, company_name, dba_name,
-            primary_email, primary_phone, fax,
-            phy_street, phy_city, phy_state, phy_zip,
-            source, updated_at
-        ) VALUES (
-            :mc_number, :dot_number, :company_name, :dba_name,
-            :primary_email, :primary_phone, :fax,
-            :phy_street, :phy_city, :phy_state, :phy_zip,
-            'FMCSA', CURRENT_TIMESTAMP
+    engine = make_engine(database_url, name="load_fmcsa_brokers", pool_size=1, max_overflow=0)
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        cur.execute(STAGING_DDL)
+        cur.copy_expert(
+            "COPY brokers_fmcsa_staging (seq, " + ", ".join(BROKER_COLUMNS) + ") "
+            "FROM STDIN WITH (FORMAT csv)",
+            _CopySource(iter_broker_records(csv_path, stats)),
         )
-        ON CONFLICT (mc_number) DO UPDATE SET
-            dot_number = EXCLUDED.dot_number,
-            company_name = EXCLUDED.company_name,
-            dba_name = EXCLUDED.dba_name,
-            primary_email = EXCLUDED.primary_email,
-            primary_phone = EXCLUDED.primary_phone,
-            fax = EXCLUDED.fax,
-            phy_street = EXCLUDED.phy_street,
-            phy_city = EXCLUDED.phy_city,
-            phy_state = EXCLUDED.phy_state,
-            phy_zip = EXCLUDED.phy_zip,
-            source = EXCLUDED.source,
-            updated_at = CURRENT_TIMESTAMP
-    """)
+        copied_at = time.time()
+        print(f"Rows read: {stats.rows_read} ({stats.rows_read / max(copied_at - start, 1e-6):,.0f} rows/s)")
+        print(f"Brokers (carship contains 'B'): {stats.brokers}")
+        print(f"With valid MC (after clean): {stats.valid} staged via COPY")
 
-    with engine.begin() as conn:
-        for r in records:
-            conn.execute(upsert_sql, r)
+        cur.execute("ANALYZE brokers_fmcsa_staging")
+        cur.execute(MERGE_SQL)
+        total, inserted, updated = cur.fetchone()
+        raw.commit()
+        cur.close()
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
 
-    print(f"Upserted {len(records)} brokers into webwise.brokers.")
+    merged_at = time.time()
+    unchanged = (total or 0) - (inserted or 0) - (updated or 0)
+    print(f"Merged {total} unique MCs in {merged_at - copied_at:.1f}s: "
+          f"{inserted} inserted, {updated} updated, {unchanged} unchanged")
+    print(f"Total {merged_at - start:.1f}s ({stats.valid / max(merged_at - start, 1e-6):,.0f} brokers/s)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,46 @@
+-- Indexes behind app/services/broker_search.py (admin typeahead, domain / DOT → MC lookups).
+--   pg_trgm GIN on lower(company_name) / lower(dba_name): similarity (%) and ILIKE '%q%'
+--   text_pattern_ops btree: 1–2 character name prefixes and MC/DOT prefixes
+--   email/website domain expression indexes: "which broker owns @acmelogistics.com"
+-- webwise.url_domain() must stay in sync with normalize_domain() in broker_search.py.
+-- Run: psql "$DATABASE_URL" -f sql/create_broker_search_indexes.sql
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 'https://www.Acme.com/contact' -> 'acme.com'
+CREATE OR REPLACE FUNCTION webwise.url_domain(p_url TEXT)
+RETURNS TEXT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT NULLIF(
+        split_part(regexp_replace(lower(btrim(p_url)), '^([a-z][a-z0-9+.-]*://)?(www\.)?', ''), '/', 1),
+        ''
+    )
+$$;
+
+CREATE INDEX IF NOT EXISTS ix_brokers_company_name_trgm
+    ON webwise.brokers USING gin (lower(company_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_brokers_dba_name_trgm
+    ON webwise.brokers USING gin (lower(dba_name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS ix_brokers_company_name_prefix
+    ON webwise.brokers (lower(company_name) text_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS ix_brokers_mc_prefix
+    ON webwise.brokers (mc_number varchar_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_brokers_dot_number
+    ON webwise.brokers (dot_number varchar_pattern_ops);
+
+CREATE INDEX IF NOT EXISTS ix_brokers_website_domain
+    ON webwise.brokers (webwise.url_domain(website))
+    WHERE website IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_brokers_primary_email_domain
+    ON webwise.brokers (lower(split_part(primary_email, '@', 2)))
+    WHERE primary_email IS NOT NULL;
+CREATE INDEX IF NOT EXISTS ix_broker_emails_domain
+    ON webwise.broker_emails (lower(split_part(email, '@', 2)));
+
+COMMIT;
+
+ANALYZE webwise.brokers;
+ANALYZE webwise.broker_emails;
@@ -0,0 +1,21 @@
+-- Conversation history for the public chat widget when CHAT_CONVERSATION_STORE=postgres
+-- (app/core/conversation_store.py). Shared by all uvicorn workers; messages holds only the
+-- stored user/assistant turns (capped at CHAT_HISTORY_MAX_MESSAGES). Rows idle longer than
+-- CHAT_CONVERSATION_TTL_SECONDS are ignored and pruned by the store.
+-- Run: psql "$DATABASE_URL" -f sql/create_chat_conversations.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS webwise.chat_conversations (
+    conversation_id VARCHAR(64) PRIMARY KEY,
+    messages        JSONB NOT NULL DEFAULT '[]'::jsonb,
+    message_count   INTEGER NOT NULL DEFAULT 0,
+    created_at      TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- TTL filter on reads/stats and the prune DELETE.
+CREATE INDEX IF NOT EXISTS ix_chat_conversations_updated_at
+    ON webwise.chat_conversations (updated_at);
+
+COMMIT;
@@ -0,0 +1,130 @@
+-- Maintained Automation Fuel balance per trucker (see app/services/ledger.py).
+-- Balance = SUM(amount_candle) of CREDITED/CONSUMED rows in driver_savings_ledger for the
+-- trucker's MC. A trigger on the ledger applies each insert/update/delete as a delta in the
+-- same transaction, so every writer (settlement, usage, starter packs, admin credits, claims)
+-- keeps it current without code changes, and balance reads are a primary-key lookup.
+-- A trigger on trucker_profiles re-bases a trucker's row when their MC changes.
+-- Drift check / repair: python -m app.jobs.reconcile_driver_balances [--fix]
+-- Run: psql "$DATABASE_URL" -f sql/create_driver_balances.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS webwise.driver_balances (
+    trucker_id      INTEGER PRIMARY KEY REFERENCES webwise.trucker_profiles(id) ON DELETE CASCADE,
+    mc_number       VARCHAR(20) NOT NULL,
+    balance_candle  NUMERIC(18, 4) NOT NULL DEFAULT 0,
+    updated_at      TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_driver_balances_mc ON webwise.driver_balances (mc_number);
+
+-- Apply a balance delta for every trucker whose current MC (trucker_profiles) is p_mc. Rows are
+-- addressed by trucker_id, so a stale driver_balances.mc_number never misdirects a delta. Creates
+-- the row (seeded from the full ledger sum, which already includes the triggering row) the first
+-- time a trucker is seen.
+CREATE OR REPLACE FUNCTION webwise.apply_driver_balance_delta(p_mc VARCHAR, p_delta NUMERIC)
+RETURNS void AS $$
+BEGIN
+    IF p_mc IS NULL OR p_delta IS NULL OR p_delta = 0 THEN
+        RETURN;
+    END IF;
+
+    UPDATE webwise.driver_balances b
+    SET balance_candle = b.balance_candle + p_delta, mc_number = tp.mc_number, updated_at = now()
+    FROM webwise.trucker_profiles tp
+    WHERE tp.mc_number = p_mc AND b.trucker_id = tp.id;
+
+    INSERT INTO webwise.driver_balances (trucker_id, mc_number, balance_candle, updated_at)
+    SELECT tp.id, tp.mc_number,
+           (SELECT COALESCE(SUM(amount_candle), 0)
+            FROM webwise.driver_savings_ledger
+            WHERE driver_mc_number = p_mc AND status IN ('CREDITED', 'CONSUMED')),
+           now()
+    FROM webwise.trucker_profiles tp
+    WHERE tp.mc_number = p_mc
+      AND NOT EXISTS (SELECT 1 FROM webwise.driver_balances b WHERE b.trucker_id = tp.id)
+    -- Row created concurrently by a transaction that could not see this ledger row: add the delta
+    ON CONFLICT (trucker_id) DO UPDATE
+        SET balance_candle = webwise.driver_balances.balance_candle + p_delta,
+            mc_number = EXCLUDED.mc_number,
+            updated_at = now();
+END;
+$$ LANGUAGE plpgsql;
+
+-- A trucker's MC changed (profile edit / onboarding): their balance is now the ledger sum of the
+-- new MC. Ledger writes racing the MC change are caught by the reconcile job.
+CREATE OR REPLACE FUNCTION webwise.trucker_profiles_mc_balance_trg()
+RETURNS trigger AS $$
+BEGIN
+    IF NEW.mc_number IS NULL OR NEW.mc_number = '' THEN
+        DELETE FROM webwise.driver_balances WHERE trucker_id = NEW.id;
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO webwise.driver_balances (trucker_id, mc_number, balance_candle, updated_at)
+    SELECT NEW.id, NEW.mc_number, COALESCE(SUM(amount_candle), 0), now()
+    FROM webwise.driver_savings_ledger
+    WHERE driver_mc_number = NEW.mc_number AND status IN ('CREDITED', 'CONSUMED')
+    ON CONFLICT (trucker_id) DO UPDATE
+        SET mc_number = EXCLUDED.mc_number,
+            balance_candle = EXCLUDED.balance_candle,
+            updated_at = now();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_trucker_profiles_mc_balance ON webwise.trucker_profiles;
+CREATE TRIGGER trg_trucker_profiles_mc_balance
+    AFTER UPDATE OF mc_number ON webwise.trucker_profiles
+    FOR EACH ROW
+    WHEN (OLD.mc_number IS DISTINCT FROM NEW.mc_number)
+    EXECUTE FUNCTION webwise.trucker_profiles_mc_balance_trg();
+
+CREATE OR REPLACE FUNCTION webwise.driver_savings_ledger_balance_trg()
+RETURNS trigger AS $$
+DECLARE
+    old_amt NUMERIC := 0;
+    new_amt NUMERIC := 0;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status IN ('CREDITED', 'CONSUMED') THEN
+        old_amt := OLD.amount_candle;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status IN ('CREDITED', 'CONSUMED') THEN
+        new_amt := NEW.amount_candle;
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND OLD.driver_mc_number IS DISTINCT FROM NEW.driver_mc_number THEN
+        PERFORM webwise.apply_driver_balance_delta(OLD.driver_mc_number, -old_amt);
+        PERFORM webwise.apply_driver_balance_delta(NEW.driver_mc_number, new_amt);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM webwise.apply_driver_balance_delta(OLD.driver_mc_number, -old_amt);
+    ELSE
+        PERFORM webwise.apply_driver_balance_delta(NEW.driver_mc_number, new_amt - old_amt);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_driver_savings_ledger_balance ON webwise.driver_savings_ledger;
+CREATE TRIGGER trg_driver_savings_ledger_balance
+    AFTER INSERT OR UPDATE OF amount_candle, status, driver_mc_number OR DELETE
+    ON webwise.driver_savings_ledger
+    FOR EACH ROW EXECUTE FUNCTION webwise.driver_savings_ledger_balance_trg();
+
+-- Seed from existing history (idempotent: recomputes every trucker that has an MC).
+INSERT INTO webwise.driver_balances (trucker_id, mc_number, balance_candle, updated_at)
+SELECT tp.id, tp.mc_number, COALESCE(l.balance, 0), now()
+FROM webwise.trucker_profiles tp
+LEFT JOIN (
+    SELECT driver_mc_number, SUM(amount_candle) AS balance
+    FROM webwise.driver_savings_ledger
+    WHERE status IN ('CREDITED', 'CONSUMED')
+    GROUP BY driver_mc_number
+) l ON l.driver_mc_number = tp.mc_number
+WHERE tp.mc_number IS NOT NULL AND tp.mc_number <> ''
+ON CONFLICT (trucker_id) DO UPDATE
+    SET mc_number = EXCLUDED.mc_number,
+        balance_candle = EXCLUDED.balance_candle,
+        updated_at = now();
+
+COMMIT;
@@ -0,0 +1,14 @@
+-- Messages inbound_listener.py gave up on after IMAP_MESSAGE_MAX_ATTEMPTS failed syncs
+-- (e.g. a body Postgres rejects). The sync moves past them; inspect / replay from here.
+-- Run: psql "$DATABASE_URL" -f sql/create_imap_dead_letters.sql
+
+CREATE TABLE IF NOT EXISTS webwise.imap_dead_letters (
+    mailbox TEXT NOT NULL,
+    uidvalidity BIGINT NOT NULL,
+    uid BIGINT NOT NULL,
+    raw_message TEXT NOT NULL,
+    error TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (mailbox, uidvalidity, uid)
+);
@@ -0,0 +1,10 @@
+-- Incremental IMAP sync state for inbound_listener.py (one row per mailbox).
+-- last_uid is only meaningful for the stored uidvalidity; a change triggers a full resync.
+-- Run: psql "$DATABASE_URL" -f sql/create_imap_sync_state.sql
+
+CREATE TABLE IF NOT EXISTS webwise.imap_sync_state (
+    mailbox TEXT PRIMARY KEY,
+    uidvalidity BIGINT NOT NULL,
+    last_uid BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
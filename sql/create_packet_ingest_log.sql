@@ -0,0 +1,20 @@
+-- One row per carrier-packet text ingested by scripts/attach_packet_emails.py batch mode,
+-- keyed by the sha256 of the file content. Re-running over the same directory skips files
+-- already attached (or with no emails); packets that could not be matched to a broker
+-- (no_mc / unknown_broker) are retried on the next run.
+-- Run: psql "$DATABASE_URL" -f sql/create_packet_ingest_log.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS webwise.packet_ingest_log (
+    content_sha256  CHAR(64) PRIMARY KEY,
+    filename        TEXT NOT NULL,
+    mc_number       VARCHAR(20) NULL,
+    email_count     INTEGER NOT NULL DEFAULT 0,
+    status          VARCHAR(20) NOT NULL,   -- attached | no_emails | no_mc | unknown_broker
+    processed_at    TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_packet_ingest_log_mc ON webwise.packet_ingest_log (mc_number);
+
+COMMIT;
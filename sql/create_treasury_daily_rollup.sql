@@ -0,0 +1,37 @@
+-- Daily treasury rollup: totals per (UTC day of created_at, source_type, status) for
+-- platform_revenue_ledger, maintained by app/services/burn.py (record_revenue,
+-- reserve_burn_for_batch, execute_batch) in the same transaction as the ledger write.
+-- get_treasury_stats / get_treasury_history read this instead of scanning the ledger.
+-- Re-running this file rebuilds the rollup from the ledger (safe; done in one transaction).
+-- Run: psql "$DATABASE_URL" -f sql/create_treasury_daily_rollup.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS webwise.treasury_daily_rollup (
+    day                DATE NOT NULL,
+    source_type        VARCHAR(50) NOT NULL,
+    status             VARCHAR(50) NOT NULL,
+    entry_count        BIGINT NOT NULL DEFAULT 0,
+    gross_usd          NUMERIC(16,2) NOT NULL DEFAULT 0,
+    burn_reserved_usd  NUMERIC(16,2) NOT NULL DEFAULT 0,
+    updated_at         TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (day, source_type, status)
+);
+
+-- Block ledger writers while rebuilding so no delta is lost
+LOCK TABLE webwise.platform_revenue_ledger IN SHARE MODE;
+
+DELETE FROM webwise.treasury_daily_rollup;
+
+INSERT INTO webwise.treasury_daily_rollup
+    (day, source_type, status, entry_count, gross_usd, burn_reserved_usd)
+SELECT (created_at AT TIME ZONE 'UTC')::date, source_type, status,
+       COUNT(*), SUM(gross_amount_usd), SUM(burn_reserved_usd)
+FROM webwise.platform_revenue_ledger
+GROUP BY 1, 2, 3;
+
+-- Latest burned batch lookup
+CREATE INDEX IF NOT EXISTS ix_burn_batches_status_executed_at
+ON webwise.burn_batches (status, executed_at DESC NULLS LAST, created_at DESC);
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- Content hash for the FMCSA broker merge (scripts/load_fmcsa_brokers.py): the loader only
+-- rewrites brokers whose md5 of the FMCSA fields changed. Existing rows have NULL and are
+-- rewritten once on the next load.
+-- Run: psql "$DATABASE_URL" -f sql/migrate_brokers_content_hash.sql
+
+BEGIN;
+
+ALTER TABLE webwise.brokers
+  ADD COLUMN IF NOT EXISTS content_hash CHAR(32) NULL;
+
+COMMIT;
@@ -0,0 +1,20 @@
+-- Idempotent, conditional fuel debits (see debit_fuel in app/services/ledger.py).
+-- CONSUMED rows carry idempotency_key = trucker:load:action[:event]; the partial unique index
+-- makes a replayed debit (autopilot + manual, retries, double-clicks) a no-op.
+-- Run after sql/create_driver_balances.sql:
+--   psql "$DATABASE_URL" -f sql/migrate_ledger_idempotency.sql
+
+BEGIN;
+
+ALTER TABLE webwise.driver_savings_ledger
+  ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(160) NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_driver_savings_ledger_idempotency_key
+  ON webwise.driver_savings_ledger (idempotency_key)
+  WHERE idempotency_key IS NOT NULL;
+
+-- Legacy success-fee guard looks up un-keyed CONSUMED rows by (mc, load)
+CREATE INDEX IF NOT EXISTS ix_driver_savings_ledger_mc_load
+  ON webwise.driver_savings_ledger (driver_mc_number, load_id);
+
+COMMIT;
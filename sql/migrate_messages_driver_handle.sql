@@ -0,0 +1,27 @@
+-- Precomputed driver handle + parsed offer on webwise.messages.
+-- The dashboard active-loads poll filters on the driver handle (local part of recipient_tagged
+-- before '+'), which as an expression no plain index can serve. Store it at insert time
+-- (inbound_listener.save_to_db) and index it; the expression index keeps legacy queries fast too.
+-- Run: psql "$DATABASE_URL" -f sql/migrate_messages_driver_handle.sql
+
+BEGIN;
+
+ALTER TABLE webwise.messages
+  ADD COLUMN IF NOT EXISTS driver_handle TEXT NULL,
+  ADD COLUMN IF NOT EXISTS extracted_offer NUMERIC(12,2) NULL,
+  ADD COLUMN IF NOT EXISTS broker_ready BOOLEAN NULL;
+
+-- Backfill handle for existing rows (same expression the queries used)
+UPDATE webwise.messages
+SET driver_handle = LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1))
+WHERE driver_handle IS NULL AND recipient_tagged IS NOT NULL;
+
+-- Poll: WHERE driver_handle = :dn AND load_id = ANY(:load_ids) ORDER BY received/created DESC
+CREATE INDEX IF NOT EXISTS ix_messages_driver_handle_load
+  ON webwise.messages (driver_handle, load_id, (COALESCE(received_at, created_at)) DESC);
+
+-- Matches the LOWER(SPLIT_PART(...)) filter still used by terminal / counter queries
+CREATE INDEX IF NOT EXISTS ix_messages_recipient_handle_expr
+  ON webwise.messages ((LOWER(SPLIT_PART(SPLIT_PART(recipient_tagged, '@', 1), '+', 1))), load_id);
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- Parse-once columns on webwise.messages (see app/services/message_store.py).
+-- Rows are parsed at insert; rows with a NULL/older parser_version are reprocessed by:
+--   python -m app.scripts.backfill_message_parse
+-- Run after sql/migrate_messages_driver_handle.sql:
+--   psql "$DATABASE_URL" -f sql/migrate_messages_parse_once.sql
+
+BEGIN;
+
+ALTER TABLE webwise.messages
+  ADD COLUMN IF NOT EXISTS is_rate_con BOOLEAN NULL,
+  ADD COLUMN IF NOT EXISTS parser_version SMALLINT NULL;
+
+-- Backfill scans for stale rows by id
+CREATE INDEX IF NOT EXISTS ix_messages_parser_version
+  ON webwise.messages (parser_version, id);
+
+COMMIT;
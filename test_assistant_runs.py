@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Offline tests for app/core/assistant_runs.py with a fake AsyncOpenAI client: reply assembled
+from streamed deltas, thread reuse, failed runs, timeout -> server-side cancel, and the
+per-worker ASSISTANT_MAX_CONCURRENT cap.
+Run: python -m pytest -q test_assistant_runs.py
+"""
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+pytest.importorskip("openai")
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+
+from app.core import assistant_runs
+
+
+def _event(name, **data):
+    return SimpleNamespace(event=name, data=SimpleNamespace(**data))
+
+
+def _delta(text):
+    block = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return _event("thread.message.delta", delta=SimpleNamespace(content=[block]))
+
+
+class _Stream:
+    def __init__(self, client, events, delay):
+        self.client, self.events, self.delay = client, events, delay
+
+    async def __aenter__(self):
+        self.client.active += 1
+        self.client.max_active = max(self.client.max_active, self.client.active)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.client.active -= 1
+
+    async def __aiter__(self):
+        for event in self.events:
+            await asyncio.sleep(self.delay)
+            yield event
+
+
+class FakeAsyncOpenAI:
+    """Just the beta.threads surface arun_assistant_message uses."""
+
+    def __init__(self, events=None, delay=0.0):
+        self.events = events if events is not None else [
+            _event("thread.run.created", id="run_1"),
+            _delta("Hello"),
+            _delta(" driver"),
+            _event("thread.run.completed", id="run_1"),
+        ]
+        self.delay = delay
+        self.threads_created = 0
+        self.messages = []
+        self.cancelled = []
+        self.active = 0
+        self.max_active = 0
+        self.beta = SimpleNamespace(threads=SimpleNamespace(
+            create=self._create_thread,
+            messages=SimpleNamespace(create=self._create_message),
+            runs=SimpleNamespace(stream=self._stream, cancel=self._cancel),
+        ))
+
+    async def _create_thread(self):
+        self.threads_created += 1
+        return SimpleNamespace(id=f"thread_{self.threads_created}")
+
+    async def _create_message(self, thread_id, role, content):
+        self.messages.append((thread_id, role, content))
+
+    def _stream(self, thread_id, assistant_id):
+        return _Stream(self, self.events, self.delay)
+
+    async def _cancel(self, run_id, thread_id):
+        self.cancelled.append((run_id, thread_id))
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    fake = FakeAsyncOpenAI()
+    monkeypatch.setattr(assistant_runs, "async_openai_client", fake)
+    monkeypatch.setattr(assistant_runs, "ASSISTANT_ID", "asst_test")
+    monkeypatch.setattr(assistant_runs, "_run_slots", None)  # bind to this test's event loop
+    return fake
+
+
+def _run(message, thread_id=None):
+    return asyncio.run(assistant_runs.arun_assistant_message(message, thread_id))
+
+
+def test_reply_is_assembled_from_deltas(client):
+    assert _run("  how do you get paid?  ") == {"reply": "Hello driver", "thread_id": "thread_1"}
+    assert client.messages == [("thread_1", "user", "how do you get paid?")]
+
+
+def test_existing_thread_is_reused(client):
+    assert _run("hi", "thread_abc")["thread_id"] == "thread_abc"
+    assert client.threads_created == 0
+
+
+def test_empty_reply_falls_back(client):
+    client.events = [_event("thread.run.created", id="run_1"), _event("thread.run.completed", id="run_1")]
+    assert _run("hi")["reply"] == assistant_runs.NO_REPLY
+
+
+def test_failed_run_raises_500(client):
+    client.events = [_event("thread.run.created", id="run_1"), _event("thread.run.failed", id="run_1")]
+    with pytest.raises(HTTPException) as exc:
+        _run("hi")
+    assert exc.value.status_code == 500
+
+
+def test_timeout_cancels_the_run(client, monkeypatch):
+    monkeypatch.setattr(assistant_runs, "ASSISTANT_RUN_TIMEOUT_SECONDS", 0.1)
+    client.delay = 0.05  # run.created arrives, the reply never does in time
+    client.events = [_event("thread.run.created", id="run_slow")] + [_delta("x")] * 20
+    with pytest.raises(HTTPException) as exc:
+        _run("hi")
+    assert exc.value.status_code == 504
+    assert client.cancelled == [("run_slow", "thread_1")]
+
+
+def test_concurrent_runs_are_capped(client, monkeypatch):
+    monkeypatch.setattr(assistant_runs, "ASSISTANT_MAX_CONCURRENT", 2)
+    client.delay = 0.01
+
+    async def many():
+        return await asyncio.gather(*(assistant_runs.arun_assistant_message(f"q{i}") for i in range(6)))
+
+    results = asyncio.run(many())
+    assert [r["reply"] for r in results] == ["Hello driver"] * 6
+    assert client.max_active == 2
+
+
+@pytest.mark.parametrize("message,code", [("", 400), ("   ", 400), ("x" * 1001, 400)])
+def test_invalid_message_is_rejected(client, message, code):
+    with pytest.raises(HTTPException) as exc:
+        _run(message)
+    assert exc.value.status_code == code
+    assert client.messages == []
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Rounding test for burn reservations (app/services/burn.py): the integer half-to-even
+arithmetic in _RESERVE_BURN_SQL must give the same cents as the Decimal reference
+burn_amount_usd(). Uses hypothesis when installed, plus a fixed set of seeded random and
+half-cent tie cases. With DATABASE_URL set the same expression is also evaluated by Postgres.
+Run: python -m pytest -q test_burn_rounding.py
+"""
+import os
+import random
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+pytest.importorskip("sqlalchemy")
+
+from app.services.burn import burn_amount_usd
+
+try:
+    from hypothesis import given, strategies as st
+except ImportError:
+    given = None
+
+MAX_CENTS = 10**12 - 1  # gross_amount_usd is NUMERIC(12, 2)
+MAX_BPS = 10_000
+
+# Same arithmetic as the SET burn_reserved_usd expression in _RESERVE_BURN_SQL (n >= 0).
+_SQL_EXPR = """
+    (n / 10000
+     + CASE
+         WHEN n % 10000 > 5000 THEN 1
+         WHEN n % 10000 = 5000 AND (n / 10000) % 2 = 1 THEN 1
+         ELSE 0
+       END)::numeric / 100
+"""
+
+
+def sql_burn_amount_usd(cents: int, bps: int) -> Decimal:
+    """Python transcription of _RESERVE_BURN_SQL's integer rounding."""
+    n = cents * bps
+    whole, rem = divmod(n, 10_000)
+    if rem > 5000 or (rem == 5000 and whole % 2 == 1):
+        whole += 1
+    return Decimal(whole) / Decimal(100)
+
+
+def _gross(cents: int) -> Decimal:
+    return Decimal(cents) / Decimal(100)
+
+
+def _cases(count: int = 5000, seed: int = 1234):
+    rng = random.Random(seed)
+    cases = [(1, 1), (1, MAX_BPS), (MAX_CENTS, 1), (MAX_CENTS, MAX_BPS), (50, 100), (150, 100), (250, 100)]
+    for _ in range(count):
+        bps = rng.randint(1, MAX_BPS)
+        cases.append((rng.randint(1, rng.choice((10**4, 10**7, MAX_CENTS))), bps))
+    # Exact half-cent ties, both parities of the whole-cent part
+    for _ in range(count // 5):
+        bps = rng.choice((1, 2, 4, 5, 8, 10, 16, 20, 25, 40, 50, 80, 100, 125, 200, 250, 400, 500, 1000, 2500, 5000))
+        step = 10_000 // bps
+        k = rng.randint(0, MAX_CENTS // step - 1)
+        cents = k * step + step // 2
+        if cents and (cents * bps) % 10_000 == 5000:
+            cases.append((cents, bps))
+    return cases
+
+
+def test_sql_rounding_matches_decimal():
+    for cents, bps in _cases():
+        assert sql_burn_amount_usd(cents, bps) == burn_amount_usd(_gross(cents), bps), (cents, bps)
+
+
+def test_ties_round_half_even():
+    # 0.5 cent rounds down to even, 1.5 cents up to even, 2.5 cents down to even
+    assert burn_amount_usd(Decimal("0.50"), 100) == Decimal("0.00")
+    assert sql_burn_amount_usd(150, 100) == burn_amount_usd(Decimal("1.50"), 100) == Decimal("0.02")
+    assert sql_burn_amount_usd(250, 100) == burn_amount_usd(Decimal("2.50"), 100) == Decimal("0.02")
+
+
+if given is not None:
+    @given(cents=st.integers(1, MAX_CENTS), bps=st.integers(1, MAX_BPS))
+    def test_sql_rounding_matches_decimal_property(cents, bps):
+        assert sql_burn_amount_usd(cents, bps) == burn_amount_usd(_gross(cents), bps)
+
+
+def test_postgres_expression_matches_decimal():
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        pytest.skip("DATABASE_URL not set")
+    from sqlalchemy import create_engine, text
+
+    cases = _cases(count=1000, seed=99)
+    engine = create_engine(database_url)
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(f"""
+                    SELECT i, {_SQL_EXPR} AS burn
+                    FROM (
+                        SELECT i, ROUND(CAST(c AS numeric(12, 2)) * 100)::bigint * b AS n
+                        FROM unnest(CAST(:ids AS int[]), CAST(:grosses AS text[]), CAST(:bps AS bigint[]))
+                             AS t(i, c, b)
+                    ) x
+                """),
+                {
+                    "ids": list(range(len(cases))),
+                    "grosses": [str(_gross(c)) for c, _ in cases],
+                    "bps": [b for _, b in cases],
+                },
+            ).fetchall()
+    finally:
+        engine.dispose()
+    assert len(rows) == len(cases)
+    for i, burn in rows:
+        cents, bps = cases[i]
+        assert Decimal(burn) == burn_amount_usd(_gross(cents), bps), (cents, bps)
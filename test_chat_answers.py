@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+FAQ matching test for the chat widget's canned answers (app/core/chat_answers.py), run against
+the real "Common questions" block in docs/chat-agent-system-prompt-responses-api.md.
+Paraphrases must hit their FAQ entry; near misses (different subject, different question)
+must go to the model.
+Run: python -m pytest -q test_chat_answers.py
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.core.chat_answers import ChatAnswerCache, parse_faq
+
+PROMPT_TEXT = (Path(__file__).parent / "docs" / "chat-agent-system-prompt-responses-api.md").read_text()
+FAQ = dict(parse_faq(PROMPT_TEXT))
+
+
+def _lookup(message):
+    cache = ChatAnswerCache(enabled=True)
+    return cache.lookup(message, PROMPT_TEXT, "test-prompt")
+
+
+def test_faq_parsed():
+    assert set(FAQ) >= {
+        "Do I need a credit card?",
+        "Do I need to switch factoring?",
+        "How do you get paid?",
+        "Can I negotiate myself?",
+        "How fast do you respond?",
+    }
+
+
+@pytest.mark.parametrize("message,question", [
+    ("Do I need a credit card?", "Do I need a credit card?"),
+    ("do I need a credit card", "Do I need a credit card?"),
+    ("hi, do i need a credit card??", "Do I need a credit card?"),
+    ("Need a credit card?", "Do I need a credit card?"),
+    ("is a credit card required", "Do I need a credit card?"),
+    ("do I need to switch factoring", "Do I need to switch factoring?"),
+    ("Do I have to switch factoring?", "Do I need to switch factoring?"),
+    ("How do you get paid?", "How do you get paid?"),
+    ("how do u get paid", "How do you get paid?"),
+    ("Can I negotiate myself?", "Can I negotiate myself?"),
+    ("can i negotiate", "Can I negotiate myself?"),
+    ("How fast do you respond?", "How fast do you respond?"),
+    ("how fast do you guys respond", "How fast do you respond?"),
+])
+def test_paraphrases_hit_their_entry(message, question):
+    assert _lookup(message) == FAQ[question]
+
+
+@pytest.mark.parametrize("message", [
+    "how do I get paid",            # the driver's pay, not how the platform is paid
+    "how do we get paid",
+    "do you need a credit card",    # the platform needing a card, not the driver
+    "do you need to switch factoring",
+    "can you negotiate for me",     # asks for the opposite of "Can I negotiate myself?"
+    "how fast do I respond",
+    "do I need a truck",
+    "Why would I need to switch factoring?",          # asks for reasons, not yes/no
+    "Can I negotiate the 2% fee myself?",             # the fee, not the load rate
+    "Do I need a credit card for the fuel advance?",  # a different product
+    "don't I need a credit card",                     # negated
+    "do I not need to switch factoring",
+    "can't I negotiate myself",
+])
+def test_near_misses_go_to_the_model(message):
+    assert _lookup(message) is None
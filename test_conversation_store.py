@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Tests for the chat widget's in-memory conversation store (app/core/conversation_store.py):
+idle TTL, expiry sweep and LRU eviction. The clock is faked, so nothing sleeps.
+Run: python -m pytest -q test_conversation_store.py
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+pytest.importorskip("sqlalchemy")
+
+from app.core import conversation_store
+from app.core.conversation_store import ConversationStore, MemoryConversationStore
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    fake = _Clock()
+    monkeypatch.setattr(conversation_store.time, "monotonic", fake)
+    return fake
+
+
+def _turns(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_store_interface_is_abstract():
+    class Incomplete(ConversationStore):
+        def get(self, conversation_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_get_refreshes_idle_ttl(clock):
+    store = MemoryConversationStore(max_entries=10, ttl_seconds=60)
+    store.save("a", _turns("hello"))
+    clock.now += 50
+    assert store.get("a") == _turns("hello")
+    clock.now += 50  # 100s since save, 50s since last read
+    assert store.get("a") == _turns("hello")
+    clock.now += 61
+    assert store.get("a") is None
+    assert store.stats()["expirations"] == 1
+
+
+def test_save_sweeps_every_expired_entry(clock):
+    store = MemoryConversationStore(max_entries=10, ttl_seconds=60)
+    store.save("old1", _turns("x"))
+    store.save("kept", _turns("y"))
+    store.save("old2", _turns("z"))
+    clock.now += 30
+    store.get("kept")  # read in between: kept is no longer next to expire
+    clock.now += 40    # old1 and old2 are past their TTL, kept is not
+    store.save("new", _turns("w"))
+
+    stats = store.stats()
+    assert stats["entries"] == 2
+    assert stats["expirations"] == 2
+    assert stats["approx_bytes"] == 2
+    assert store.get("kept") == _turns("y")
+    assert store.get("new") == _turns("w")
+
+
+def test_evicts_least_recently_used(clock):
+    store = MemoryConversationStore(max_entries=2, ttl_seconds=60)
+    store.save("a", _turns("a"))
+    store.save("b", _turns("b"))
+    store.get("a")
+    store.save("c", _turns("c"))
+    assert store.get("b") is None
+    assert store.get("a") == _turns("a")
+    assert store.stats()["evictions"] == 1
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Tests for the broker enrichment runner (app/services/enrichment.py) against a local stub HTTP
+server: per-host rate limiting, retry of 429/5xx honouring Retry-After, and checkpoint resume
+of run_stage (brokers come from a throwaway SQLite table instead of webwise.brokers).
+Run: python -m pytest -q test_enrichment.py
+"""
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+pytest.importorskip("requests")
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine, text
+
+from app.services import enrichment
+from app.services.enrichment import Checkpoint, EnrichmentClient, EnrichmentStage, TokenBucket, run_stage
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Replies per path from server.script: a list of (status, headers) consumed in order; then 200."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.hits.append((self.path, time.monotonic()))
+            script = server.script.get(self.path) or []
+            status, headers = script.pop(0) if script else (200, {})
+        body = f"ok {self.path}".encode()
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.lock = threading.Lock()
+    server.hits = []
+    server.script = {}
+    server.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _client(**kwargs):
+    opts = {"host_rps": 1000, "host_burst": 1000, "max_retries": 3, "backoff_base": 0.01, "backoff_max": 5}
+    opts.update(kwargs)
+    return EnrichmentClient(cache=None, **opts)
+
+
+def _paths(server):
+    return [path for path, _ in server.hits]
+
+
+# --- Rate limiting ---
+
+def test_token_bucket_spaces_acquires():
+    bucket = TokenBucket(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # First token is free, the other 5 arrive at 20/s
+    assert time.monotonic() - started >= 0.2
+
+
+def test_client_rate_limits_per_host(stub_server):
+    client = _client(host_rps=10, host_burst=1)
+    for i in range(5):
+        assert client.get(f"{stub_server.base_url}/page/{i}").status_code == 200
+    times = [t for _, t in stub_server.hits]
+    assert times[-1] - times[0] >= 0.35
+    assert client.stats["throttled_s"] > 0
+
+
+# --- Retries ---
+
+def test_retries_5xx_then_succeeds(stub_server):
+    stub_server.script["/flaky"] = [(503, {}), (502, {})]
+    client = _client()
+    resp = client.get(f"{stub_server.base_url}/flaky")
+    assert resp.status_code == 200
+    assert _paths(stub_server) == ["/flaky"] * 3
+    assert client.stats["retries"] == 2
+
+
+def test_retry_after_is_honoured(stub_server):
+    stub_server.script["/limited"] = [(429, {"Retry-After": "1"})]
+    client = _client()
+    started = time.monotonic()
+    resp = client.get(f"{stub_server.base_url}/limited")
+    assert resp.status_code == 200
+    # Backoff is max(base * 2^attempt, Retry-After) with 50-100% jitter
+    assert time.monotonic() - started >= 0.5
+
+
+def test_gives_up_after_max_retries(stub_server):
+    stub_server.script["/down"] = [(500, {})] * 10
+    client = _client(max_retries=2)
+    resp = client.get(f"{stub_server.base_url}/down")
+    assert resp.status_code == 500
+    assert _paths(stub_server) == ["/down"] * 3
+
+
+def test_client_errors_are_not_retried(stub_server):
+    stub_server.script["/missing"] = [(404, {})]
+    client = _client()
+    assert client.get(f"{stub_server.base_url}/missing").status_code == 404
+    assert client.stats["retries"] == 0
+
+
+# --- Stage contract and resume ---
+
+def test_stage_requires_process_and_write():
+    class Incomplete(EnrichmentStage):
+        def process(self, broker, client, debug=False):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+class _PageStage(EnrichmentStage):
+    name = "test_pages"
+    select_sql = """
+        SELECT mc_number, company_name FROM brokers
+        WHERE mc_number > :after
+        ORDER BY mc_number
+        LIMIT :page_size
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def process(self, broker, client, debug=False):
+        resp = client.get(f"{self.base_url}/broker/{broker['mc_number']}")
+        resp.raise_for_status()
+        return resp.text
+
+    def write(self, conn, batch):
+        conn.execute(
+            text("INSERT INTO results (mc_number, body) VALUES (:mc, :body)"),
+            [{"mc": broker["mc_number"], "body": result} for broker, result in batch],
+        )
+        return {"written": len(batch)}
+
+
+@pytest.fixture()
+def broker_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'brokers.db'}", connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE brokers (mc_number TEXT PRIMARY KEY, company_name TEXT)"))
+        conn.execute(text("CREATE TABLE results (mc_number TEXT PRIMARY KEY, body TEXT)"))
+        conn.execute(
+            text("INSERT INTO brokers (mc_number, company_name) VALUES (:mc, :name)"),
+            [{"mc": f"MC{i:03d}", "name": f"Broker {i}"} for i in range(1, 11)],
+        )
+    yield engine
+    engine.dispose()
+
+
+def test_run_stage_resumes_from_checkpoint(stub_server, broker_engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(enrichment, "Checkpoint", lambda name: Checkpoint(name, tmp_path / "state"))
+    stage = _PageStage(stub_server.base_url)
+    checkpoint = Checkpoint(stage.name, tmp_path / "state")
+
+    # Interrupted run: stops after two pages, checkpoint points at the last written MC
+    first = run_stage(stage, broker_engine, limit=6, page_size=3, concurrency=4, client=_client())
+    assert first["processed"] == 6 and first["written"] == 6
+    assert checkpoint.load() == "MC006"
+
+    # Resumed run only fetches the rest, then clears the checkpoint at the end of the pass
+    stub_server.hits.clear()
+    second = run_stage(stage, broker_engine, page_size=3, concurrency=4, client=_client())
+    assert second["processed"] == 4 and second["written"] == 4
+    assert sorted(_paths(stub_server)) == [f"/broker/MC{i:03d}" for i in range(7, 11)]
+    assert checkpoint.load() is None
+
+    with broker_engine.connect() as conn:
+        stored = [r[0] for r in conn.execute(text("SELECT mc_number FROM results ORDER BY mc_number"))]
+    assert stored == [f"MC{i:03d}" for i in range(1, 11)]
+
+
+def test_failed_broker_does_not_block_the_page(stub_server, broker_engine, tmp_path, monkeypatch):
+    monkeypatch.setattr(enrichment, "Checkpoint", lambda name: Checkpoint(name, tmp_path / "state"))
+    stub_server.script["/broker/MC002"] = [(404, {})]
+    counts = run_stage(_PageStage(stub_server.base_url), broker_engine, page_size=5, client=_client())
+    assert counts["processed"] == 10
+    assert counts["errors"] == 1
+    assert counts["written"] == 9
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Offline tests for inbound_listener.py against a local fake IMAP server (plain TCP, just enough
+of RFC 3501 / 2177 for imaplib): UID-incremental sync, UIDVALIDITY resync, poison-message
+retry + dead-letter, and IDLE wakeups (including an EXISTS that arrives in the same packet as
+the "+ idling" continuation). The sync-state / message-store DB calls are replaced with
+in-memory fakes.
+Run: python -m pytest -q test_inbound_listener.py
+"""
+import imaplib
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+pytest.importorskip("sqlalchemy")
+
+# Importing the listener builds its engine; don't leave the placeholder URL behind for the
+# Postgres tests that skip on a missing DATABASE_URL.
+_env_database_url = os.environ.get("DATABASE_URL")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+import inbound_listener
+if _env_database_url is None:
+    del os.environ["DATABASE_URL"]
+
+MAILBOX = "inbox"
+
+
+def _message(n):
+    header = (
+        f"Message-ID: <m{n}@broker.test>\r\n"
+        f"From: broker{n}@broker.test\r\n"
+        f"To: driver+L{n}@gcdloads.com\r\n"
+        f"Subject: Load L{n}\r\n\r\n"
+    ).encode()
+    return header, f"Can do $100{n}\r\n".encode()
+
+
+class FakeImapServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _FakeImapHandler)
+        self.lock = threading.Lock()
+        self.uidvalidity = 42
+        self.messages = {}          # uid -> (header, text)
+        self.idlers = []            # handlers currently in IDLE
+        self.exists_with_continuation = False
+        self.commands = []
+
+    def add_message(self, uid):
+        """Deliver a message; idling clients get an untagged EXISTS push."""
+        with self.lock:
+            self.messages[uid] = _message(uid)
+            count = len(self.messages)
+            for handler in self.idlers:
+                handler.write(f"* {count} EXISTS\r\n".encode())
+
+
+class _FakeImapHandler(socketserver.StreamRequestHandler):
+    def write(self, data):
+        self.wfile.write(data)
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        self.write(b"* OK fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+            cmd, _, args = rest.partition(" ")
+            cmd = cmd.upper()
+            server.commands.append(f"{cmd} {args}".strip())
+            if cmd == "CAPABILITY":
+                self.write(b"* CAPABILITY IMAP4rev1 IDLE\r\n" + f"{tag} OK done\r\n".encode())
+            elif cmd == "LOGIN":
+                self.write(f"{tag} OK logged in\r\n".encode())
+            elif cmd == "SELECT":
+                with server.lock:
+                    count, uv = len(server.messages), server.uidvalidity
+                self.write(
+                    f"* {count} EXISTS\r\n* OK [UIDVALIDITY {uv}] UIDs valid\r\n"
+                    f"{tag} OK [READ-WRITE] SELECT completed\r\n".encode()
+                )
+            elif cmd == "UID":
+                self._uid(tag, args)
+            elif cmd == "IDLE":
+                self._idle(tag)
+            elif cmd == "NOOP":
+                self.write(f"{tag} OK NOOP completed\r\n".encode())
+            elif cmd == "LOGOUT":
+                self.write(b"* BYE\r\n" + f"{tag} OK LOGOUT completed\r\n".encode())
+                return
+            else:
+                self.write(f"{tag} BAD unknown command\r\n".encode())
+
+    def _uid(self, tag, args):
+        server = self.server
+        sub, _, rest = args.partition(" ")
+        with server.lock:
+            uids = sorted(server.messages)
+            if sub.upper() == "SEARCH":
+                start = int(re.search(r"UID (\d+):\*", rest).group(1))
+                # RFC 3501: "N:*" always includes the highest UID
+                found = [u for u in uids if u >= start] or uids[-1:]
+                self.write(f"* SEARCH {' '.join(map(str, found))}\r\n{tag} OK SEARCH completed\r\n".encode())
+                return
+            wanted = {int(u) for u in rest.split(" ", 1)[0].split(",")}
+            out = b""
+            for seq, uid in enumerate(uids, 1):
+                if uid not in wanted:
+                    continue
+                header, body = server.messages[uid]
+                out += f"* {seq} FETCH (UID {uid} BODY[HEADER] {{{len(header)}}}\r\n".encode() + header
+                out += f" BODY[TEXT]<0> {{{len(body)}}}\r\n".encode() + body + b")\r\n"
+        self.write(out + f"{tag} OK FETCH completed\r\n".encode())
+
+    def _idle(self, tag):
+        server = self.server
+        with server.lock:
+            cont = b"+ idling\r\n"
+            if server.exists_with_continuation:
+                cont += f"* {len(server.messages)} EXISTS\r\n".encode()
+            server.idlers.append(self)
+            self.write(cont)
+        try:
+            done = self.rfile.readline()
+        finally:
+            with server.lock:
+                server.idlers.remove(self)
+        if done.strip().upper() == b"DONE":
+            self.write(f"{tag} OK IDLE terminated\r\n".encode())
+
+
+@pytest.fixture()
+def imap_server():
+    server = FakeImapServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def mail(imap_server):
+    conn = imaplib.IMAP4("127.0.0.1", imap_server.server_address[1])
+    conn.login("dispatch", "secret")
+    conn.select(MAILBOX)
+    yield conn
+    try:
+        conn.logout()
+    except Exception:
+        pass
+
+
+@pytest.fixture()
+def listener(monkeypatch):
+    """In-memory sync state, processed Message-IDs and dead letters instead of Postgres."""
+    state = {"sync": {}, "processed": [], "dead": [], "fail": set(), "dead_letter_ok": True}
+
+    def load_sync_state(mailbox):
+        return state["sync"].get(mailbox, (None, 0))
+
+    def save_sync_state(mailbox, uidvalidity, last_uid):
+        state["sync"][mailbox] = (uidvalidity, last_uid)
+
+    def process_message(msg):
+        msg_id = msg.get("Message-ID")
+        if msg_id in state["fail"]:
+            raise ValueError("invalid byte sequence for encoding")
+        state["processed"].append(msg_id)
+
+    def record_dead_letter(mailbox, uidvalidity, uid, raw, error, attempts):
+        if not state["dead_letter_ok"]:
+            return False
+        state["dead"].append((uid, attempts))
+        return True
+
+    monkeypatch.setattr(inbound_listener, "load_sync_state", load_sync_state)
+    monkeypatch.setattr(inbound_listener, "save_sync_state", save_sync_state)
+    monkeypatch.setattr(inbound_listener, "process_message", process_message)
+    monkeypatch.setattr(inbound_listener, "record_dead_letter", record_dead_letter)
+    monkeypatch.setattr(inbound_listener, "MESSAGE_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(inbound_listener, "_failed_uids", {})
+    return state
+
+
+def _sync(mail, uidvalidity=42):
+    return inbound_listener.sync_new_messages(mail, uidvalidity, MAILBOX)
+
+
+# --- Incremental sync ---
+
+def test_sync_fetches_only_new_uids(imap_server, mail, listener):
+    for uid in (3, 5, 9):
+        imap_server.add_message(uid)
+    assert _sync(mail) == 3
+    assert listener["processed"] == ["<m3@broker.test>", "<m5@broker.test>", "<m9@broker.test>"]
+    assert listener["sync"][MAILBOX] == (42, 9)
+
+    # Nothing new: "10:*" still returns UID 9, which must not be re-processed
+    assert _sync(mail) == 0
+    imap_server.add_message(12)
+    assert _sync(mail) == 1
+    assert listener["processed"][-1] == "<m12@broker.test>"
+    assert listener["sync"][MAILBOX] == (42, 12)
+
+
+def test_uidvalidity_change_resyncs(imap_server, mail, listener):
+    imap_server.add_message(1)
+    imap_server.add_message(2)
+    listener["sync"][MAILBOX] = (41, 2)
+    assert _sync(mail, uidvalidity=42) == 2
+    assert listener["sync"][MAILBOX] == (42, 2)
+
+
+# --- Poison messages ---
+
+def test_failing_message_does_not_block_later_ones(imap_server, mail, listener):
+    for uid in (1, 2, 3):
+        imap_server.add_message(uid)
+    listener["fail"].add("<m2@broker.test>")
+
+    assert _sync(mail) == 2
+    assert listener["processed"] == ["<m1@broker.test>", "<m3@broker.test>"]
+    assert listener["sync"][MAILBOX] == (42, 1)   # stops below the failure
+    assert inbound_listener.retry_pending(MAILBOX)
+
+    # Second attempt fails again; UID 3 is re-fetched and processed (deduped by Message-ID in prod)
+    _sync(mail)
+    assert listener["sync"][MAILBOX] == (42, 1)
+    assert listener["dead"] == []
+
+    # Third attempt: dead-lettered, sync moves past it
+    _sync(mail)
+    assert listener["dead"] == [(2, 3)]
+    assert listener["sync"][MAILBOX] == (42, 3)
+    assert not inbound_listener.retry_pending(MAILBOX)
+
+
+def test_message_recovering_on_retry_is_not_dead_lettered(imap_server, mail, listener):
+    imap_server.add_message(1)
+    listener["fail"].add("<m1@broker.test>")
+    assert _sync(mail) == 0
+    listener["fail"].clear()
+    assert _sync(mail) == 1
+    assert listener["dead"] == []
+    assert listener["sync"][MAILBOX] == (42, 1)
+    assert not inbound_listener.retry_pending(MAILBOX)
+
+
+def test_unstored_dead_letter_is_not_skipped(imap_server, mail, listener):
+    imap_server.add_message(1)
+    listener["fail"].add("<m1@broker.test>")
+    listener["dead_letter_ok"] = False  # e.g. the DB is down: keep retrying, never drop
+    for _ in range(5):
+        _sync(mail)
+    assert listener["sync"][MAILBOX] == (42, 0)
+    assert inbound_listener.retry_pending(MAILBOX)
+
+
+# --- IDLE ---
+
+def test_idle_returns_on_exists_push(imap_server, mail, listener):
+    timer = threading.Timer(0.2, imap_server.add_message, args=(7,))
+    timer.start()
+    started = time.monotonic()
+    assert inbound_listener.idle_wait(mail, 5) is True
+    assert time.monotonic() - started < 2
+    # Connection is back in normal command mode after DONE
+    assert _sync(mail) == 1
+
+
+def test_idle_times_out_without_push(imap_server, mail, listener):
+    started = time.monotonic()
+    assert inbound_listener.idle_wait(mail, 0.3) is False
+    assert time.monotonic() - started >= 0.3
+    assert mail.noop()[0] == "OK"
+
+
+def test_idle_sees_exists_buffered_with_continuation(imap_server, mail, listener):
+    imap_server.add_message(4)
+    imap_server.exists_with_continuation = True
+    started = time.monotonic()
+    # The EXISTS is already in imaplib's read buffer, so select() on the socket never fires
+    assert inbound_listener.idle_wait(mail, 5) is True
+    assert time.monotonic() - started < 2
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Concurrency test for debit_fuel (app/services/ledger.py): many threads debit the same trucker
+at once. There must be no overdraft and exactly one charge per idempotency key.
+Needs DATABASE_URL with sql/create_driver_balances.sql and sql/migrate_ledger_idempotency.sql
+applied; skipped otherwise. Creates a throwaway user/profile and removes it afterwards.
+Run: python -m pytest -q test_ledger_debit_concurrency.py
+"""
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    pytest.skip("DATABASE_URL not set", allow_module_level=True)
+
+from sqlalchemy import create_engine, text
+
+from app.services.ledger import USAGE_RATES, debit_fuel, refund_fuel
+
+THREADS = 32
+COST = USAGE_RATES["MANUAL_EMAIL"]
+
+
+@pytest.fixture()
+def engine():
+    eng = create_engine(DATABASE_URL, pool_size=THREADS, max_overflow=0)
+    yield eng
+    eng.dispose()
+
+
+@pytest.fixture()
+def trucker(engine):
+    """Throwaway trucker funded with 10 emails' worth of $CANDLE; yields (trucker_id, mc_number)."""
+    tag = uuid.uuid4().hex[:8]
+    mc = f"MCT{tag}"
+    with engine.begin() as conn:
+        uid = conn.execute(
+            text("""
+                INSERT INTO webwise.users (email, password_hash, role, is_active)
+                VALUES (:email, 'x', 'client', true)
+                RETURNING id
+            """),
+            {"email": f"ledger-test-{tag}@example.com"},
+        ).scalar()
+        tid = conn.execute(
+            text("""
+                INSERT INTO webwise.trucker_profiles (user_id, display_name, mc_number)
+                VALUES (:uid, :dn, :mc)
+                RETURNING id
+            """),
+            {"uid": uid, "dn": f"ledgertest{tag}", "mc": mc},
+        ).scalar()
+        conn.execute(
+            text("""
+                INSERT INTO webwise.driver_savings_ledger
+                    (driver_mc_number, load_id, amount_usd, amount_candle, unlocks_at, status)
+                VALUES (:mc, 'TEST-FUND', :amt, :amt, now(), 'CREDITED')
+            """),
+            {"mc": mc, "amt": COST * 10},
+        )
+    try:
+        yield tid, mc
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM webwise.driver_savings_ledger WHERE driver_mc_number = :mc"), {"mc": mc})
+            conn.execute(text("DELETE FROM webwise.driver_balances WHERE trucker_id = :tid"), {"tid": tid})
+            conn.execute(text("DELETE FROM webwise.trucker_profiles WHERE id = :tid"), {"tid": tid})
+            conn.execute(text("DELETE FROM webwise.users WHERE id = :uid"), {"uid": uid})
+
+
+def _balance(engine, mc):
+    with engine.connect() as conn:
+        return float(conn.execute(
+            text("""
+                SELECT COALESCE(SUM(amount_candle), 0) FROM webwise.driver_savings_ledger
+                WHERE driver_mc_number = :mc AND status IN ('CREDITED', 'CONSUMED')
+            """),
+            {"mc": mc},
+        ).scalar())
+
+
+def _charges(engine, mc):
+    with engine.connect() as conn:
+        return conn.execute(
+            text("""
+                SELECT idempotency_key, COUNT(*) FROM webwise.driver_savings_ledger
+                WHERE driver_mc_number = :mc AND status = 'CONSUMED'
+                GROUP BY idempotency_key
+            """),
+            {"mc": mc},
+        ).fetchall()
+
+
+def _hammer(engine, tid, events):
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(lambda ev: debit_fuel(engine, tid, "TEST-LOAD", "MANUAL_EMAIL", event_id=ev), events))
+
+
+def test_same_key_charged_once(engine, trucker):
+    tid, mc = trucker
+    results = _hammer(engine, tid, ["counter-1"] * THREADS)
+
+    assert sum(r["charged"] for r in results) == 1
+    assert all(r["status"] in ("charged", "duplicate") for r in results)
+    assert [count for _, count in _charges(engine, mc)] == [1]
+    assert _balance(engine, mc) == pytest.approx(COST * 9)
+
+
+def test_distinct_keys_never_overdraw(engine, trucker):
+    tid, mc = trucker
+    results = _hammer(engine, tid, [f"counter-{i}" for i in range(THREADS)])
+
+    charged = [r for r in results if r["charged"]]
+    assert len(charged) == 10
+    assert all(r["status"] == "insufficient" for r in results if not r["charged"])
+    assert all(count == 1 for _, count in _charges(engine, mc))
+    assert _balance(engine, mc) == pytest.approx(0.0)
+    with engine.connect() as conn:
+        stored = conn.execute(
+            text("SELECT balance_candle FROM webwise.driver_balances WHERE trucker_id = :tid"),
+            {"tid": tid},
+        ).scalar()
+    assert float(stored) == pytest.approx(0.0)
+
+
+def test_refund_frees_the_key(engine, trucker):
+    tid, mc = trucker
+    first = debit_fuel(engine, tid, "TEST-LOAD", "MANUAL_EMAIL", event_id="counter-refund")
+    assert first["charged"]
+    assert refund_fuel(engine, first["ledger_id"])
+    assert not refund_fuel(engine, first["ledger_id"])  # second refund is a no-op
+    assert _balance(engine, mc) == pytest.approx(COST * 10)
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("""
+                SELECT status, amount_candle FROM webwise.driver_savings_ledger
+                WHERE driver_mc_number = :mc AND load_id = 'TEST-LOAD' ORDER BY id
+            """),
+            {"mc": mc},
+        ).fetchall()
+    # The debit stays in the ledger; the refund is a compensating credit
+    assert [(r.status, float(r.amount_candle)) for r in rows] == [("CONSUMED", -COST), ("CREDITED", COST)]
+
+    results = _hammer(engine, tid, ["counter-refund"] * THREADS)
+    assert sum(r["charged"] for r in results) == 1
+    assert _balance(engine, mc) == pytest.approx(COST * 9)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Offline tests for app/services/smtp_pool.py against a local stub SMTP server (plain TCP, just
+enough of RFC 5321 for smtplib): connection reuse, NOOP health checks, reconnect-once before
+DATA, no resend once DATA has begun, per-connection message cap, and the outbox counters
+under concurrent senders.
+Run: python -m pytest -q test_smtp_pool.py
+"""
+import smtplib
+import socketserver
+import sys
+import threading
+from email.message import EmailMessage
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from app.services.smtp_pool import EmailOutbox, SMTPConnectionPool, _safe_to_retry
+
+
+class StubSmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubSmtpHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.commands = []
+        self.messages = []          # raw DATA payloads
+        self.drop_next = set()      # "MAIL" / "DATA_END": hang up instead of replying, once
+        self.noop_code = 250
+        self.refuse = set()         # recipients answered with 550
+
+    def take_drop(self, event):
+        with self.lock:
+            if event in self.drop_next:
+                self.drop_next.discard(event)
+                return True
+            return False
+
+
+class _StubSmtpHandler(socketserver.StreamRequestHandler):
+    def write(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.write("220 stub ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd, _, args = line.decode().rstrip("\r\n").partition(" ")
+            cmd = cmd.upper()
+            with server.lock:
+                server.commands.append(cmd)
+            if cmd in ("EHLO", "HELO", "RSET"):
+                self.write("250 stub")
+            elif cmd == "MAIL":
+                if server.take_drop("MAIL"):
+                    return
+                self.write("250 OK")
+            elif cmd == "RCPT":
+                addr = args.partition(":")[2].strip("<> ")
+                self.write("550 no such user" if addr in server.refuse else "250 OK")
+            elif cmd == "DATA":
+                self.write("354 go ahead")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk == b".\r\n":
+                        break
+                    data += chunk
+                with server.lock:
+                    server.messages.append(data)
+                if server.take_drop("DATA_END"):
+                    return  # the server has the message, the client never hears so
+                self.write("250 queued")
+            elif cmd == "NOOP":
+                if server.noop_code != 250:
+                    self.write(f"{server.noop_code} closing")
+                    return
+                self.write("250 OK")
+            elif cmd == "QUIT":
+                self.write("221 bye")
+                return
+            else:
+                self.write("502 not implemented")
+
+
+@pytest.fixture()
+def smtp_server():
+    server = StubSmtpServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _pool(server, **kwargs):
+    kwargs.setdefault("noop_after_seconds", 3600)
+    return SMTPConnectionPool("127.0.0.1", server.server_address[1], use_ssl=False, timeout=5, **kwargs)
+
+
+def _msg(n, to="broker@broker.test"):
+    msg = EmailMessage()
+    msg["From"] = "dispatch@gcdloads.com"
+    msg["To"] = to
+    msg["Subject"] = f"Load L{n}"
+    msg.set_content(f"Can do $100{n}")
+    return msg
+
+
+# --- Connection reuse ---
+
+def test_connection_is_reused(smtp_server):
+    pool = _pool(smtp_server)
+    for n in range(3):
+        pool.send_message(_msg(n))
+    assert smtp_server.connections == 1
+    assert len(smtp_server.messages) == 3
+    assert pool.stats() == {"idle": 1, "connects": 1, "reconnects": 0, "sent": 3}
+    pool.close_all()
+    assert pool.stats()["idle"] == 0
+
+
+def test_connection_recycled_after_max_messages(smtp_server):
+    pool = _pool(smtp_server, max_messages_per_conn=2)
+    for n in range(5):
+        pool.send_message(_msg(n))
+    assert smtp_server.connections == 3
+    assert smtp_server.commands.count("QUIT") == 2
+    assert len(smtp_server.messages) == 5
+
+
+# --- Health checks ---
+
+def test_idle_connection_is_checked_with_noop(smtp_server):
+    pool = _pool(smtp_server, noop_after_seconds=0)
+    pool.send_message(_msg(1))
+    pool.send_message(_msg(2))
+    assert smtp_server.commands.count("NOOP") == 1
+    assert smtp_server.connections == 1
+
+
+def test_failed_noop_opens_a_new_connection(smtp_server):
+    pool = _pool(smtp_server, noop_after_seconds=0)
+    pool.send_message(_msg(1))
+    smtp_server.noop_code = 421
+    pool.send_message(_msg(2))
+    assert smtp_server.connections == 2
+    assert len(smtp_server.messages) == 2
+    assert pool.stats()["reconnects"] == 0  # replaced at checkout, not a retried send
+
+
+def test_connection_past_max_idle_is_not_probed(smtp_server):
+    pool = _pool(smtp_server, noop_after_seconds=0, max_idle_seconds=0)
+    pool.send_message(_msg(1))
+    pool.send_message(_msg(2))
+    assert "NOOP" not in smtp_server.commands
+    assert smtp_server.connections == 2
+
+
+# --- Retry rules ---
+
+def test_dropped_connection_before_data_is_retried_once(smtp_server):
+    pool = _pool(smtp_server)
+    pool.send_message(_msg(1))
+    smtp_server.drop_next.add("MAIL")
+    pool.send_message(_msg(2))
+    assert len(smtp_server.messages) == 2
+    assert pool.stats()["reconnects"] == 1
+    assert smtp_server.connections == 2
+
+
+def test_dropped_connection_after_data_is_not_resent(smtp_server):
+    pool = _pool(smtp_server)
+    smtp_server.drop_next.add("DATA_END")
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send_message(_msg(1))
+    assert len(smtp_server.messages) == 1  # delivered exactly once, never duplicated
+    assert pool.stats()["reconnects"] == 0
+    # The broken connection was discarded; the next send gets a fresh one
+    pool.send_message(_msg(2))
+    assert smtp_server.connections == 2
+
+
+def test_refused_recipient_is_not_retried(smtp_server):
+    pool = _pool(smtp_server)
+    smtp_server.refuse.add("nobody@broker.test")
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        pool.send_message(_msg(1, to="nobody@broker.test"))
+    assert pool.stats()["reconnects"] == 0
+    assert smtp_server.messages == []
+
+
+def test_safe_to_retry():
+    class Conn:
+        data_started = False
+
+    conn = Conn()
+    assert _safe_to_retry(conn, smtplib.SMTPServerDisconnected("gone"))
+    assert _safe_to_retry(conn, ConnectionResetError())
+    assert not _safe_to_retry(conn, smtplib.SMTPDataError(554, b"rejected"))
+    conn.data_started = True
+    assert not _safe_to_retry(conn, smtplib.SMTPServerDisconnected("gone"))
+    assert not _safe_to_retry(object(), ConnectionResetError())  # unknown state: assume DATA ran
+
+
+# --- Concurrency ---
+
+def test_concurrent_senders(smtp_server):
+    pool = _pool(smtp_server, max_size=3)
+    threads = [
+        threading.Thread(target=lambda t=t: [pool.send_message(_msg(t * 100 + n)) for n in range(10)])
+        for t in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(smtp_server.messages) == 80
+    assert pool.stats()["sent"] == 80
+    assert pool.stats()["connects"] == smtp_server.connections <= 3
+
+
+def test_outbox_counts_every_result(smtp_server):
+    pool = _pool(smtp_server, max_size=2)
+    smtp_server.refuse.add("nobody@broker.test")
+    outbox = EmailOutbox(batch_size=5)
+    results = []
+    results_lock = threading.Lock()
+
+    def on_sent(result):
+        with results_lock:
+            results.append(result["status"])
+
+    def producer(t):
+        for n in range(10):
+            to = "nobody@broker.test" if n == 0 else "broker@broker.test"
+            outbox.enqueue(pool, _msg(t * 100 + n, to=to), on_sent=on_sent)
+
+    threads = [threading.Thread(target=producer, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert outbox.flush(timeout=10)
+    assert outbox.stats() == {"queue_depth": 0, "sent": 36, "failed": 4}
+    assert sorted(results) == ["error"] * 4 + ["success"] * 36
+    assert len(smtp_server.messages) == 36
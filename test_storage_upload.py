@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+End-to-end test of the driver document upload pipeline (app/services/storage.py) against moto's
+S3 server mode: spool -> image-to-PDF -> multipart upload, temp file cleanup, and the
+empty / too-large rejections. No DigitalOcean credentials needed.
+Run: python -m pytest -q test_storage_upload.py
+"""
+import asyncio
+import io
+import struct
+import sys
+import tempfile
+import zlib
+from pathlib import Path
+
+import pytest
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+pytest.importorskip("moto")
+pytest.importorskip("boto3")
+pytest.importorskip("fastapi")
+
+from fastapi import UploadFile
+from moto.server import ThreadedMotoServer
+from starlette.datastructures import Headers
+
+from app.services import storage
+
+BUCKET = "test-uploads"
+MB = 1024 * 1024
+
+
+def _png(width=4, height=4):
+    """Minimal RGB PNG, no imaging library needed."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    raw = b"".join(b"\x00" + b"\xff\x00\x00" * width for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def _upload(content, filename, content_type):
+    return UploadFile(file=io.BytesIO(content), filename=filename, headers=Headers({"content-type": content_type}))
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture()
+def s3(s3_endpoint, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "DO_SPACES_KEY", "testing")
+    monkeypatch.setattr(storage, "DO_SPACES_SECRET", "testing")
+    monkeypatch.setattr(storage, "DO_SPACES_REGION", "us-east-1")
+    monkeypatch.setattr(storage, "DO_SPACES_ENDPOINT", s3_endpoint)
+    monkeypatch.setattr(storage, "DO_SPACES_BUCKET", BUCKET)
+    monkeypatch.setattr(storage, "UPLOAD_PART_SIZE", 5 * MB)
+    monkeypatch.setattr(storage, "UPLOAD_MAX_BYTES", 12 * MB)
+    monkeypatch.setattr(storage, "_upload_slots", None)  # bind to this test's event loop
+    # Spooled / converted temp files land here, so leftovers are visible
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spool_dir))
+    client = storage.get_s3_client()
+    try:
+        client.create_bucket(Bucket=BUCKET)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+    client.spool_dir = spool_dir
+    return client
+
+
+def _leftovers(s3):
+    return sorted(p.name for p in s3.spool_dir.iterdir())
+
+
+def test_image_is_converted_and_uploaded(s3):
+    pytest.importorskip("img2pdf")
+    bucket, key = asyncio.run(storage.upload_load_document(_upload(_png(), "bol.png", "image/png"), 7, "L1", "BOL"))
+
+    assert bucket == BUCKET
+    assert key.startswith(f"{storage.settings.STORAGE_BUCKET_PREFIX}/trucker_7/load_L1/BOL_") and key.endswith(".pdf")
+    obj = s3.get_object(Bucket=BUCKET, Key=key)
+    assert obj["ContentType"] == "application/pdf"
+    assert obj["Body"].read().startswith(b"%PDF")
+    assert _leftovers(s3) == []
+
+
+def test_large_pdf_uses_multipart(s3):
+    content = b"%PDF-1.4\n" + b"0" * (11 * MB)
+    bucket, key = asyncio.run(storage.upload_load_document(_upload(content, "ratecon.pdf", "application/pdf"), 7, "L2", "RATECON"))
+
+    head = s3.head_object(Bucket=bucket, Key=key)
+    assert head["ContentLength"] == len(content)
+    assert head["ETag"].strip('"').endswith("-3")  # 5 MB + 5 MB + 1 MB parts
+    assert s3.get_object(Bucket=bucket, Key=key)["Body"].read() == content
+    assert _leftovers(s3) == []
+
+
+def test_empty_file_is_rejected(s3):
+    with pytest.raises(ValueError, match="empty"):
+        asyncio.run(storage.upload_load_document(_upload(b"", "bol.pdf", "application/pdf"), 7, "L3"))
+    assert s3.list_objects_v2(Bucket=BUCKET, Prefix=f"{storage.settings.STORAGE_BUCKET_PREFIX}/trucker_7/load_L3/").get("KeyCount") == 0
+    assert _leftovers(s3) == []
+
+
+def test_too_large_file_is_rejected(s3):
+    content = b"%PDF-1.4\n" + b"0" * (13 * MB)
+    with pytest.raises(ValueError, match="too large"):
+        asyncio.run(storage.upload_load_document(_upload(content, "bol.pdf", "application/pdf"), 7, "L4"))
+    assert s3.list_objects_v2(Bucket=BUCKET, Prefix=f"{storage.settings.STORAGE_BUCKET_PREFIX}/trucker_7/load_L4/").get("KeyCount") == 0
+    assert _leftovers(s3) == []
+
+
+def test_upload_bol_converts_to_pdf_key(s3):
+    pytest.importorskip("img2pdf")
+    bucket, key = asyncio.run(storage.upload_bol(_upload(_png(), "bol.jpg", "image/png"), "MC1", "L5"))
+    assert key.endswith("/raw/bol/MC1_L5_BOL_signed.pdf")
+    assert s3.get_object(Bucket=bucket, Key=key)["Body"].read().startswith(b"%PDF")
+    assert _leftovers(s3) == []